@@ -0,0 +1,251 @@
+from argparse import ArgumentParser
+from typing import Callable
+import numpy as np
+import platform
+import tempfile
+import shutil
+import json
+import time
+import sys
+import os
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# so the suite also runs as a script from any directory
+
+from benchmarks.synthetic import syntheticAudio, syntheticVideo, syntheticSegments, writeWav, SAMPLE_RATE
+from src.modules import Transcriber, VoiceActivityDetector, SubtitleConfig, Subtitle, VideoTranscriber
+from src.modules.utils import encodeSegment, encodeSegments, encodeCues, formats
+from src.modules.audio import loadAudio
+
+fontPaths = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/TTF/DejaVuSans.ttf",
+    "/Library/Fonts/Arial.ttf",
+    "C:\\Windows\\Fonts\\arial.ttf",
+]
+
+class StubModel:
+    def __init__(self, segments:list[dict]|None=None, segmentLength:float=2.5) -> None:
+        """
+        Initialize a stand-in for the Whisper model which returns segments instantly, so the benchmarks measure the code around the model.
+
+        Args:
+        segments (list[dict] | None, optional): The segments returned for any audio. If None, one segment is returned per 'segmentLength' seconds of audio. Defaults to None.
+        segmentLength (float, optional): The length of the generated segments in seconds. Defaults to 2.5.
+
+        Returns:
+        None
+        """
+        self.segments = segments
+        self.segmentLength = segmentLength
+        self.dims = "stub"
+
+    def transcribe(self, audio:str|np.ndarray, **decodeOptions) -> dict[str, str | list]:
+        if isinstance(audio, str):
+            audio = loadAudio(audio)
+            # decoding files with ffmpeg like the Whisper model does
+
+        if self.segments is not None:
+            segments = [dict(segment) for segment in self.segments]
+        else:
+            segments = syntheticSegments(max(1, int(len(audio) / SAMPLE_RATE / self.segmentLength)), self.segmentLength)
+
+        return {"text": "".join(segment["text"] for segment in segments), "segments": segments, "language": "en"}
+
+
+def measure(func:Callable[[], object], repeats:int=3, warmup:int=1) -> dict[str, float | int]:
+    """
+    Time a function.
+
+    Args:
+    func (Callable[[], object]): The function to time.
+    repeats (int, optional): The number of timed calls. Defaults to 3.
+    warmup (int, optional): The number of calls made before timing. Defaults to 1.
+
+    Returns:
+    dict[str, float | int]: The fastest and the mean time of a call in seconds, and the number of timed calls.
+    """
+    for _ in range(warmup):
+        func()
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    return {"seconds": min(times), "mean": sum(times) / len(times), "repeats": repeats}
+
+def result(timing:dict, work:float, unit:str) -> dict[str, float | int | str]:
+    return {**timing, "throughput": work / timing["seconds"], "unit": unit}
+
+def loadModel(name:str):
+    if name == "stub":
+        return StubModel()
+
+    import whisper
+    return whisper.load_model(name, "cpu")
+
+def findFont(font:str|None) -> str|None:
+    if font is not None:
+        return font
+    return next((path for path in fontPaths if os.path.exists(path)), None)
+
+def benchTranscriber(workDir:str, modelName:str, audioSeconds:float, repeats:int) -> dict[str, dict]:
+    audio = syntheticAudio(audioSeconds)
+    wavPath = writeWav(os.path.join(workDir, "audio.wav"), audio)
+    trans = Transcriber(loadModel(modelName), modelName, fp16=False)
+
+    return {
+        "transcriber.getRawOutput.file": result(measure(lambda: trans.getRawOutput(wavPath), repeats), audioSeconds, "audio s/s"),
+        "transcriber.getRawOutput.array": result(measure(lambda: trans.getRawOutput(audio), repeats), audioSeconds, "audio s/s"),
+        "transcriber.getRawOutput.vad": result(measure(lambda: trans.getRawOutput(audio, vad=VoiceActivityDetector()), repeats), audioSeconds, "audio s/s"),
+    }
+
+def benchEncoding(segmentCount:int, repeats:int) -> dict[str, dict]:
+    segments = syntheticSegments(segmentCount)
+    trans = Transcriber(StubModel(segments), "stub")
+    audio = np.zeros(SAMPLE_RATE, dtype=np.float32)
+
+    def encodeEach():
+        for i, segment in enumerate(segments):
+            encodeSegment(segment, i+1)
+
+    results = {
+        "utils.encodeSegment": result(measure(encodeEach, repeats), segmentCount, "segments/s"),
+        "utils.encodeSegments": result(measure(lambda: encodeSegments(segments), repeats), segmentCount, "segments/s"),
+        "transcriber.getTranscription": result(measure(lambda: trans.getTranscription(audio), repeats), segmentCount, "segments/s"),
+    }
+    for format in formats:
+        results[f"utils.encodeCues.{format}"] = result(measure(lambda: encodeCues(segments, format), repeats), segmentCount, "segments/s")
+
+    return results
+
+def benchDraw(size:tuple[int, int], font:str|None, frames:int, repeats:int) -> dict[str, dict]:
+    width, height = size
+    background = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    text = "The quick brown fox jumps over\nthe lazy dog while we transcribe"
+
+    configs = {"opencv": SubtitleConfig(cv2.FONT_HERSHEY_SIMPLEX, 1.0, 2, 40, (255, 255, 255), (0.5, 0.85), size)}
+    if font is not None:
+        configs["freetype"] = SubtitleConfig(font, 36, 2, 40, (255, 255, 255), (0.5, 0.85), size)
+
+    results = {}
+    for name, config in configs.items():
+        subtitle = Subtitle(text, config, 0, frames)
+
+        def draw(method):
+            for _ in range(frames):
+                method(background.copy())
+
+        results[f"subtitle.draw.{name}"] = result(measure(lambda: draw(subtitle.draw), repeats), frames, "frames/s")
+        results[f"subtitle.drawDirect.{name}"] = result(measure(lambda: draw(subtitle.drawDirect), repeats), frames, "frames/s")
+
+    return results
+
+def benchVideo(workDir:str, size:tuple[int, int], frames:int, fps:int, repeats:int) -> dict[str, dict]:
+    videoPath = syntheticVideo(os.path.join(workDir, "video.mp4"), frames, size, fps)
+    outputPath = os.path.join(workDir, "subtitled.mp4")
+    segments = [segment for segment in syntheticSegments(int(frames / fps / 2.5) + 1) if segment["id"] % 3 != 2]
+    # every third segment is left out, so some frames have no subtitle
+
+    def subtitle():
+        config = SubtitleConfig(cv2.FONT_HERSHEY_SIMPLEX, 1.0, 2, 40, (255, 255, 255), (0.5, 0.85))
+        VideoTranscriber.fromFile(videoPath, config, segments).subtitle(outputPath)
+
+    return {"video.subtitle": result(measure(subtitle, repeats, warmup=0), frames, "frames/s")}
+
+def compare(results:dict[str, dict], baseline:dict[str, dict], tolerance:float) -> dict[str, dict]:
+    """
+    Compare benchmark results with a baseline.
+
+    Args:
+    results (dict[str, dict]): The current results by benchmark name.
+    baseline (dict[str, dict]): The baseline results by benchmark name.
+    tolerance (float): How much slower than the baseline a benchmark may be, as a fraction, before it counts as a regression.
+
+    Returns:
+    dict[str, dict]: For every benchmark in both, the baseline and current fastest times, their ratio, and whether it regressed.
+    """
+    comparison = {}
+
+    for name, current in results.items():
+        if name not in baseline:
+            continue
+
+        ratio = current["seconds"] / baseline[name]["seconds"]
+        comparison[name] = {
+            "baseline": baseline[name]["seconds"],
+            "current": current["seconds"],
+            "ratio": ratio,
+            "regression": ratio > 1 + tolerance,
+        }
+
+    return comparison
+
+def main() -> int:
+    parser = ArgumentParser(description="Benchmark the transcription, SRT encoding and video subtitling hot paths on synthetic data.")
+    parser.add_argument("--output", default="benchmarks/results.json", help="The JSON file the results are written to.")
+    parser.add_argument("--baseline", default="benchmarks/baseline.json", help="The JSON file of the results compared against.")
+    parser.add_argument("--save-baseline", action="store_true", help="Also write the results to the baseline file.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="The fraction a benchmark may be slower than the baseline before it is a regression.")
+    parser.add_argument("--repeats", type=int, default=3, help="The number of timed runs of every benchmark.")
+    parser.add_argument("--model", default="stub", help="The model used by the transcriber benchmarks: 'stub', or the name of a Whisper model such as 'tiny'.")
+    parser.add_argument("--font", default=None, help="A TrueType font for the FreeType benchmarks. Defaults to a common system font, and they are skipped if none is found.")
+    parser.add_argument("--only", default=None, help="Only run the benchmarks whose group is one of these, comma separated: transcriber, encoding, draw, video.")
+    parser.add_argument("--quick", action="store_true", help="Use smaller inputs, to check the suite runs.")
+    args = parser.parse_args()
+
+    scale = 0.1 if args.quick else 1.0
+    groups = set(args.only.split(",")) if args.only else {"transcriber", "encoding", "draw", "video"}
+    workDir = tempfile.mkdtemp()
+
+    results = {}
+    try:
+        if "transcriber" in groups:
+            results.update(benchTranscriber(workDir, args.model, 300 * scale, args.repeats))
+        if "encoding" in groups:
+            results.update(benchEncoding(round(100_000 * scale), args.repeats))
+        if "draw" in groups:
+            results.update(benchDraw((1280, 720), findFont(args.font), round(300 * scale), args.repeats))
+        if "video" in groups:
+            results.update(benchVideo(workDir, (1280, 720), round(300 * scale), 30, args.repeats))
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpus": os.cpu_count(),
+            "model": args.model,
+            "quick": args.quick,
+        },
+        "results": results,
+        "comparison": compare(results, baseline, args.tolerance),
+    }
+
+    for path in [args.output] + ([args.baseline] if args.save_baseline else []):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+
+    for name, timing in results.items():
+        line = f"{name:36} {timing['seconds']*1000:10.2f} ms {timing['throughput']:14.1f} {timing['unit']}"
+        if name in report["comparison"]:
+            change = report["comparison"][name]
+            line += f"   x{change['ratio']:.2f} vs baseline{'  REGRESSION' if change['regression'] else ''}"
+        print(line)
+
+    return 1 if any(change["regression"] for change in report["comparison"].values()) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
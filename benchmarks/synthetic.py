@@ -0,0 +1,113 @@
+import numpy as np
+import wave
+import cv2
+
+SAMPLE_RATE = 16000
+
+def syntheticAudio(duration:float, sampleRate:int=SAMPLE_RATE, seed:int=0) -> np.ndarray:
+    """
+    Generate audio alternating between tone bursts, noise and silence, so every stage of the pipeline has something to do.
+
+    Args:
+    duration (float): The length of the audio in seconds.
+    sampleRate (int, optional): The sample rate of the audio. Defaults to 16000.
+    seed (int, optional): The seed of the noise. Defaults to 0.
+
+    Returns:
+    np.ndarray: The samples as float32 in the range [-1, 1].
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(round(duration * sampleRate)) / sampleRate
+
+    harmonics = sum(np.sin(2 * np.pi * 140 * k * t) / k for k in range(1, 12))
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t)
+    # a buzzing tone with a syllable rate envelope, closer to a voice than a pure sine
+
+    phase = (t % 6.0) // 2.0
+    audio = np.where(phase == 0, 0.2 * harmonics * envelope, 0.0)
+    audio = np.where(phase == 1, 0.05 * rng.standard_normal(len(t)), audio)
+    audio += 0.001 * rng.standard_normal(len(t))
+    # two seconds of tone, two of noise and two of near silence, repeated
+
+    return np.clip(audio, -1, 1).astype(np.float32)
+
+def writeWav(fileName:str, audio:np.ndarray, sampleRate:int=SAMPLE_RATE) -> str:
+    """
+    Write mono float audio to a 16 bit WAV file.
+
+    Args:
+    fileName (str): The path of the file.
+    audio (np.ndarray): The samples in the range [-1, 1].
+    sampleRate (int, optional): The sample rate of the audio. Defaults to 16000.
+
+    Returns:
+    str: The path of the file.
+    """
+    with wave.open(fileName, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sampleRate)
+        f.writeframes((audio * 32767).astype(np.int16).tobytes())
+
+    return fileName
+
+def syntheticVideo(fileName:str, frames:int, size:tuple[int, int]=(1280, 720), fps:int=30, seed:int=0) -> str:
+    """
+    Write a video of moving gradients and noise, which keeps the encoder busy like real footage would.
+
+    Args:
+    fileName (str): The path of the video, written with the mp4v codec.
+    frames (int): The number of frames.
+    size (tuple[int, int], optional): The (width, height) of the video. Defaults to (1280, 720).
+    fps (int, optional): The frame rate of the video. Defaults to 30.
+    seed (int, optional): The seed of the noise. Defaults to 0.
+
+    Returns:
+    str: The path of the video.
+    """
+    width, height = size
+    rng = np.random.default_rng(seed)
+
+    x = np.linspace(0, 255, width, dtype=np.float32)[None, :]
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    noise = rng.integers(0, 24, (height, width, 3), dtype=np.uint8)
+
+    writer = cv2.VideoWriter(fileName, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    try:
+        for i in range(frames):
+            frame = np.empty((height, width, 3), dtype=np.uint8)
+            frame[..., 0] = (x + 4 * i) % 256
+            frame[..., 1] = (y + 2 * i) % 256
+            frame[..., 2] = (x + y + 3 * i) % 256
+            writer.write(frame + np.roll(noise, i, axis=1))
+    finally:
+        writer.release()
+
+    return fileName
+
+def syntheticSegments(count:int, segmentLength:float=2.5, seed:int=0) -> list[dict[str, int|float|str]]:
+    """
+    Generate raw segments shaped like the output of the Whisper model.
+
+    Args:
+    count (int): The number of segments.
+    segmentLength (float, optional): The length of every segment in seconds. Defaults to 2.5.
+    seed (int, optional): The seed choosing the words. Defaults to 0.
+
+    Returns:
+    list[dict[str, int | float | str]]: The segments, back to back from 0 seconds.
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array("the quick brown fox jumps over a lazy dog while we transcribe some audio for subtitles".split())
+    lengths = rng.integers(4, 20, count)
+
+    return [
+        {
+            "id": i,
+            "seek": round(i * segmentLength * 100),
+            "start": i * segmentLength,
+            "end": (i + 1) * segmentLength,
+            "text": " " + " ".join(rng.choice(vocabulary, length)),
+        }
+        for i, length in enumerate(lengths.tolist())
+    ]
@@ -1,9 +1,11 @@
-from src.api import restAPI
+from src.api import restAPI, UploadRequest
+from src.api.server import main
 from flask import Flask
 
 app = Flask(__name__)
+app.request_class = UploadRequest
 app.register_blueprint(restAPI)
 
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    main(app)
\ No newline at end of file
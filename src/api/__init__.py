@@ -1 +1,2 @@
-from src.api.app import restAPI
\ No newline at end of file
+from src.api.app import restAPI
+from src.api.utils import UploadRequest
\ No newline at end of file
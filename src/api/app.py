@@ -1,105 +1,573 @@
-from flask import Blueprint, request
-from src.modules import Transcriber
+from flask import Blueprint, Response, request, stream_with_context, g
+from src.modules import TranscriptionCache, ModelRegistry, SubtitleConfig
+from src.modules.pipeline import subtitleVideo
+from src.modules.live import LiveTranscriber
+from src.modules.utils import encodeSegments, encodeCues, formats, formatMimetypes
+from src.modules.cpu import loadCPUModel
+from src.modules.shared import SharedModels, memoryReport
+from src.modules.metrics import metrics, stageSeconds
+from functools import partial
+import warnings
 import whisper
 import json
+import time
 import os
-from src.api.utils import audioPresent, tempFile
+import cv2
+from src.api.utils import audioPresent, videoPresent, modelKnown, requestVAD, tempFile
+from src.api.jobs import JobManager, JobQueueFull
+from src.modules.jobqueue import SQLiteJobQueue, FileResultStore
+
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
+# live captioning needs the optional flask-sock package
 
 restAPI = Blueprint("restAPI", __name__)
 
 modelName = "base"
+modelNames = ["tiny", "base", "small"]
+modelMemoryBudget = 2*1024**3
 tempDirPath = "temp"
 
-model = whisper.load_model(modelName)
-trans = Transcriber(model)
+cpuOptimized = False
+torchThreads = None
+torchInteropThreads = None
+
+cacheSize = 64
+cacheDirPath = "cache"
+cacheMaxBytes = 512*1024**2
+
+batchSize = None
+# set to a batch size to decode the requests of several threads in shared forward passes, at some cost in quality, see BatchScheduler
+batchWait = 0.05
+
+jobWorkers = 2
+jobMaxPending = 32
+jobTTL = 3600
+
+jobQueuePath = None
+jobResultsPath = "jobs/results"
+jobInputPath = "jobs/inputs"
+jobMaxAttempts = 3
+# with a queue path, /jobs only enqueues and worker processes run the jobs, see src/modules/worker.py
+
+videoFont = cv2.FONT_HERSHEY_SIMPLEX
+videoFontScale = 1.0
+videoFontThickness = 2
+videoLineSpacing = 40
+
+liveWindowLength = 15.0
+liveStepLength = 1.0
+liveCommitDelay = 2.0
+liveBufferLength = 60.0
+liveCPUBudget = 1.0
+
+cache = TranscriptionCache(cacheSize, cacheDirPath, cacheMaxBytes)
+modelLoader = partial(loadCPUModel, threads=torchThreads, interopThreads=torchInteropThreads) if cpuOptimized else whisper.load_model
+sharedModels = SharedModels(modelLoader)
+models = ModelRegistry(modelNames, modelMemoryBudget, cache=cache, batchSize=batchSize, batchWait=batchWait, loader=sharedModels.load, variant="int8" if cpuOptimized else None)
+# models are loaded on the first request asking for them, unless src/api/server.py preloaded them into shared memory before forking
+jobs = JobManager(jobWorkers, jobMaxPending, jobTTL)
+jobQueue = SQLiteJobQueue(jobQueuePath, jobMaxAttempts) if jobQueuePath is not None else None
+resultStore = FileResultStore(jobResultsPath) if jobQueue is not None else None
+
+requestsTotal = metrics.counter("http_requests_total", "Requests handled, by endpoint, method and status code.", ("endpoint", "method", "status"))
+requestErrors = metrics.counter("http_request_errors_total", "Requests that ended with a server error, by endpoint.", ("endpoint",))
+requestSeconds = metrics.histogram("http_request_seconds", "Time to handle a request, up to the first byte of streamed responses.", ("endpoint",))
+uploadBytes = metrics.counter("http_upload_bytes_total", "Bytes of request bodies received, by endpoint.", ("endpoint",))
+
+cacheEntries = metrics.gauge("transcription_cache_entries", "Results in the in-memory tier of the transcription cache.")
+cacheLookups = metrics.counter("transcription_cache_lookups_total", "Lookups of the transcription cache since startup, by result.", ("result",))
+jobsByState = metrics.gauge("transcription_jobs", "Background jobs kept by the job manager, by state.", ("state",))
+modelsLoaded = metrics.gauge("transcription_model_loaded", "Whether a model is resident.", ("model",))
+
+def collectState():
+    cacheEntries.set(len(cache))
+    cacheLookups.setTotal(cache.hits, result="hit")
+    cacheLookups.setTotal(cache.misses, result="miss")
+
+    if jobQueue is not None:
+        states = jobQueue.counts()
+    else:
+        states = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        with jobs.lock:
+            for job in jobs.jobs.values():
+                states[job.state] = states.get(job.state, 0) + 1
+    for state, count in states.items():
+        jobsByState.set(count, state=state)
+
+    for name, stats in models.stats().items():
+        modelsLoaded.set(int(stats["loaded"]), model=name)
+
+metrics.addCollector(collectState)
+
+@restAPI.before_request
+def startTimer():
+    g.requestStart = time.perf_counter()
+
+@restAPI.after_request
+def recordRequest(response):
+    endpoint = request.endpoint or "unknown"
+
+    requestsTotal.inc(endpoint=endpoint, method=request.method, status=str(response.status_code))
+    requestSeconds.observe(time.perf_counter() - g.requestStart, endpoint=endpoint)
+
+    if response.status_code >= 500:
+        requestErrors.inc(endpoint=endpoint)
+    if request.content_length:
+        uploadBytes.inc(request.content_length, endpoint=endpoint)
+
+    return response
 
 @restAPI.route('/transcribe', methods=['POST'])
 @audioPresent
+@modelKnown(modelNames)
 def transcribe():
     """
     Transcribes an audio file and returns the transcription.
 
     Parameters:
     audio (flask.FileStorage): The uploaded audio file.
+    model (str, optional): Form field. The name of the Whisper model to use. Defaults to modelName.
+    vad (str, optional): Form field. If "1", only the speech found by a voice activity detector is transcribed. Its thresholds are set by the vadThreshold, vadNoiseFloor, vadMinBandRatio, vadMaxFlatness, vadMinModulation, vadMinSpeech, vadMinSilence and vadPadding fields.
+    format (str, optional): Form field or query parameter. The format of the transcription: "srt", "vtt" (WebVTT), "tsv" or "jsonl" (JSON lines). Defaults to "srt".
+    stream (str, optional): Query parameter. If "1", the cues are sent in a chunked response of the requested format as soon as they are decoded.
 
     Returns:
     str: A JSON response containing the transcription and status code.
          If an error occurs during transcription, the response will contain an error message and status code 500.
     """
     audio = request.files["audio"]
+    name = request.form.get("model", modelName)
 
     try:
-        fileName = tempFile(audio, tempDirPath)
-        # saving the file 
+        vad = requestVAD(request.form)
+    except ValueError as e:
+        return json.dumps({"error":str(e), "status":400}), 400
 
-        transcription = trans.getTranscription(fileName)
-        # transcribing audio 
+    outputFormat = request.form.get("format", request.args.get("format", "srt"))
+    if outputFormat not in formats:
+        return json.dumps({"error":f"Unknown format {outputFormat}, expected one of {list(formats)}", "status":400}), 400
 
-        os.remove(fileName)
-        # removing the tempfile 
+    if request.args.get("stream") == "1":
+        def streamCues():
+            with models.use(name) as trans:
+                yield from trans.iterTranscription(audio.stream, vad=vad, format=outputFormat)
+
+        return Response(stream_with_context(streamCues()), mimetype=formatMimetypes[outputFormat])
+
+    try:
+        with models.use(name) as trans:
+            output = trans.getRawOutput(audio.stream, vad=vad)
+        with stageSeconds.time(stage="encode"):
+            transcription = encodeCues(output["segments"], outputFormat)
+        # transcribing audio, decoded straight from the upload stream
 
     except Exception as e:
         return json.dumps({"error":f"Can't read audio file due to [{e}]", "status":500}), 500
 
-    return json.dumps({"transcription": transcription, "status":200}), 200
+    return json.dumps({"transcription": transcription, "format": outputFormat, "cached": output["cached"], "vad": output.get("vad"), "status":200}), 200
 
 
 @restAPI.route('/text', methods=['POST'])
 @audioPresent
+@modelKnown(modelNames)
 def text():
     """
     Extracts text from an uploaded audio file and returns it as a JSON response.
 
     Parameters:
     audio (flask.FileStorage): The uploaded audio file.
+    model (str, optional): Form field. The name of the Whisper model to use. Defaults to modelName.
+    vad (str, optional): Form field. If "1", only the speech found by a voice activity detector is transcribed. Its thresholds are set by the vadThreshold, vadNoiseFloor, vadMinBandRatio, vadMaxFlatness, vadMinModulation, vadMinSpeech, vadMinSilence and vadPadding fields.
 
     Returns:
     tuple: A JSON response containing the extracted text and status code.
          If an error occurs during extraction, the response will contain an error message and status code 500.
     """
     audio = request.files["audio"]
+    name = request.form.get("model", modelName)
 
     try:
-        fileName = tempFile(audio, tempDirPath)
-        # saving the file
+        vad = requestVAD(request.form)
+    except ValueError as e:
+        return json.dumps({"error":str(e), "status":400}), 400
 
-        text = trans.getText(fileName)
+    try:
+        with models.use(name) as trans:
+            output = trans.getRawOutput(audio.stream, vad=vad)
+        text = output["text"]
         # getting text from audio
 
-        os.remove(fileName)
-        # removing the tempfile
-
     except Exception as e:
         return json.dumps({"error":f"Can't read audio file due to [{e}]", "status":500}), 500
 
-    return json.dumps({"text": text, "status":200}), 200
+    return json.dumps({"text": text, "cached": output["cached"], "vad": output.get("vad"), "status":200}), 200
 
 @restAPI.route('/rawSegments', methods=['POST'])
 @audioPresent
+@modelKnown(modelNames)
 def rawSegments():
     """
     Extracts raw audio segments from an uploaded audio file and returns them as a JSON response.
 
     Parameters:
     audio (flask.FileStorage): The uploaded audio file.
+    model (str, optional): Form field. The name of the Whisper model to use. Defaults to modelName.
+    vad (str, optional): Form field. If "1", only the speech found by a voice activity detector is transcribed. Its thresholds are set by the vadThreshold, vadNoiseFloor, vadMinBandRatio, vadMaxFlatness, vadMinModulation, vadMinSpeech, vadMinSilence and vadPadding fields.
+    words (str, optional): Form field. If "1", every segment also has a "words" list with the start, end and probability of each word.
 
     Returns:
     tuple: A JSON response containing the extracted raw audio segments and status code.
          If an error occurs during extraction, the response will contain an error message and status code 500.
     """
     audio = request.files["audio"]
-    
+    name = request.form.get("model", modelName)
+
     try:
-        fileName = tempFile(audio, tempDirPath)
-        # saving the file 
+        vad = requestVAD(request.form)
+    except ValueError as e:
+        return json.dumps({"error":str(e), "status":400}), 400
 
-        rawSegments = trans.getRawOutput(fileName)["segments"]
+    options = {"word_timestamps": True} if request.form.get("words") == "1" else {}
+    # only passed when asked for, so segment level results share their cache entries with the other routes
+
+    try:
+        with models.use(name) as trans:
+            output = trans.getRawOutput(audio.stream, vad=vad, **options)
+        rawSegments = output["segments"]
         # getting raw segments from audio 
 
+    except Exception as e:
+        return json.dumps({"error":f"Can't read audio file due to [{e}]", "status":500}), 500
+    
+    return json.dumps({"rawSegments": rawSegments, "cached": output["cached"], "vad": output.get("vad"), "status":200}), 200
+
+def removeTempFile(fileName:str):
+    with stageSeconds.time(stage="cleanup"):
         os.remove(fileName)
-        # removing the tempfile 
 
+def expireQueuedJobs():
+    """
+    Remove the queued jobs finished longer than jobTTL ago, with their results and inputs. Called whenever a job is queued or read, so an expired job is never returned.
+    """
+    for job in jobQueue.expire(jobTTL):
+        resultStore.remove(job["id"])
+        path = job["payload"].get("path")
+        if path is not None and os.path.exists(path):
+            removeTempFile(path)
+        # the input of a job that failed for good is already removed by its worker
+
+def enqueueJob(kind:str, upload, name:str, payload:dict):
+    """
+    Save an upload where the workers can read it and queue a job for it.
+
+    Parameters:
+    kind (str): The kind of the job, see jobHandlers in src/modules/worker.py.
+    upload (flask.FileStorage): The uploaded file.
+    name (str): The name of the model of the job.
+    payload (dict): The arguments of the job, to which the path of the saved upload is added.
+
+    Returns:
+    tuple: A JSON response containing the job id and status code 202.
+         If too many jobs are pending, the response will contain an error message and status code 503.
+         If the file can't be saved, the response will contain an error message and status code 500.
+    """
+    expireQueuedJobs()
+
+    counts = jobQueue.counts()
+    pending = counts["queued"] + counts["running"]
+    if pending >= jobMaxPending:
+        return json.dumps({"error":f"Can't queue job due to [{pending} jobs are already pending]", "status":503}), 503
+
+    try:
+        with stageSeconds.time(stage="upload_save"):
+            fileName = os.path.abspath(tempFile(upload, jobInputPath))
+    except Exception as e:
+        return json.dumps({"error":f"Can't read file due to [{e}]", "status":500}), 500
+
+    jobID = jobQueue.put(kind, name, {**payload, "path": fileName})
+    return json.dumps({"id": jobID, "state": "queued", "status":202}), 202
+
+@restAPI.route('/jobs', methods=['POST'])
+@audioPresent
+@modelKnown(modelNames)
+def submitJob():
+    """
+    Queues an uploaded audio file for transcription in the background and returns the id of the job immediately.
+
+    Parameters:
+    audio (flask.FileStorage): The uploaded audio file.
+    model (str, optional): Form field. The name of the Whisper model to use. Defaults to modelName.
+    vad (str, optional): Form field. If "1", only the speech found by a voice activity detector is transcribed. Its thresholds are set by the vadThreshold, vadNoiseFloor, vadMinBandRatio, vadMaxFlatness, vadMinModulation, vadMinSpeech, vadMinSilence and vadPadding fields.
+
+    Returns:
+    tuple: A JSON response containing the job id and status code 202.
+         If too many jobs are pending, the response will contain an error message and status code 503.
+         If the file can't be saved, the response will contain an error message and status code 500.
+
+    With jobQueuePath set, the job is queued for the worker processes instead of run by this process.
+    """
+    audio = request.files["audio"]
+    name = request.form.get("model", modelName)
+
+    try:
+        vad = requestVAD(request.form)
+    except ValueError as e:
+        return json.dumps({"error":str(e), "status":400}), 400
+
+    if jobQueue is not None:
+        return enqueueJob("transcribe", audio, name, {"vad": vad.options() if vad is not None else None})
+
+    try:
+        with stageSeconds.time(stage="upload_save"):
+            fileName = tempFile(audio, tempDirPath)
+        # saving the file, the request stream is closed before the job runs
     except Exception as e:
         return json.dumps({"error":f"Can't read audio file due to [{e}]", "status":500}), 500
-    
-    return json.dumps({"rawSegments": rawSegments, "status":200}), 200
\ No newline at end of file
+
+    def transcribeJob(job):
+        with models.use(name) as trans:
+            output = trans.getChunkedOutput(fileName, job.setProgress, vad=vad)
+        # chunk by chunk, so the progress moves during the job and not only at its end
+        with stageSeconds.time(stage="encode"):
+            transcription = encodeSegments(output["segments"])
+
+        return {
+            "transcription": transcription,
+            "text": output["text"],
+            "rawSegments": output["segments"],
+            "cached": output["cached"],
+            "vad": output.get("vad"),
+        }
+
+    try:
+        job = jobs.submit(transcribeJob, partial(removeTempFile, fileName))
+    except JobQueueFull as e:
+        return json.dumps({"error":f"Can't queue job due to [{e}]", "status":503}), 503
+
+    return json.dumps({"id": job.id, "state": job.state, "status":202}), 202
+
+
+@restAPI.route('/jobs/<jobID>', methods=['GET'])
+def getJob(jobID):
+    """
+    Returns the state of a background transcription job.
+
+    Parameters:
+    jobID (str): The id returned when the job was queued.
+
+    Returns:
+    tuple: A JSON response containing the state of the job, its progress as the timestamp in seconds transcribed so far, and once it is done the transcription, text and raw segments.
+         If the job does not exist or has expired, the response will contain an error message and status code 404.
+
+    With jobQueuePath set, the state is read from the queue and the result from the result store the workers write to, and the response also has the kind of the job and the number of times it was started.
+    """
+    if jobQueue is not None:
+        expireQueuedJobs()
+        job = jobQueue.get(jobID)
+        if job is None:
+            return json.dumps({"error":"Job not found", "status":404}), 404
+
+        jobDict = {"id": job["id"], "kind": job["kind"], "state": job["state"], "progress": job["progress"], "attempts": job["attempts"]}
+        if job["state"] == "done":
+            jobDict["result"] = resultStore.get(jobID)
+        elif job["state"] == "failed":
+            jobDict["error"] = job["error"]
+
+        return json.dumps({**jobDict, "status":200}), 200
+
+    job = jobs.get(jobID)
+
+    if job is None:
+        return json.dumps({"error":"Job not found", "status":404}), 404
+
+    return json.dumps({**job.toDict(), "status":200}), 200
+
+@restAPI.route('/jobs/subtitleVideo', methods=['POST'])
+@videoPresent
+@modelKnown(modelNames)
+def submitVideoJob():
+    """
+    Queues an uploaded video to be subtitled by a worker process and returns the id of the job immediately.
+
+    Parameters:
+    video (flask.FileStorage): The uploaded video file.
+    model (str, optional): Form field. The name of the Whisper model to use. Defaults to modelName.
+    vad (str, optional): Form field. If "1", only the speech found by a voice activity detector is transcribed. Its thresholds are set by the vadThreshold, vadNoiseFloor, vadMinBandRatio, vadMaxFlatness, vadMinModulation, vadMinSpeech, vadMinSilence and vadPadding fields.
+    karaoke (str, optional): Form field. If "1", the video is transcribed with word timestamps and the word being spoken is highlighted.
+
+    Returns:
+    tuple: A JSON response containing the job id and status code 202. Once the job is done, /jobs/<jobID> has its raw segments and /jobs/<jobID>/video the subtitled video.
+         If no job queue is configured, the response will contain an error message and status code 501.
+         If too many jobs are pending, the response will contain an error message and status code 503.
+    """
+    if jobQueue is None:
+        return json.dumps({"error":"Video jobs need a job queue, set jobQueuePath", "status":501}), 501
+
+    name = request.form.get("model", modelName)
+
+    try:
+        vad = requestVAD(request.form)
+    except ValueError as e:
+        return json.dumps({"error":str(e), "status":400}), 400
+
+    config = {
+        "fontFamily": videoFont, "scale": videoFontScale, "thickness": videoFontThickness, "lineSpacing": videoLineSpacing,
+        "color": (255, 255, 255), "relativePos": (0.5, 0.85), "maxLineWidth": 0.9, "karaoke": request.form.get("karaoke") == "1",
+    }
+    return enqueueJob("subtitleVideo", request.files["video"], name, {"vad": vad.options() if vad is not None else None, "config": config})
+
+
+@restAPI.route('/jobs/<jobID>/video', methods=['GET'])
+def getJobVideo(jobID):
+    """
+    Returns the subtitled video of a finished video job.
+
+    Parameters:
+    jobID (str): The id returned when the job was queued.
+
+    Returns:
+    Response: The subtitled video as MP4.
+         If the job does not exist, has expired or has no video yet, the response will contain an error message and status code 404.
+    """
+    if jobQueue is not None:
+        expireQueuedJobs()
+        # a job past its time to live is removed before its video is looked up
+
+    filePath = resultStore.filePath(jobID) if resultStore is not None else None
+
+    if filePath is None or not os.path.exists(filePath):
+        return json.dumps({"error":"Video not found", "status":404}), 404
+
+    def streamVideo():
+        with open(filePath, "rb") as f:
+            yield from iter(lambda: f.read(1024*1024), b"")
+
+    return Response(streamVideo(), mimetype="video/mp4", headers={"Content-Length": str(os.path.getsize(filePath))})
+
+
+@restAPI.route('/subtitleVideo', methods=['POST'])
+@videoPresent
+@modelKnown(modelNames)
+def subtitleVideoFile():
+    """
+    Transcribes an uploaded video and returns it with the subtitles drawn on it, in one pass.
+
+    Parameters:
+    video (flask.FileStorage): The uploaded video file.
+    model (str, optional): Form field. The name of the Whisper model to use. Defaults to modelName.
+    vad (str, optional): Form field. If "1", only the speech found by a voice activity detector is transcribed. Its thresholds are set by the vadThreshold, vadNoiseFloor, vadMinBandRatio, vadMaxFlatness, vadMinModulation, vadMinSpeech, vadMinSilence and vadPadding fields.
+    karaoke (str, optional): Form field. If "1", the video is transcribed with word timestamps and the word being spoken is highlighted.
+
+    Returns:
+    Response: The subtitled video as MP4, with the audio of the upload.
+         If an error occurs, the response will contain an error message and status code 500.
+
+    The audio track is decoded in memory and the frames are rendered while the rest of the audio is still being transcribed, see subtitleVideo.
+    """
+    video = request.files["video"]
+    name = request.form.get("model", modelName)
+    karaoke = request.form.get("karaoke") == "1"
+
+    try:
+        vad = requestVAD(request.form)
+    except ValueError as e:
+        return json.dumps({"error":str(e), "status":400}), 400
+
+    try:
+        with stageSeconds.time(stage="upload_save"):
+            fileName = tempFile(video, tempDirPath)
+        # decord needs a file it can seek in
+    except Exception as e:
+        return json.dumps({"error":f"Can't read video file due to [{e}]", "status":500}), 500
+
+    outputPath = f"{os.path.splitext(fileName)[0]}.subtitled.mp4"
+    config = SubtitleConfig(videoFont, videoFontScale, videoFontThickness, videoLineSpacing, (255, 255, 255), (0.5, 0.85), maxLineWidth=0.9, karaoke=karaoke)
+
+    try:
+        with models.use(name) as trans:
+            subtitleVideo(trans, fileName, config, outputPath, vad=vad, **({"word_timestamps": True} if karaoke else {}))
+    except Exception as e:
+        if os.path.exists(outputPath):
+            removeTempFile(outputPath)
+        return json.dumps({"error":f"Can't subtitle video file due to [{e}]", "status":500}), 500
+    finally:
+        removeTempFile(fileName)
+
+    def streamVideo():
+        try:
+            with open(outputPath, "rb") as f:
+                yield from iter(lambda: f.read(1024*1024), b"")
+        finally:
+            removeTempFile(outputPath)
+        # removed once sent, or when the client goes away
+
+    return Response(streamVideo(), mimetype="video/mp4", headers={"Content-Length": str(os.path.getsize(outputPath))})
+
+
+def liveCaptions(ws):
+    """
+    Transcribes live audio sent over a WebSocket and sends captions back as they are decoded.
+
+    Parameters:
+    ws (simple_websocket.Server): The WebSocket. The client sends binary messages of mono 16 kHz little endian 16 bit PCM, and the text message "end" when the stream is over.
+    model (str, optional): Query parameter. The name of the Whisper model to use. Defaults to modelName.
+    language (str, optional): Query parameter. The language of the audio, detected on every window if not given.
+
+    Every decode sends JSON messages: "committed" events with the SRT "cue" of a segment that won't change, then a "provisional" event with the text that may still change. After "end", the last segments are committed and a "stats" message describes the stream. The latency and the decode time per second of audio are bounded by liveWindowLength, liveStepLength, liveCommitDelay and liveCPUBudget, see LiveTranscriber.
+    """
+    name = request.args.get("model", modelName)
+    if name not in modelNames:
+        ws.send(json.dumps({"type": "error", "error": f"Unknown model {name}, expected one of {sorted(modelNames)}", "status": 400}))
+        return
+
+    options = {"language": request.args["language"]} if "language" in request.args else {}
+
+    with models.use(name) as trans:
+        live = LiveTranscriber(trans, liveWindowLength, liveStepLength, liveCommitDelay, liveBufferLength, liveCPUBudget, **options)
+
+        while True:
+            message = ws.receive(timeout=liveStepLength)
+            # waking up without new audio still lets a slow client see the provisional text
+
+            ended = isinstance(message, str) and message.strip() == "end"
+
+            if isinstance(message, (bytes, bytearray)):
+                live.feed(message)
+
+            for event in live.finish() if ended else live.step():
+                ws.send(json.dumps(event))
+
+            if ended:
+                break
+
+        ws.send(json.dumps({"type": "stats", **live.stats()}))
+
+if Sock is not None:
+    Sock().route('/live', bp=restAPI)(liveCaptions)
+else:
+    warnings.warn("flask-sock is not installed, the /live endpoint is not registered")
+
+
+@restAPI.route('/models', methods=['GET'])
+def listModels():
+    """
+    Returns the models that can be asked for in the "model" form field and their state.
+
+    Returns:
+    tuple: A JSON response containing the default model, the memory budget in bytes, and for every model whether it is loaded, its size in bytes, how long its last load took in seconds and how many times it was loaded. It also has the models preloaded into shared memory and the memory of the process answering, see memoryReport.
+    """
+    return json.dumps({"default": modelName, "memoryBudget": modelMemoryBudget, "models": models.stats(), "sharedModels": sharedModels.stats(), "process": {"pid": os.getpid(), **memoryReport()}, "status":200}), 200
+
+
+@restAPI.route('/metrics', methods=['GET'])
+def getMetrics():
+    """
+    Returns the metrics of the service in the Prometheus text exposition format.
+
+    Returns:
+    Response: The request counts and latencies, the time spent in every stage of a transcription (upload_save, cache_lookup, decode, vad, inference, encode and cleanup), the real time factor of every model, and the state of the cache, the jobs and the models.
+    """
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
\ No newline at end of file
@@ -0,0 +1,78 @@
+from simple_websocket import Client, ConnectionClosed
+from threading import Thread
+from src.modules.audio import loadAudio, SAMPLE_RATE
+import numpy as np
+import json
+import time
+
+def replay(url:str, audioFile:str, chunkLength:float=0.25, speed:float=1.0, onEvent=print) -> list[dict]:
+    """
+    Stream an audio file to the live captioning WebSocket at real time speed, like a microphone would.
+
+    Args:
+    url (str): The URL of the endpoint, such as "ws://localhost:5000/live".
+    audioFile (str): The audio file, decoded to 16 kHz with ffmpeg.
+    chunkLength (float, optional): The seconds of audio sent per message. Defaults to 0.25.
+    speed (float, optional): How many times faster than real time the audio is sent. Defaults to 1.
+    onEvent (Callable[[dict], None], optional): Called with every event received. Defaults to print.
+
+    Returns:
+    list[dict]: The events received, in order.
+    """
+    pcm = (np.clip(loadAudio(audioFile), -1, 1) * 32767).astype("<i2")
+    chunkSize = max(1, round(chunkLength * SAMPLE_RATE))
+
+    ws = Client.connect(url)
+    events = []
+
+    def receive():
+        try:
+            while True:
+                event = json.loads(ws.receive())
+                events.append(event)
+                onEvent(event)
+                if event["type"] in ("stats", "error"):
+                    return
+        except ConnectionClosed:
+            pass
+
+    receiver = Thread(target=receive, daemon=True)
+    receiver.start()
+
+    start = time.perf_counter()
+    try:
+        for i in range(0, len(pcm), chunkSize):
+            delay = start + i / SAMPLE_RATE / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            # paced by the clock, so slow sends don't add up
+
+            ws.send(pcm[i:i+chunkSize].tobytes())
+
+        ws.send("end")
+        receiver.join()
+    finally:
+        ws.close()
+
+    return events
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Replay an audio file to the live captioning endpoint at real time speed and print the captions.")
+    parser.add_argument("audio", help="The audio file to stream.")
+    parser.add_argument("--url", default="ws://localhost:5000/live", help="The URL of the live captioning endpoint, with query parameters such as ?model=tiny.")
+    parser.add_argument("--chunk", type=float, default=0.25, help="The seconds of audio sent per message.")
+    parser.add_argument("--speed", type=float, default=1.0, help="How many times faster than real time the audio is sent.")
+    args = parser.parse_args()
+
+    def show(event):
+        if event["type"] == "committed":
+            print(event["cue"], end="", flush=True)
+        elif event["type"] == "provisional":
+            print(f"... {event['text'].strip()}", flush=True)
+        else:
+            print(json.dumps(event), flush=True)
+
+    replay(args.url, args.audio, args.chunk, args.speed, show)
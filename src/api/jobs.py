@@ -0,0 +1,147 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Callable
+from uuid import uuid4
+import time
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self) -> None:
+        """
+        Initialize a Job object describing one background transcription.
+
+        Returns:
+        None
+
+        A job starts in the "queued" state, moves to "running" once a worker picks it up, and ends in either "done", with its result set, or "failed", with its error set. The progress is the timestamp in seconds transcribed so far.
+        """
+        self.id = uuid4().hex
+        self.state = "queued"
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+
+        self.created = time.time()
+        self.finished = None
+
+    @property
+    def done(self) -> bool:
+        return self.state in ("done", "failed")
+
+    def setProgress(self, progress:float) -> None:
+        self.progress = max(self.progress, progress)
+
+    def toDict(self) -> dict:
+        jobDict = {"id": self.id, "state": self.state, "progress": self.progress}
+
+        if self.state == "done":
+            jobDict["result"] = self.result
+        elif self.state == "failed":
+            jobDict["error"] = self.error
+
+        return jobDict
+
+    def __repr__(self) -> str:
+        return f"Job(id={self.id}, state={self.state}, progress={self.progress})"
+
+
+class JobManager:
+    def __init__(self, maxWorkers:int=2, maxPending:int=32, ttl:float=3600) -> None:
+        """
+        Initialize a JobManager that runs jobs on a bounded pool of worker threads.
+
+        Args:
+        maxWorkers (int, optional): The number of jobs running at the same time. Defaults to 2.
+        maxPending (int, optional): The maximum number of queued and running jobs. Submitting more raises JobQueueFull. Defaults to 32.
+        ttl (float, optional): The number of seconds a finished job is kept before it expires. Defaults to 3600.
+
+        Returns:
+        None
+        """
+        self.maxPending = maxPending
+        self.ttl = ttl
+
+        self.executor = ThreadPoolExecutor(maxWorkers, thread_name_prefix="JobManager")
+        self.jobs = {}
+        self.lock = Lock()
+
+    def submit(self, func:Callable[[Job], dict], cleanup:Callable[[], None]|None=None) -> Job:
+        """
+        Queue a function to be run in the background.
+
+        Args:
+        func (Callable[[Job], dict]): The function to run. It receives the job, so it can report progress, and returns the result of the job.
+        cleanup (Callable[[], None] | None, optional): Called after the function finished, whether it succeeded or not, or if the job is rejected. Defaults to None.
+
+        Returns:
+        Job: The queued job.
+
+        Raises:
+        JobQueueFull: If 'maxPending' jobs are already queued or running.
+        """
+        self.expire()
+
+        with self.lock:
+            pending = sum(not job.done for job in self.jobs.values())
+            if pending >= self.maxPending:
+                if cleanup is not None:
+                    cleanup()
+                raise JobQueueFull(f"{pending} jobs are already pending")
+
+            job = Job()
+            self.jobs[job.id] = job
+
+        self.executor.submit(self.run, job, func, cleanup)
+        return job
+
+    def run(self, job:Job, func:Callable[[Job], dict], cleanup:Callable[[], None]|None) -> None:
+        job.state = "running"
+
+        try:
+            result = func(job)
+        except Exception as e:
+            job.error = str(e)
+            job.finished = time.time()
+            job.state = "failed"
+        else:
+            job.result = result
+            job.finished = time.time()
+            job.state = "done"
+        finally:
+            if cleanup is not None:
+                cleanup()
+
+    def get(self, jobID:str) -> Job|None:
+        """
+        Look up a job by its id.
+
+        Args:
+        jobID (str): The id of the job.
+
+        Returns:
+        Job | None: The job, or None if it does not exist or has expired.
+        """
+        self.expire()
+
+        with self.lock:
+            return self.jobs.get(jobID)
+
+    def expire(self) -> None:
+        """
+        Remove the finished jobs that are older than the time to live.
+
+        Returns:
+        None
+        """
+        now = time.time()
+
+        with self.lock:
+            expired = [jobID for jobID, job in self.jobs.items() if job.done and now - job.finished > self.ttl]
+            for jobID in expired:
+                del self.jobs[jobID]
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,131 @@
+from werkzeug.serving import make_server
+from src.modules.shared import memoryReport
+from src.modules.cpu import configureThreads
+import src.api.app as api
+import traceback
+import signal
+import socket
+import json
+import os
+
+def formatBytes(size:int) -> str:
+    return f"{size / 1024**2:.1f} MiB"
+
+def runWorker(app, host:str, port:int, listener:socket.socket, index:int, threads:int|None) -> None:
+    """
+    Serve requests in a forked worker process until it is terminated.
+
+    Args:
+    app (flask.Flask): The application.
+    host (str): The host the listener is bound to.
+    port (int): The port the listener is bound to.
+    listener (socket.socket): The listening socket inherited from the parent. Every worker accepts connections from it.
+    index (int): The number of the worker, for its report.
+    threads (int | None): The number of torch threads of the worker.
+
+    Returns:
+    None
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    configureThreads(threads, 1)
+    # the workers already run in parallel, and the parent never started the torch thread pools
+
+    server = make_server(host, port, app, threaded=True, fd=listener.fileno())
+
+    report = memoryReport()
+    print(f"Worker {index} (pid {os.getpid()}): " + ", ".join(f"{name} {formatBytes(size)}" for name, size in report.items()), flush=True)
+
+    server.serve_forever()
+
+def serve(app, host:str="127.0.0.1", port:int=5000, workers:int=2, preload:list[str]|None=None, threads:int|None=None) -> None:
+    """
+    Serve the application with pre-forked worker processes sharing the weights of the preloaded models.
+
+    Args:
+    app (flask.Flask): The application, with the restAPI blueprint registered.
+    host (str, optional): The host to listen on. Defaults to "127.0.0.1".
+    port (int, optional): The port to listen on. Defaults to 5000.
+    workers (int, optional): The number of worker processes. Defaults to 2.
+    preload (list[str] | None, optional): The models loaded into shared memory before forking. Defaults to the default model of the API.
+    threads (int | None, optional): The number of torch threads of every worker. Defaults to the number of CPUs divided by the number of workers.
+
+    Returns:
+    None
+
+    The parent process binds the socket and loads the models once, with their weights moved into shared memory, then forks the workers and restarts any that dies. A worker asking for a model that wasn't preloaded loads its own copy. Every worker prints its memory at startup, and /models reports the memory of the worker answering. SIGTERM or SIGINT stop the workers and the parent.
+    """
+    if not hasattr(os, "fork"):
+        raise RuntimeError("Pre-forked workers need os.fork, run main.py with --debug on this platform")
+
+    preload = preload if preload is not None else [api.modelName]
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+
+    listener = socket.create_server((host, port), family=socket.AF_INET6 if ":" in host else socket.AF_INET, backlog=128)
+    listener.set_inheritable(True)
+
+    shared = api.sharedModels.preload(preload, api.models.device)
+    print(f"Shared {json.dumps({name: formatBytes(size) for name, size in shared.items()})} of model weights, parent: " + ", ".join(f"{name} {formatBytes(size)}" for name, size in memoryReport().items()), flush=True)
+
+    children = {}
+    stopping = False
+
+    def spawn(index:int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                runWorker(app, host, port, listener, index, threads)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = index
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for index in range(workers):
+        spawn(index)
+    print(f"Serving on http://{host}:{port} with {workers} workers", flush=True)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+
+        index = children.pop(pid, None)
+        if index is not None and not stopping:
+            print(f"Worker {index} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}, restarting it", flush=True)
+            spawn(index)
+
+    listener.close()
+
+def main(app) -> None:
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Serve the transcription API with pre-forked workers sharing the model weights.")
+    parser.add_argument("--host", default="127.0.0.1", help="The host to listen on.")
+    parser.add_argument("--port", type=int, default=5000, help="The port to listen on.")
+    parser.add_argument("--workers", type=int, default=2, help="The number of worker processes.")
+    parser.add_argument("--preload", default=None, help="The models loaded into shared memory before forking, comma separated. Defaults to the default model.")
+    parser.add_argument("--threads", type=int, default=None, help="The number of torch threads of every worker. Defaults to the CPUs divided between the workers.")
+    parser.add_argument("--debug", action="store_true", help="Run the single process Flask development server with the debugger instead.")
+    args = parser.parse_args()
+
+    if args.debug:
+        app.run(args.host, args.port, debug=True)
+    else:
+        serve(app, args.host, args.port, args.workers, args.preload.split(",") if args.preload else None, args.threads)
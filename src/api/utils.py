@@ -1,9 +1,32 @@
-from flask import request
+from flask import request, Request
 import json
 from uuid import uuid1
 from werkzeug.datastructures import FileStorage
+import tempfile
 import os
 from functools import wraps
+from src.modules.vad import VoiceActivityDetector
+
+vadFields = {
+    "vadThreshold": "threshold",
+    "vadNoiseFloor": "noiseFloor",
+    "vadMinBandRatio": "minBandRatio",
+    "vadMaxFlatness": "maxFlatness",
+    "vadMinModulation": "minModulation",
+    "vadMinSpeech": "minSpeech",
+    "vadMinSilence": "minSilence",
+    "vadPadding": "padding",
+}
+
+class UploadRequest(Request):
+    """
+    A request keeping uploaded files in memory up to memoryLimit bytes, where Werkzeug spools any upload over 500 KB to a temporary file. Set it as the request_class of the app, so uploads reach ffmpeg from memory without a round trip through the disk.
+    """
+    memoryLimit = 256*1024**2
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=self.memoryLimit)
+        # only uploads larger than the limit are written to disk
 
 def audioPresent(func):
     """
@@ -24,6 +47,48 @@ def audioPresent(func):
     
     return decoratedFunc
 
+def videoPresent(func):
+    """
+    Decorator function to check if a video file is present in the request.
+    If the video file is not found, it returns a JSON response with an error message and status code 404.
+
+    Parameters:
+    - func (function): The function to be decorated.
+
+    Returns:
+    - decoratedFunc (function): The decorated function that checks for the presence of a video file in the request.
+    """
+    @wraps(func)
+    def decoratedFunc():
+        if "video" not in request.files:
+            return json.dumps({"error":"Video file not found", "status":404}), 404
+        return func()
+
+    return decoratedFunc
+
+def modelKnown(names):
+    """
+    Decorator factory to check that the model asked for in the "model" form field of the request, if any, is one of the given names.
+    If it is not, the decorated function returns a JSON response with an error message and status code 400.
+
+    Parameters:
+    - names (Collection[str]): The names of the models that can be used.
+
+    Returns:
+    - decorator (function): The decorator checking the requested model.
+    """
+    def decorator(func):
+        @wraps(func)
+        def decoratedFunc(*args, **kwargs):
+            name = request.form.get("model")
+            if name is not None and name not in names:
+                return json.dumps({"error":f"Unknown model {name}, expected one of {sorted(names)}", "status":400}), 400
+            return func(*args, **kwargs)
+
+        return decoratedFunc
+
+    return decorator
+
 def tempFile(file, dst:str):
     """
     This function saves the provided file to a temporary location with a unique ID and extension.
@@ -33,12 +98,47 @@ def tempFile(file, dst:str):
     - dst (str): The destination directory path where the temporary file will be saved.
 
     Returns:
-    - fileName (str): The full path of the saved temporary file.
+    - fileName (str): The full path of the saved temporary file. The caller is responsible for removing it.
+
+    If saving fails, the partially written file is removed before the error is raised.
     """
     fileID = str(uuid1())
     fileExtension = file.filename.split(".")[-1]
     fileName = os.path.join(dst, f"{fileID}.{fileExtension}")
 
-    file.save(fileName)
+    os.makedirs(dst, exist_ok=True)
+
+    try:
+        file.save(fileName)
+    except Exception:
+        if os.path.exists(fileName):
+            os.remove(fileName)
+        raise
+
+    return fileName
+
+def requestVAD(form) -> VoiceActivityDetector|None:
+    """
+    This function builds the voice activity detector asked for in the form fields of a request.
+
+    Parameters:
+    - form (MultiDict): The form fields of the request. "vad" set to "1" enables the detector, and the fields of 'vadFields' override its thresholds.
+
+    Returns:
+    - vad (VoiceActivityDetector | None): The detector, or None if it was not asked for.
+
+    Raises:
+    - ValueError: If a threshold is not a number.
+    """
+    if form.get("vad") != "1":
+        return None
+
+    options = {}
+    for field, option in vadFields.items():
+        if field in form:
+            try:
+                options[option] = float(form[field])
+            except ValueError:
+                raise ValueError(f"{field} must be a number, got {form[field]!r}")
 
-    return fileName
\ No newline at end of file
+    return VoiceActivityDetector(**options)
\ No newline at end of file
@@ -1,3 +1,9 @@
 from src.modules.transcriber import Transcriber
-from src.modules.subtitle import SubtitleConfig, Subtitle
-from src.modules.video import VideoTranscriber
\ No newline at end of file
+from src.modules.cache import TranscriptionCache
+from src.modules.scheduler import BatchScheduler
+from src.modules.parallel import ParallelTranscriber
+from src.modules.registry import ModelRegistry
+from src.modules.vad import VoiceActivityDetector
+from src.modules.subtitle import SubtitleConfig, Subtitle, KaraokeSubtitle, SubtitleIndex, layoutCache
+from src.modules.video import VideoTranscriber
+from src.modules.metrics import metrics, MetricsRegistry
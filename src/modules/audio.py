@@ -0,0 +1,277 @@
+from tempfile import NamedTemporaryFile, SpooledTemporaryFile
+from threading import Thread
+from typing import BinaryIO
+from io import BytesIO
+import numpy as np
+import subprocess
+import shutil
+import os
+
+SAMPLE_RATE = 16000
+
+class AudioDecodeError(Exception):
+    pass
+
+
+def ffmpegCommand(source:str, sampleRate:int=SAMPLE_RATE) -> list[str]:
+    """
+    Build the ffmpeg command that decodes the source to mono 16 bit PCM written to stdout.
+
+    Args:
+    source (str): The input of ffmpeg, either a file path or "pipe:0" to read from stdin.
+    sampleRate (int, optional): The sample rate of the decoded audio. Defaults to 16000.
+
+    Returns:
+    list[str]: The command line arguments.
+    """
+    return ["ffmpeg", "-hide_banner", "-loglevel", "error", "-threads", "0", "-i", source, "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sampleRate), "pipe:1"]
+
+def pcmToFloat(pcm:bytes) -> np.ndarray:
+    return np.frombuffer(pcm, np.int16).astype(np.float32) / 32768.0
+
+def decodeFile(fileName:str, sampleRate:int=SAMPLE_RATE) -> np.ndarray:
+    """
+    Decode an audio or video file to a mono float32 array.
+
+    Args:
+    fileName (str): The path to the file.
+    sampleRate (int, optional): The sample rate of the decoded audio. Defaults to 16000.
+
+    Returns:
+    np.ndarray: The decoded samples in the range [-1, 1].
+
+    Raises:
+    AudioDecodeError: If ffmpeg can't decode the file.
+    """
+    process = subprocess.run(["ffmpeg", "-nostdin", *ffmpegCommand(fileName, sampleRate)[1:]], capture_output=True)
+
+    if process.returncode != 0:
+        raise AudioDecodeError(process.stderr.decode(errors="replace").strip())
+
+    return pcmToFloat(process.stdout)
+
+def decodeStream(stream:BinaryIO, sampleRate:int=SAMPLE_RATE, blockSize:int=64*1024) -> np.ndarray:
+    """
+    Decode audio read from a file-like object by piping it through ffmpeg, without writing it to disk.
+
+    Args:
+    stream (BinaryIO): The file-like object containing the encoded audio, read from its current position.
+    sampleRate (int, optional): The sample rate of the decoded audio. Defaults to 16000.
+    blockSize (int, optional): The number of bytes written to ffmpeg at a time. Defaults to 64 KiB.
+
+    Returns:
+    np.ndarray: The decoded samples in the range [-1, 1].
+
+    Raises:
+    AudioDecodeError: If ffmpeg can't decode the stream. Containers that need seeking, such as MP4 files with the index at the end, can't be decoded from a pipe.
+    """
+    process = subprocess.Popen(ffmpegCommand("pipe:0", sampleRate), stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def feed():
+        try:
+            for block in iter(lambda: stream.read(blockSize), b""):
+                process.stdin.write(block)
+        except (BrokenPipeError, OSError):
+            pass
+            # ffmpeg stopped reading, its exit code tells why
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    feeder = Thread(target=feed, daemon=True)
+    feeder.start()
+    # writing and reading on different threads, so neither pipe fills up and blocks ffmpeg
+
+    pcm = process.stdout.read()
+    error = process.stderr.read()
+    # with the log level at "error" ffmpeg writes little enough to stderr to never fill its pipe
+    process.wait()
+    feeder.join()
+
+    if process.returncode != 0 or (error and not pcm):
+        raise AudioDecodeError(error.decode(errors="replace").strip())
+    # ffmpeg 7 exits with 0 after a demuxing error, such as a pipe ending before the index of an MP4 file, having decoded nothing
+
+    return pcmToFloat(pcm)
+
+class TeeReader:
+    def __init__(self, stream:BinaryIO, copy:BinaryIO) -> None:
+        """
+        Wrap a file-like object, writing every block read from it to a copy.
+
+        Args:
+        stream (BinaryIO): The file-like object to read from.
+        copy (BinaryIO): The file-like object receiving the bytes read.
+
+        Returns:
+        None
+        """
+        self.stream = stream
+        self.copy = copy
+
+    def read(self, size:int=-1) -> bytes:
+        block = self.stream.read(size)
+        self.copy.write(block)
+        return block
+
+def loadAudio(audio:str|np.ndarray|bytes|BinaryIO, sampleRate:int=SAMPLE_RATE) -> np.ndarray:
+    """
+    Load audio given as a path, an array, bytes or a file-like object into a mono float32 array.
+
+    Args:
+    audio (str | np.ndarray | bytes | BinaryIO): The audio. Arrays are assumed to already be sampled at 'sampleRate'.
+    sampleRate (int, optional): The sample rate of the decoded audio. Defaults to 16000.
+
+    Returns:
+    np.ndarray: The decoded samples in the range [-1, 1].
+
+    Raises:
+    AudioDecodeError: If the audio can't be decoded.
+
+    Bytes and file-like objects are piped through ffmpeg. If that fails, for example because the container needs seeking, the data is written to a temporary file which is decoded instead and always removed afterwards.
+    """
+    if isinstance(audio, np.ndarray):
+        return audio.astype(np.float32, copy=False)
+
+    if isinstance(audio, (str, os.PathLike)):
+        return decodeFile(os.fspath(audio), sampleRate)
+
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        audio = BytesIO(audio)
+
+    seekable = hasattr(audio, "seekable") and audio.seekable()
+    spool = None if seekable else SpooledTemporaryFile(max_size=32*1024**2)
+    start = audio.tell() if seekable else 0
+
+    try:
+        try:
+            return decodeStream(audio if seekable else TeeReader(audio, spool), sampleRate)
+        except AudioDecodeError:
+            if seekable:
+                audio.seek(start)
+                return decodeFallback(audio, sampleRate)
+
+            shutil.copyfileobj(audio, spool)
+            # the pipe may have stopped reading before the end of the stream
+            spool.seek(0)
+            return decodeFallback(spool, sampleRate)
+    finally:
+        if spool is not None:
+            spool.close()
+
+def decodeFallback(stream:BinaryIO, sampleRate:int=SAMPLE_RATE) -> np.ndarray:
+    """
+    Decode a file-like object by writing it to a temporary file first.
+
+    Args:
+    stream (BinaryIO): The file-like object containing the encoded audio, read from its current position.
+    sampleRate (int, optional): The sample rate of the decoded audio. Defaults to 16000.
+
+    Returns:
+    np.ndarray: The decoded samples in the range [-1, 1].
+    """
+    with NamedTemporaryFile(delete=False) as f:
+        fileName = f.name
+        shutil.copyfileobj(stream, f)
+
+    try:
+        return decodeFile(fileName, sampleRate)
+    finally:
+        os.remove(fileName)
+
+def frameEnergy(audio:np.ndarray, frameLength:int, hopLength:int) -> np.ndarray:
+    """
+    Compute the energy of overlapping frames of the audio in decibels.
+
+    Args:
+    audio (np.ndarray): The audio samples.
+    frameLength (int): The number of samples per frame.
+    hopLength (int): The number of samples between the starts of consecutive frames.
+
+    Returns:
+    np.ndarray: The RMS energy of every frame in dB relative to full scale. Frame i starts at sample i*hopLength.
+    """
+    if len(audio) < frameLength:
+        audio = np.pad(audio, (0, frameLength - len(audio)))
+
+    frames = np.lib.stride_tricks.sliding_window_view(audio, frameLength)[::hopLength]
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+def findSilences(audio:np.ndarray, sampleRate:int=SAMPLE_RATE, threshold:float=-40.0, minSilence:float=0.3, frameDuration:float=0.03) -> list[tuple[int, int]]:
+    """
+    Find the silent stretches of the audio.
+
+    Args:
+    audio (np.ndarray): The audio samples.
+    sampleRate (int, optional): The sample rate of the audio. Defaults to 16000.
+    threshold (float, optional): Frames quieter than this many dB below the loudest frame are silent. Defaults to -40.0.
+    minSilence (float, optional): The minimum length in seconds of a silent stretch. Defaults to 0.3.
+    frameDuration (float, optional): The length in seconds of the analysis frames. Defaults to 0.03.
+
+    Returns:
+    list[tuple[int, int]]: The (start, end) sample indices of every silent stretch.
+    """
+    frameLength = max(1, round(frameDuration * sampleRate))
+    energy = frameEnergy(audio, frameLength, frameLength)
+
+    silent = energy < energy.max() + threshold
+    edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    # runs of silent frames, as [start, end) frame indices
+
+    minFrames = minSilence / frameDuration
+    return [(int(start * frameLength), int(min(end * frameLength, len(audio)))) for start, end in zip(starts, ends) if end - start >= minFrames]
+
+def splitOnSilence(audio:np.ndarray, sampleRate:int=SAMPLE_RATE, maxChunkLength:float=600.0, minChunkLength:float=60.0, overlap:float=2.0, **silenceOptions) -> list[tuple[int, int]]:
+    """
+    Split the audio into chunks of bounded length, cutting in the middle of silences where possible.
+
+    Args:
+    audio (np.ndarray): The audio samples.
+    sampleRate (int, optional): The sample rate of the audio. Defaults to 16000.
+    maxChunkLength (float, optional): The maximum length of a chunk in seconds. Defaults to 600.
+    minChunkLength (float, optional): Silences closer than this many seconds to the start of a chunk are not used as cut points. Defaults to 60.
+    overlap (float, optional): The number of seconds shared by two chunks when no silence was found and the audio has to be cut mid speech. Defaults to 2.
+    **silenceOptions: Keyword arguments passed to findSilences.
+
+    Returns:
+    list[tuple[int, int]]: The (start, end) sample indices of every chunk.
+
+    Raises:
+    ValueError: If the overlap isn't shorter than the maximum chunk length, which would never move past the first cut.
+    """
+    maxSamples = round(maxChunkLength * sampleRate)
+    minSamples = min(round(minChunkLength * sampleRate), maxSamples)
+    overlapSamples = round(overlap * sampleRate)
+
+    if not 0 <= overlapSamples < maxSamples:
+        raise ValueError(f"overlap must be at least 0 and shorter than maxChunkLength ({maxChunkLength}), got {overlap}")
+
+    if len(audio) <= maxSamples:
+        return [(0, len(audio))]
+
+    cuts = np.array([(start + end) // 2 for start, end in findSilences(audio, sampleRate, **silenceOptions)], dtype=np.int64)
+
+    chunks = []
+    start = 0
+
+    while len(audio) - start > maxSamples:
+        candidates = cuts[(cuts > start + minSamples) & (cuts <= start + maxSamples)]
+
+        if len(candidates):
+            end = int(candidates[-1])
+            chunks.append((start, end))
+            start = end
+        else:
+            end = start + maxSamples
+            chunks.append((start, end))
+            start = end - overlapSamples
+            # no silence to cut at, the next chunk repeats the end of this one
+
+    chunks.append((start, len(audio)))
+    return chunks
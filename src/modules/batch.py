@@ -0,0 +1,305 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from src.modules.transcriber import Transcriber
+from src.modules.cache import TranscriptionCache
+from src.modules.audio import loadAudio, SAMPLE_RATE
+from src.modules import parallel
+import multiprocessing
+import shutil
+import glob
+import json
+import time
+import os
+from tqdm import tqdm
+
+mediaExtensions = (".wav", ".mp3", ".flac", ".m4a", ".ogg", ".opus", ".aac", ".wma", ".mp4", ".mkv", ".mov", ".webm", ".avi")
+
+workerTranscriber = None
+
+def initBatchWorker(modelName:str, device:str, threads:int, decodeOptions:dict, quantize:bool=False) -> None:
+    """
+    Load the model once in a worker process of the batch pool.
+
+    Args:
+    modelName (str): The name of the Whisper model to load.
+    device (str): The device the model is loaded on.
+    threads (int): The number of torch threads used by the worker.
+    decodeOptions (dict): The keyword arguments passed to the model's transcribe method.
+    quantize (bool, optional): If True, the model is quantized to int8. Defaults to False.
+
+    Returns:
+    None
+    """
+    global workerTranscriber
+
+    parallel.initWorker(modelName, device, threads, decodeOptions, quantize)
+    workerTranscriber = Transcriber(parallel.workerModel, modelName, **decodeOptions)
+
+def transcribeFile(inputPath:str, outputPath:str) -> dict[str, float]:
+    """
+    Transcribe one file in a worker process and save its SRT transcription.
+
+    Args:
+    inputPath (str): The path of the audio or video file.
+    outputPath (str): The path of the SRT file. It is written under a temporary name and renamed once complete, so a crash never leaves a partial transcription behind.
+
+    Returns:
+    dict[str, float]: The "duration" of the audio and the "seconds" spent decoding and transcribing it.
+    """
+    start = time.perf_counter()
+    audio = loadAudio(inputPath)
+
+    os.makedirs(os.path.dirname(os.path.abspath(outputPath)), exist_ok=True)
+    partialPath = f"{outputPath}.partial"
+    workerTranscriber.saveTranscriptionFromAudio(audio, partialPath)
+    os.replace(partialPath, outputPath)
+
+    return {"duration": len(audio) / SAMPLE_RATE, "seconds": time.perf_counter() - start}
+
+def copyOutput(sourcePath:str, outputPath:str) -> None:
+    """
+    Copy the SRT file of an identical input to the output path of another one.
+
+    Args:
+    sourcePath (str): The path of the existing SRT file.
+    outputPath (str): The path of the copy. It is written under a temporary name and renamed once complete.
+
+    Returns:
+    None
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(outputPath)), exist_ok=True)
+    partialPath = f"{outputPath}.partial"
+    shutil.copyfile(sourcePath, partialPath)
+    os.replace(partialPath, outputPath)
+
+def hashInput(inputPath:str) -> tuple[str|None, str|None]:
+    try:
+        return TranscriptionCache.hashAudio(inputPath), None
+    except OSError as e:
+        return None, str(e)
+
+def optionsKey(decodeOptions:dict) -> str:
+    return json.dumps(decodeOptions, sort_keys=True, default=str)
+
+def findInputs(source:str, extensions:tuple[str, ...]=mediaExtensions) -> tuple[list[str], str]:
+    """
+    Find the files to transcribe.
+
+    Args:
+    source (str): A directory, searched recursively, or a glob pattern, in which "**" matches any number of directories.
+    extensions (tuple[str, ...], optional): The extensions of the files taken from a directory, in lower case. Files matched by a glob are all taken. Defaults to mediaExtensions.
+
+    Returns:
+    tuple[list[str], str]: The sorted paths of the files, and the directory their outputs are placed relative to.
+    """
+    if os.path.isdir(source):
+        paths = [os.path.join(root, name) for root, _, names in os.walk(source) for name in names if os.path.splitext(name)[1].lower() in extensions]
+        return sorted(paths), source
+
+    paths = [path for path in glob.glob(source, recursive=True) if os.path.isfile(path)]
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths]) if paths else "."
+    return sorted(paths), root
+
+def outputPathFor(inputPath:str, root:str, outputDir:str|None) -> str:
+    """
+    Place the SRT file of an input.
+
+    Args:
+    inputPath (str): The path of the input.
+    root (str): The directory the inputs were found in.
+    outputDir (str | None): The directory mirroring the tree of the inputs. If None, every SRT file is written next to its input.
+
+    Returns:
+    str: The path of the SRT file, the name of the input with ".srt" appended, such as "talk.mp3.srt".
+    """
+    base = inputPath + ".srt"
+    # keeping the extension of the input, so talk.mp3 and talk.wav in one directory don't share an output
+    if outputDir is None:
+        return base
+    return os.path.join(outputDir, os.path.relpath(os.path.abspath(base), os.path.abspath(root)))
+
+def readManifest(manifestPath:str) -> dict[tuple[str, str, str], dict[str, dict]]:
+    """
+    Read the files already transcribed from a manifest.
+
+    Args:
+    manifestPath (str): The path of the JSONL manifest. It may not exist yet.
+
+    Returns:
+    dict[tuple[str, str, str], dict[str, dict]]: For every (hash, model, decoding options as given by optionsKey), the last successful record of every output path that still exists.
+
+    A line cut short by a crash is ignored, so the manifest of an interrupted run can be resumed. Records written before the decoding options were recorded match no options, so their files are transcribed again.
+    """
+    done = {}
+    if not os.path.exists(manifestPath):
+        return done
+
+    with open(manifestPath) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+            if record.get("status") == "done" and "options" in record and os.path.exists(record["output"]):
+                done.setdefault((record["hash"], record["model"], optionsKey(record["options"])), {})[record["output"]] = record
+
+    return done
+
+def appendManifest(f, record:dict) -> None:
+    f.write(json.dumps(record) + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+    # every record is on disk before the next file starts, so a crash loses at most the files in progress
+
+def runBatch(source:str, outputDir:str|None=None, manifestPath:str="manifest.jsonl", modelName:str="base", workers:int=1, device:str="cpu", quantize:bool=False, hashThreads:int=4, verbose:bool=False, **decodeOptions) -> dict[str, int]:
+    """
+    Transcribe every file of a directory or glob to SRT, skipping the files a manifest already lists.
+
+    Args:
+    source (str): A directory or a glob pattern, see findInputs.
+    outputDir (str | None, optional): The directory the SRT files are written to, mirroring the tree of the inputs. Defaults to next to the inputs.
+    manifestPath (str, optional): The JSONL manifest of the transcribed files, appended to as files finish. Defaults to "manifest.jsonl".
+    modelName (str, optional): The name of the Whisper model. Defaults to "base".
+    workers (int, optional): The number of worker processes, each loading the model once. Defaults to 1.
+    device (str, optional): The device the workers load the model on. Defaults to "cpu".
+    quantize (bool, optional): If True, the workers quantize the model to int8. Defaults to False.
+    hashThreads (int, optional): The number of threads hashing the inputs. Defaults to 4.
+    verbose (bool, optional): If True, display a progress bar. Defaults to False.
+    **decodeOptions: Keyword arguments passed to the model's transcribe method.
+
+    Returns:
+    dict[str, int]: The number of files "done", "copied", "skipped" and "failed".
+
+    Files are recognised by the SHA-256 of their contents, the model and the decoding options. A file already transcribed at its own output path is skipped. A file whose content was transcribed under another path, because it was moved or renamed or is a second copy within the same run, is transcribed only once and its SRT file is copied to its own output path. Every finished or copied file appends a record with its input, hash, model, options, output path, audio duration, processing time and real time factor to the manifest. Failures, including files that can't be read, are recorded with their error and retried by the next run. Running the same command again after a crash resumes where it stopped.
+    """
+    inputs, root = findInputs(source)
+    done = readManifest(manifestPath)
+    model = f"{modelName}-int8" if quantize else modelName
+    options = optionsKey(decodeOptions)
+
+    with ThreadPoolExecutor(hashThreads) as hashers:
+        hashes = list(hashers.map(hashInput, inputs))
+
+    counts = {"done": 0, "copied": 0, "skipped": 0, "failed": 0}
+    pending = {}
+    duplicates = {}
+    copies = []
+    unreadable = []
+
+    for inputPath, (audioHash, error) in zip(inputs, hashes):
+        outputPath = outputPathFor(inputPath, root, outputDir)
+        previous = done.get((audioHash, model, options), {})
+
+        if audioHash is None:
+            unreadable.append((inputPath, error))
+        elif outputPath in previous:
+            counts["skipped"] += 1
+        elif previous:
+            copies.append((inputPath, audioHash, next(iter(previous.values()))))
+        elif audioHash in pending:
+            duplicates[audioHash].append(inputPath)
+        else:
+            pending[audioHash] = inputPath
+            duplicates[audioHash] = []
+
+    if not (pending or copies or unreadable):
+        return counts
+
+    def newRecord(inputPath:str, audioHash:str|None) -> dict:
+        return {"input": inputPath, "hash": audioHash, "model": model, "options": decodeOptions, "output": outputPathFor(inputPath, root, outputDir), "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+    def recordCopy(manifest, inputPath:str, audioHash:str, source:dict) -> None:
+        record = newRecord(inputPath, audioHash)
+
+        try:
+            copyOutput(source["output"], record["output"])
+        except OSError as e:
+            record.update(status="failed", error=str(e))
+            counts["failed"] += 1
+        else:
+            record.update(status="done", copiedFrom=source["output"], duration=source.get("duration"), seconds=0.0, rtf=0.0)
+            counts["copied"] += 1
+
+        appendManifest(manifest, record)
+
+    os.makedirs(os.path.dirname(os.path.abspath(manifestPath)), exist_ok=True)
+    progress = tqdm(total=len(inputs) - counts["skipped"], unit=" files") if verbose else None
+
+    def advance(files:int=1) -> None:
+        if progress is not None:
+            progress.update(files)
+            progress.set_postfix(counts)
+
+    try:
+        with open(manifestPath, "a") as manifest:
+            for inputPath, error in unreadable:
+                appendManifest(manifest, {**newRecord(inputPath, None), "status": "failed", "error": error})
+                counts["failed"] += 1
+                advance()
+
+            for inputPath, audioHash, source in copies:
+                recordCopy(manifest, inputPath, audioHash, source)
+                advance()
+
+            if not pending:
+                return counts
+
+            workers = max(1, min(workers, len(pending)))
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            context = multiprocessing.get_context("spawn")
+            # forking a process that already initialized torch can deadlock its thread pools
+
+            with ProcessPoolExecutor(workers, context, initBatchWorker, (modelName, device, threads, decodeOptions, quantize)) as pool:
+                futures = {pool.submit(transcribeFile, inputPath, outputPathFor(inputPath, root, outputDir)): (audioHash, inputPath) for audioHash, inputPath in pending.items()}
+
+                for future in as_completed(futures):
+                    audioHash, inputPath = futures[future]
+                    record = newRecord(inputPath, audioHash)
+
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        record.update(status="failed", error=str(e))
+                        counts["failed"] += 1
+                    else:
+                        record.update(status="done", duration=result["duration"], seconds=result["seconds"], rtf=result["seconds"] / result["duration"] if result["duration"] else None)
+                        counts["done"] += 1
+
+                    appendManifest(manifest, record)
+
+                    for duplicatePath in duplicates[audioHash]:
+                        if record["status"] == "done":
+                            recordCopy(manifest, duplicatePath, audioHash, record)
+                        else:
+                            appendManifest(manifest, {**newRecord(duplicatePath, audioHash), "status": "failed", "error": record["error"]})
+                            counts["failed"] += 1
+                        # the copies of a file share its transcription, and its failure
+
+                    advance(1 + len(duplicates[audioHash]))
+    finally:
+        if progress is not None:
+            progress.close()
+
+    return counts
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Transcribe every audio or video file of a directory or glob to SRT, resumably.")
+    parser.add_argument("source", help="A directory, searched recursively, or a quoted glob pattern such as 'recordings/**/*.mp3'.")
+    parser.add_argument("--output-dir", default=None, help="The directory the SRT files are written to, mirroring the inputs. Defaults to next to every input.")
+    parser.add_argument("--manifest", default="manifest.jsonl", help="The JSONL manifest of the transcribed files, used to skip them on the next run.")
+    parser.add_argument("--model", default="base", help="The name of the model.")
+    parser.add_argument("--workers", type=int, default=1, help="The number of worker processes, each loading the model once.")
+    parser.add_argument("--device", default="cpu", help="The device the model is loaded on.")
+    parser.add_argument("--quantize", action="store_true", help="Quantize the model to int8 on the CPU.")
+    parser.add_argument("--language", default=None, help="The language of the audio, detected per file if not given.")
+    args = parser.parse_args()
+
+    options = {"fp16": args.device != "cpu"}
+    if args.language is not None:
+        options["language"] = args.language
+
+    counts = runBatch(args.source, args.output_dir, args.manifest, args.model, args.workers, args.device, args.quantize, verbose=True, **options)
+    print(json.dumps(counts))
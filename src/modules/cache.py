@@ -0,0 +1,216 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import BinaryIO
+import numpy as np
+import hashlib
+import copy
+import json
+import os
+
+class TranscriptionCache:
+    def __init__(self, capacity:int=64, cacheDir:str|None=None, maxBytes:int=512*1024**2) -> None:
+        """
+        Initialize a two tier cache for transcription results.
+
+        Args:
+        capacity (int, optional): The maximum number of results kept in memory. Defaults to 64.
+        cacheDir (str | None, optional): The directory used for the on-disk tier. If None, only the in-memory tier is used. Defaults to None.
+        maxBytes (int, optional): The maximum total size in bytes of the on-disk tier. Defaults to 512 MiB.
+
+        Returns:
+        None
+
+        Results are stored in an in-memory LRU tier and, if a cache directory is given, in an on-disk tier as one JSON file per key. When the on-disk tier grows beyond 'maxBytes', the least recently used files are removed first.
+        """
+        self.capacity = capacity
+        self.cacheDir = cacheDir
+        self.maxBytes = maxBytes
+
+        self.memory = OrderedDict()
+        self.lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+        if self.cacheDir is not None:
+            os.makedirs(self.cacheDir, exist_ok=True)
+
+    @staticmethod
+    def hashAudio(audio:str|np.ndarray|bytes|BinaryIO, blockSize:int=1024*1024) -> str:
+        """
+        Compute the SHA-256 digest of audio given as a path, an array, bytes or a seekable file-like object.
+
+        Args:
+        audio (str | np.ndarray | bytes | BinaryIO): The audio. File-like objects are read from their current position, which is restored afterwards.
+        blockSize (int, optional): The number of bytes read at a time. Defaults to 1 MiB.
+
+        Returns:
+        str: The hexadecimal digest of the audio.
+        """
+        digest = hashlib.sha256()
+
+        if isinstance(audio, np.ndarray):
+            digest.update(f"{audio.dtype}{audio.shape}".encode())
+            digest.update(np.ascontiguousarray(audio).data)
+        elif isinstance(audio, (bytes, bytearray, memoryview)):
+            digest.update(audio)
+        elif isinstance(audio, (str, os.PathLike)):
+            with open(audio, "rb") as f:
+                for block in iter(lambda: f.read(blockSize), b""):
+                    digest.update(block)
+        else:
+            start = audio.tell()
+            for block in iter(lambda: audio.read(blockSize), b""):
+                digest.update(block)
+            audio.seek(start)
+
+        return digest.hexdigest()
+
+    @staticmethod
+    def makeKey(audioHash:str, modelName:str, options:dict) -> str:
+        """
+        Build a cache key from the audio digest, the model name and the decode options.
+
+        Args:
+        audioHash (str): The digest of the audio, as returned by 'hashAudio'.
+        modelName (str): The name of the model used for transcription.
+        options (dict): The decode options passed to the model.
+
+        Returns:
+        str: A hexadecimal key identifying the transcription result.
+        """
+        description = json.dumps({"audio": audioHash, "model": modelName, "options": options}, sort_keys=True, default=str)
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def diskPath(self, key:str) -> str:
+        return os.path.join(self.cacheDir, f"{key}.json")
+
+    def get(self, key:str) -> dict|None:
+        """
+        Look up a transcription result.
+
+        Args:
+        key (str): The key returned by 'makeKey'.
+
+        Returns:
+        dict | None: A copy of the cached result, which the caller may change, or None if the key is not present in either tier.
+        """
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(self.memory[key])
+
+        result = self.readDisk(key)
+
+        with self.lock:
+            if result is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.putMemory(key, copy.deepcopy(result))
+            # promoting the result to the in-memory tier, the caller gets its own copy read from disk
+
+        return result
+
+    def put(self, key:str, result:dict) -> None:
+        """
+        Store a transcription result in both tiers.
+
+        Args:
+        key (str): The key returned by 'makeKey'.
+        result (dict): The transcription result to store. It must be JSON serializable. A copy is kept, so the caller may change it afterwards.
+
+        Returns:
+        None
+        """
+        with self.lock:
+            self.putMemory(key, copy.deepcopy(result))
+
+        self.writeDisk(key, result)
+
+    def putMemory(self, key:str, result:dict) -> None:
+        self.memory[key] = result
+        self.memory.move_to_end(key)
+
+        while len(self.memory) > self.capacity:
+            self.memory.popitem(last=False)
+
+    def readDisk(self, key:str) -> dict|None:
+        if self.cacheDir is None:
+            return None
+
+        path = self.diskPath(key)
+        try:
+            with open(path, "r") as f:
+                result = json.load(f)
+            os.utime(path)
+            # marking the file as recently used for eviction
+        except (OSError, ValueError):
+            return None
+
+        return result
+
+    def writeDisk(self, key:str, result:dict) -> None:
+        if self.cacheDir is None:
+            return
+
+        path = self.diskPath(key)
+        partialPath = f"{path}.{os.getpid()}.part"
+
+        with open(partialPath, "w") as f:
+            json.dump(result, f)
+        os.replace(partialPath, path)
+        # writing to a partial file first so readers never see a truncated result
+
+        self.evictDisk()
+
+    def evictDisk(self) -> None:
+        """
+        Remove the least recently used files of the on-disk tier until its total size is below 'maxBytes'.
+
+        Returns:
+        None
+        """
+        entries = []
+        totalBytes = 0
+
+        with os.scandir(self.cacheDir) as it:
+            for entry in it:
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                totalBytes += stat.st_size
+
+        entries.sort()
+
+        for _, size, path in entries:
+            if totalBytes <= self.maxBytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            totalBytes -= size
+
+    def clear(self) -> None:
+        with self.lock:
+            self.memory.clear()
+
+        if self.cacheDir is None:
+            return
+
+        for name in os.listdir(self.cacheDir):
+            if name.endswith(".json"):
+                os.remove(os.path.join(self.cacheDir, name))
+
+    def __len__(self) -> int:
+        return len(self.memory)
+
+    def __str__(self) -> str:
+        return f"TranscriptionCache(entries={len(self)}, hits={self.hits}, misses={self.misses})"
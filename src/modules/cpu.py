@@ -0,0 +1,246 @@
+from functools import wraps
+from typing import BinaryIO
+from whisper.model import Whisper
+from src.modules.audio import loadAudio, SAMPLE_RATE
+from src.modules.registry import ModelRegistry
+import numpy as np
+import whisper
+import torch
+import time
+import os
+
+def configureThreads(threads:int|None=None, interopThreads:int|None=None) -> None:
+    """
+    Set the sizes of the torch thread pools of the current process.
+
+    Args:
+    threads (int | None, optional): The number of threads used inside an operation. Defaults to the number of CPUs.
+    interopThreads (int | None, optional): The number of threads running independent operations in parallel. If None, it is left unchanged. Defaults to None.
+
+    Returns:
+    None
+
+    The inter-op pool can only be sized before torch runs its first parallel operation, so a later call leaves it unchanged.
+    """
+    torch.set_num_threads(threads or os.cpu_count() or 1)
+
+    if interopThreads is not None:
+        try:
+            torch.set_num_interop_threads(interopThreads)
+        except RuntimeError:
+            pass
+            # the pool is already running
+
+def plainLinears(module:torch.nn.Module) -> torch.nn.Module:
+    """
+    Replace the Linear layers of Whisper, which cast their weights to the input type, with torch.nn.Linear layers sharing the same weights.
+
+    Args:
+    module (torch.nn.Module): The model or one of its modules, changed in place.
+
+    Returns:
+    torch.nn.Module: The same module.
+
+    Dynamic quantization only converts layers whose type is exactly torch.nn.Linear.
+    """
+    for name, child in module.named_children():
+        if isinstance(child, torch.nn.Linear) and type(child) is not torch.nn.Linear:
+            linear = torch.nn.Linear(child.in_features, child.out_features, child.bias is not None)
+            linear.weight = child.weight
+            linear.bias = child.bias
+            setattr(module, name, linear)
+        else:
+            plainLinears(child)
+
+    return module
+
+def quantizeModel(model:Whisper) -> Whisper:
+    """
+    Quantize the weights of the Linear layers of a model on the CPU to int8, with activations quantized on the fly.
+
+    Args:
+    model (Whisper): A model loaded in fp32 on the CPU.
+
+    Returns:
+    Whisper: The quantized model. The convolutions, embeddings and layer norms stay in fp32.
+    """
+    return torch.ao.quantization.quantize_dynamic(plainLinears(model), {torch.nn.Linear}, dtype=torch.qint8)
+
+def inferenceMode(func):
+    """
+    Wrap a function so it runs under torch.inference_mode, which skips the autograd bookkeeping no_grad still does.
+
+    Args:
+    func (function): The function to wrap.
+
+    Returns:
+    function: The wrapped function.
+    """
+    @wraps(func)
+    def wrapped(*args, **kwargs):
+        with torch.inference_mode():
+            return func(*args, **kwargs)
+
+    return wrapped
+
+def optimizeModel(model:Whisper, quantize:bool=True, useInferenceMode:bool=True, compileEncoder:bool=False) -> Whisper:
+    """
+    Prepare a model loaded on the CPU for faster inference.
+
+    Args:
+    model (Whisper): A model loaded in fp32 on the CPU.
+    quantize (bool, optional): If True, the Linear layers are quantized to int8 with 'quantizeModel'. Defaults to True.
+    useInferenceMode (bool, optional): If True, the transcribe and decode methods of the model run under torch.inference_mode. Defaults to True.
+    compileEncoder (bool, optional): If True, the audio encoder is compiled with torch.compile. Its input always has the same shape, so it is compiled once, on the first call. Defaults to False.
+
+    Returns:
+    Whisper: The optimized model, in evaluation mode.
+    """
+    model = model.eval()
+
+    if quantize:
+        model = quantizeModel(model)
+
+    if compileEncoder:
+        model.encoder = torch.compile(model.encoder)
+        # the decoder is left alone, its input grows by a token every step and its key/value cache uses hooks
+
+    if useInferenceMode:
+        model.transcribe = inferenceMode(model.transcribe)
+        model.decode = inferenceMode(model.decode)
+        # set on the instance, so the Transcriber and the BatchScheduler both use the wrapped methods
+
+    return model
+
+def loadCPUModel(name:str, device:str|None="cpu", quantize:bool=True, threads:int|None=None, interopThreads:int|None=None, useInferenceMode:bool=True, compileEncoder:bool=False) -> Whisper:
+    """
+    Load a Whisper model for inference on the CPU.
+
+    Args:
+    name (str): The name of the model.
+    device (str | None, optional): Only "cpu" or None are accepted, it is there so the function can be used as the loader of a ModelRegistry. Defaults to "cpu".
+    quantize (bool, optional): If True, the Linear layers are quantized to int8. Defaults to True.
+    threads (int | None, optional): The number of torch threads used inside an operation. Defaults to the number of CPUs.
+    interopThreads (int | None, optional): The number of torch threads running independent operations. Defaults to None.
+    useInferenceMode (bool, optional): If True, inference runs under torch.inference_mode. Defaults to True.
+    compileEncoder (bool, optional): If True, the audio encoder is compiled with torch.compile. Defaults to False.
+
+    Returns:
+    Whisper: The model, ready for inference.
+
+    Raises:
+    ValueError: If a device other than the CPU is asked for.
+    """
+    if device not in (None, "cpu"):
+        raise ValueError(f"loadCPUModel only loads models on the CPU, not on {device}")
+
+    configureThreads(threads, interopThreads)
+    model = whisper.load_model(name, "cpu")
+
+    return optimizeModel(model, quantize, useInferenceMode, compileEncoder)
+
+def wordErrorRate(reference:str, hypothesis:str) -> float:
+    """
+    Compute the word error rate of a transcription against a reference transcription.
+
+    Args:
+    reference (str): The reference text.
+    hypothesis (str): The text to compare.
+
+    Returns:
+    float: The number of substituted, deleted and inserted words divided by the number of words of the reference.
+    """
+    referenceWords = reference.lower().split()
+    hypothesisWords = hypothesis.lower().split()
+
+    if not referenceWords:
+        return float(len(hypothesisWords) > 0)
+
+    distances = np.arange(len(hypothesisWords) + 1)
+    for i, word in enumerate(referenceWords, 1):
+        previous = distances.copy()
+        distances[0] = i
+        for j, other in enumerate(hypothesisWords, 1):
+            distances[j] = min(previous[j] + 1, distances[j-1] + 1, previous[j-1] + (word != other))
+        # one row of the edit distance table at a time
+
+    return float(distances[-1]) / len(referenceWords)
+
+def timeTranscription(model:Whisper, audio:np.ndarray, repeats:int=1, **decodeOptions) -> dict[str, float | str | int]:
+    """
+    Transcribe audio with a model and measure how long it takes.
+
+    Args:
+    model (Whisper): The model.
+    audio (np.ndarray): The audio samples at 16 kHz.
+    repeats (int, optional): The number of timed runs, the fastest is reported. Defaults to 1.
+    **decodeOptions: Keyword arguments passed to the model's transcribe method.
+
+    Returns:
+    dict[str, float | str | int]: The text, the fastest time in seconds, the real time factor and the size of the model in bytes.
+    """
+    model.transcribe(audio[:SAMPLE_RATE], **decodeOptions)
+    # a short warm up run, so lazy initialization and compilation are not timed
+
+    seconds = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        output = model.transcribe(audio, **decodeOptions)
+        seconds = min(seconds, time.perf_counter() - start)
+
+    return {
+        "text": output["text"],
+        "seconds": seconds,
+        "realTimeFactor": seconds / max(len(audio) / SAMPLE_RATE, 1e-9),
+        "sizeBytes": ModelRegistry.modelSize(model),
+    }
+
+def compareModels(name:str, audio:str|np.ndarray|BinaryIO, repeats:int=1, threads:int|None=None, interopThreads:int|None=None, quantize:bool=True, useInferenceMode:bool=True, compileEncoder:bool=False, **decodeOptions) -> dict[str, dict | float]:
+    """
+    Compare the CPU optimized model with the plain fp32 model on the same audio.
+
+    Args:
+    name (str): The name of the model.
+    audio (str | np.ndarray | BinaryIO): The audio to transcribe.
+    repeats (int, optional): The number of timed runs of each model. Defaults to 1.
+    threads (int | None, optional): The number of torch threads used by both models. Defaults to the number of CPUs.
+    interopThreads (int | None, optional): The number of torch inter-op threads. Defaults to None.
+    quantize (bool, optional): Whether the optimized model is quantized. Defaults to True.
+    useInferenceMode (bool, optional): Whether the optimized model runs under torch.inference_mode. Defaults to True.
+    compileEncoder (bool, optional): Whether the encoder of the optimized model is compiled. Defaults to False.
+    **decodeOptions: Keyword arguments passed to the transcribe method of both models.
+
+    Returns:
+    dict[str, dict | float]: The results of timeTranscription for the "reference" and the "optimized" models, the "speedup" of the optimized model, and the "wordErrorRate" of its text against the reference text.
+    """
+    audio = loadAudio(audio)
+    decodeOptions = {"fp16": False, "temperature": 0.0, **decodeOptions}
+    # greedy decoding, so the texts only differ because of the models
+
+    configureThreads(threads, interopThreads)
+    reference = timeTranscription(whisper.load_model(name, "cpu").eval(), audio, repeats, **decodeOptions)
+    optimized = timeTranscription(loadCPUModel(name, "cpu", quantize, threads, interopThreads, useInferenceMode, compileEncoder), audio, repeats, **decodeOptions)
+
+    return {
+        "reference": reference,
+        "optimized": optimized,
+        "speedup": reference["seconds"] / optimized["seconds"],
+        "wordErrorRate": wordErrorRate(reference["text"], optimized["text"]),
+    }
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+    import json
+
+    parser = ArgumentParser(description="Compare the CPU optimized Whisper model with the fp32 model.")
+    parser.add_argument("audio", help="The audio file to transcribe.")
+    parser.add_argument("--model", default="base", help="The name of the model.")
+    parser.add_argument("--repeats", type=int, default=1, help="The number of timed runs of each model.")
+    parser.add_argument("--threads", type=int, default=None, help="The number of torch threads.")
+    parser.add_argument("--interop-threads", type=int, default=None, help="The number of torch inter-op threads.")
+    parser.add_argument("--no-quantize", action="store_true", help="Keep the optimized model in fp32.")
+    parser.add_argument("--compile", action="store_true", help="Compile the encoder of the optimized model.")
+    args = parser.parse_args()
+
+    comparison = compareModels(args.model, args.audio, args.repeats, args.threads, args.interop_threads, not args.no_quantize, True, args.compile)
+    print(json.dumps(comparison, indent=2))
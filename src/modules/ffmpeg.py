@@ -0,0 +1,298 @@
+from numpy import ndarray
+import subprocess
+import re
+import os
+
+encoders = {
+    "h264": "libx264",
+    "hevc": "libx265",
+    "mpeg4": "mpeg4",
+    "vp8": "libvpx",
+    "vp9": "libvpx-vp9",
+    "av1": "libaom-av1",
+    "mjpeg": "mjpeg",
+}
+
+qualityArgs = {
+    "libx264": ("-crf", "18"),
+    "libx265": ("-crf", "20"),
+    "libvpx": ("-crf", "10", "-b:v", "1M"),
+    "libvpx-vp9": ("-crf", "31", "-b:v", "0"),
+    "libaom-av1": ("-crf", "30", "-b:v", "0"),
+    "mpeg4": ("-q:v", "2"),
+    "mjpeg": ("-q:v", "2"),
+}
+# mpeg4 and mjpeg ignore -crf and take a fixed quantizer instead
+
+profiles = {
+    "h264": {"Constrained Baseline": "baseline", "Baseline": "baseline", "Main": "main", "High": "high", "High 10": "high10", "High 4:2:2": "high422", "High 4:4:4 Predictive": "high444"},
+    "hevc": {"Main": "main", "Main 10": "main10", "Main Still Picture": "mainstillpicture"},
+    "mpeg4": {"Simple Profile": None},
+    "vp9": {"Profile 0": "0", "Profile 1": "1", "Profile 2": "2", "Profile 3": "3"},
+    "mjpeg": {"Baseline": None},
+}
+# the value passed to -profile:v for every profile the encoder can produce, None where its default is that profile
+
+inBandArgs = {
+    "libx264": ("-x264-params", "repeat-headers=1"),
+    "libx265": ("-x265-params", "repeat-headers=1"),
+    "mpeg4": ("-bsf:v", "dump_extra"),
+}
+# repeat the parameter sets before every keyframe, since the concat demuxer keeps the headers of the first part only
+
+copyFilters = {
+    "h264": "h264_mp4toannexb",
+    "hevc": "hevc_mp4toannexb",
+    "mpeg4": "dump_extra",
+}
+
+class FFmpegError(Exception):
+    pass
+
+
+def runFFmpeg(*args:str) -> None:
+    """
+    Run ffmpeg with the given arguments, overwriting existing outputs.
+
+    Args:
+    *args (str): The command line arguments after the program name.
+
+    Returns:
+    None
+
+    Raises:
+    FFmpegError: If ffmpeg exits with an error.
+    """
+    process = subprocess.run(["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-y", *args], capture_output=True)
+
+    if process.returncode != 0:
+        raise FFmpegError(process.stderr.decode(errors="replace").strip())
+
+def probeVideoStream(fileName:str) -> dict[str, str|None]:
+    """
+    Describe the first video stream of a file.
+
+    Args:
+    fileName (str): The path to the video file.
+
+    Returns:
+    dict[str, str | None]: The ffmpeg name of the "codec", such as "h264", its "profile", such as "High", or None if ffmpeg shows none, and its "pixelFormat", such as "yuv420p".
+
+    Raises:
+    FFmpegError: If the file has no video stream.
+    """
+    process = subprocess.run(["ffmpeg", "-nostdin", "-hide_banner", "-i", fileName], capture_output=True)
+    match = re.search(r"Stream #\S+.*?: Video: (\w+)((?: \([^)]*\))*), (\w+)", process.stderr.decode(errors="replace"))
+    # ffmpeg without an output prints the streams of the input and exits with an error
+
+    if match is None:
+        raise FFmpegError(f"No video stream found in {fileName}")
+
+    profile = next((label for label in re.findall(r"\(([^)]*)\)", match.group(2)) if " / 0x" not in label), None)
+    # the parentheses after the codec hold its profile and the tag of the container, such as (avc1 / 0x31637661)
+
+    return {"codec": match.group(1), "profile": profile, "pixelFormat": match.group(3)}
+
+def probeVideoCodec(fileName:str) -> str:
+    """
+    Find the codec of the first video stream of a file.
+
+    Args:
+    fileName (str): The path to the video file.
+
+    Returns:
+    str: The ffmpeg name of the codec, such as "h264".
+
+    Raises:
+    FFmpegError: If the file has no video stream.
+    """
+    return probeVideoStream(fileName)["codec"]
+
+def encoderFor(codec:str) -> str:
+    """
+    Find the encoder producing the given codec, so re-encoded parts can be joined with stream copied ones.
+
+    Args:
+    codec (str): The ffmpeg name of the codec.
+
+    Returns:
+    str: The name of the ffmpeg encoder.
+    """
+    return encoders.get(codec, codec)
+
+def matchingEncoder(stream:dict[str, str|None], encoderArgs:tuple[str, ...]|None=None) -> tuple[str, tuple[str, ...]]|None:
+    """
+    Find the encoder and its arguments producing parts that can be spliced between stream copied parts of a video.
+
+    Args:
+    stream (dict[str, str | None]): The video stream, as returned by probeVideoStream.
+    encoderArgs (tuple[str, ...] | None, optional): The quality arguments of the encoder. Defaults to the ones of qualityArgs.
+
+    Returns:
+    tuple[str, tuple[str, ...]] | None: The name of the encoder and all its arguments, or None if the codec, profile or pixel format of the stream can't be produced, in which case the video has to be encoded again as a whole.
+
+    The parts get the codec, profile and pixel format of the stream, and their parameter sets are repeated in the stream before every keyframe, so a decoder never reads a part with the headers of another.
+    """
+    codec = stream["codec"]
+    encoder = encoders.get(codec)
+    if encoder is None:
+        return None
+
+    args = list(qualityArgs.get(encoder, ()) if encoderArgs is None else encoderArgs)
+
+    if codec in profiles:
+        if stream["profile"] not in profiles[codec]:
+            return None
+
+        profile = profiles[codec][stream["profile"]]
+        if profile is not None:
+            args += ["-profile:v", profile]
+
+    args += [*inBandArgs.get(encoder, ()), "-pix_fmt", stream["pixelFormat"]]
+
+    return encoder, tuple(args)
+
+def copySegment(fileName:str, outputPath:str, startFrame:int, frameCount:int, fps:float, codec:str|None=None) -> None:
+    """
+    Copy a range of frames of the first video stream of a file without re-encoding it.
+
+    Args:
+    fileName (str): The path to the source video file.
+    outputPath (str): The path of the copied segment.
+    startFrame (int): The first frame of the range. It must be a keyframe.
+    frameCount (int): The number of frames to copy.
+    fps (float): The frame rate of the video.
+    codec (str | None, optional): The codec of the video, as returned by probeVideoCodec. Defaults to probing it.
+
+    Returns:
+    None
+    """
+    start = (startFrame + 0.5) / fps
+    # seeking half a frame past the keyframe, so rounding never lands on the keyframe before it
+
+    bitstreamFilter = copyFilters.get(codec or probeVideoCodec(fileName))
+    filterArgs = ["-bsf:v", bitstreamFilter] if bitstreamFilter is not None else []
+    # the parameter sets are put in the stream, as in the parts encoded by matchingEncoder
+
+    runFFmpeg("-ss", f"{start:.6f}", "-i", fileName, "-map", "0:v:0", "-frames:v", str(frameCount), "-c", "copy", *filterArgs, "-an", outputPath)
+
+def concatSegments(segments:list[str], outputPath:str, audioSource:str|None=None, workDir:str|None=None) -> None:
+    """
+    Join video segments sharing the same codec without re-encoding them, using the concat demuxer.
+
+    Args:
+    segments (list[str]): The paths of the segments, in order.
+    outputPath (str): The path of the joined video.
+    audioSource (str | None, optional): A file whose audio streams are copied into the output, if it has any. Defaults to None.
+    workDir (str | None, optional): The directory of the temporary segment list. Defaults to the directory of the output.
+
+    Returns:
+    None
+    """
+    listPath = os.path.join(workDir or os.path.dirname(os.path.abspath(outputPath)), f".{os.path.basename(outputPath)}.txt")
+
+    with open(listPath, "w") as f:
+        for segment in segments:
+            escaped = os.path.abspath(segment).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    args = ["-f", "concat", "-safe", "0", "-i", listPath]
+    if audioSource is not None:
+        args += ["-i", audioSource, "-map", "0:v", "-map", "1:a?"]
+
+    try:
+        runFFmpeg(*args, "-c", "copy", outputPath)
+    finally:
+        os.remove(listPath)
+
+def checkVideo(fileName:str, expectedFrames:int|None=None) -> int:
+    """
+    Decode the first video stream of a file completely, to check that it is intact.
+
+    Args:
+    fileName (str): The path to the video file.
+    expectedFrames (int | None, optional): The number of frames the video must have. Defaults to None, any number.
+
+    Returns:
+    int: The number of frames decoded.
+
+    Raises:
+    FFmpegError: If ffmpeg reports an error while decoding, or the number of frames differs from expectedFrames.
+    """
+    process = subprocess.run(["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-nostats", "-progress", "pipe:1", "-i", fileName, "-map", "0:v:0", "-f", "null", "-"], capture_output=True)
+    # -progress writes frame=<count> lines to stdout whatever the log level
+    error = process.stderr.decode(errors="replace").strip()
+
+    if process.returncode != 0 or error:
+        raise FFmpegError(f"{fileName} doesn't decode: {error}")
+
+    frames = re.findall(r"^frame=(\d+)", process.stdout.decode(errors="replace"), re.MULTILINE)
+    decoded = int(frames[-1]) if frames else 0
+
+    if expectedFrames is not None and decoded != expectedFrames:
+        raise FFmpegError(f"{fileName} has {decoded} frames, expected {expectedFrames}")
+
+    return decoded
+
+class FrameEncoder:
+    def __init__(self, outputPath:str, size:tuple[int, int], fps:float, encoder:str="libx264", encoderArgs:tuple[str, ...]|None=None, pixelFormat:str="yuv420p") -> None:
+        """
+        Start an ffmpeg process encoding BGR frames written to its stdin.
+
+        Args:
+        outputPath (str): The path of the encoded video.
+        size (tuple[int, int]): The (width, height) of the frames.
+        fps (float): The frame rate of the video.
+        encoder (str, optional): The ffmpeg encoder. Defaults to "libx264".
+        encoderArgs (tuple[str, ...] | None, optional): Extra arguments for the encoder. Defaults to the quality arguments of the encoder in qualityArgs.
+        pixelFormat (str, optional): The pixel format of the encoded video, unless encoderArgs sets one. Defaults to "yuv420p".
+
+        Returns:
+        None
+        """
+        width, height = size
+        encoderArgs = qualityArgs.get(encoder, ()) if encoderArgs is None else encoderArgs
+        formatArgs = () if "-pix_fmt" in encoderArgs else ("-pix_fmt", pixelFormat)
+
+        command = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", f"{fps}", "-i", "pipe:0", "-c:v", encoder, *encoderArgs, *formatArgs, "-an", outputPath]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, frame:ndarray) -> None:
+        """
+        Send a frame to the encoder.
+
+        Args:
+        frame (ndarray): The BGR frame, of the size given at initialization.
+
+        Raises:
+        FFmpegError: If ffmpeg exited before reading the frame, with its error output.
+        """
+        try:
+            self.process.stdin.write(frame.tobytes())
+        except OSError as e:
+            stdin, self.process.stdin = self.process.stdin, None
+            # BrokenPipeError is an OSError, and 'release' has nothing left to finish
+            try:
+                stdin.close()
+            except OSError:
+                pass
+
+            error = self.process.stderr.read()
+            self.process.wait()
+            raise FFmpegError(error.decode(errors="replace").strip() or f"ffmpeg stopped reading frames: {e}") from e
+
+    def release(self) -> None:
+        """
+        Finish encoding and wait for ffmpeg to exit.
+
+        Raises:
+        FFmpegError: If ffmpeg exits with an error.
+        """
+        if self.process.stdin is None:
+            return
+        # 'write' already reported ffmpeg failing
+
+        self.process.stdin.close()
+        error = self.process.stderr.read()
+        if self.process.wait() != 0:
+            raise FFmpegError(error.decode(errors="replace").strip())
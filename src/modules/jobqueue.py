@@ -0,0 +1,379 @@
+from abc import ABC, abstractmethod
+from threading import local
+from uuid import uuid4
+import sqlite3
+import shutil
+import json
+import time
+import os
+
+class LeaseLost(Exception):
+    pass
+
+class InvalidJob(Exception):
+    pass
+    # the job can't run on any worker, such as an unknown kind or a malformed payload, so it isn't retried
+
+
+class JobQueue(ABC):
+    """
+    The interface of the queues shared by the API, which only enqueues jobs, and the worker processes, which run them.
+
+    A job is a dict with its "id", "kind", "model", "payload", "state", "progress", "attempts", "worker", "error", "created" and "finished" time. It starts "queued", is "running" while a worker holds its lease, and ends "done" or "failed". A worker must renew its lease with 'heartbeat' before it runs out, or the job is queued again for another worker, up to the maximum number of attempts of the queue.
+    """
+
+    @abstractmethod
+    def put(self, kind:str, model:str, payload:dict) -> str:
+        ...
+
+    @abstractmethod
+    def claim(self, workerID:str, models:list[str], preferred:list[str]=(), leaseSeconds:float=60.0) -> dict|None:
+        ...
+
+    @abstractmethod
+    def heartbeat(self, jobID:str, workerID:str, leaseSeconds:float=60.0, progress:float|None=None) -> bool:
+        ...
+
+    @abstractmethod
+    def complete(self, jobID:str, workerID:str) -> None:
+        ...
+
+    @abstractmethod
+    def fail(self, jobID:str, workerID:str, error:str, retry:bool=True) -> bool:
+        ...
+
+    @abstractmethod
+    def get(self, jobID:str) -> dict|None:
+        ...
+
+    @abstractmethod
+    def counts(self) -> dict[str, int]:
+        ...
+
+    @abstractmethod
+    def expire(self, ttl:float) -> list[dict]:
+        ...
+
+
+class SQLiteJobQueue(JobQueue):
+    def __init__(self, path:str, maxAttempts:int=3) -> None:
+        """
+        Initialize a job queue stored in a SQLite database, which needs no other service.
+
+        Args:
+        path (str): The path of the database file, created if missing. Every process using the queue opens the same file.
+        maxAttempts (int, optional): The number of times a job is started before a lost lease fails it for good. Defaults to 3.
+
+        Returns:
+        None
+
+        Every process and thread opens its own connection. Claims run in an immediate transaction, so two workers never get the same job. The database is in WAL mode, which needs every process on the same machine or a filesystem with working locks.
+        """
+        self.path = path
+        self.maxAttempts = maxAttempts
+        self.local = local()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        connection = self.connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                model TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                state TEXT NOT NULL,
+                progress REAL NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                leaseUntil REAL,
+                error TEXT,
+                created REAL NOT NULL,
+                finished REAL
+            )
+        """)
+        connection.execute("CREATE INDEX IF NOT EXISTS jobsByState ON jobs (state, model, created)")
+
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self.local, "connection", None)
+        if connection is None or getattr(self.local, "pid", None) != os.getpid():
+            connection = self.local.connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            self.local.pid = os.getpid()
+            # a connection must not be shared by threads or inherited by a forked process
+        return connection
+
+    @staticmethod
+    def toDict(row:sqlite3.Row) -> dict:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        del job["leaseUntil"]
+        return job
+
+    def put(self, kind:str, model:str, payload:dict) -> str:
+        """
+        Queue a job.
+
+        Args:
+        kind (str): The kind of the job, which picks the handler of the worker running it.
+        model (str): The name of the model the job needs.
+        payload (dict): The JSON serializable arguments of the handler.
+
+        Returns:
+        str: The id of the job.
+        """
+        jobID = uuid4().hex
+        self.connection().execute(
+            "INSERT INTO jobs (id, kind, model, payload, state, created) VALUES (?, ?, ?, ?, 'queued', ?)",
+            (jobID, kind, model, json.dumps(payload), time.time()),
+        )
+        return jobID
+
+    def requeueExpired(self, connection:sqlite3.Connection, now:float) -> None:
+        connection.execute(
+            "UPDATE jobs SET state = 'failed', error = 'The lease of the job expired ' || attempts || ' times', worker = NULL, finished = ? WHERE state = 'running' AND leaseUntil < ? AND attempts >= ?",
+            (now, now, self.maxAttempts),
+        )
+        connection.execute("UPDATE jobs SET state = 'queued', worker = NULL WHERE state = 'running' AND leaseUntil < ?", (now,))
+        # the worker holding the lease crashed or hung, so another one retries the job
+
+    def claim(self, workerID:str, models:list[str], preferred:list[str]=(), leaseSeconds:float=60.0) -> dict|None:
+        """
+        Take the oldest queued job of one of the models a worker serves, and lease it to the worker.
+
+        Args:
+        workerID (str): The id of the worker.
+        models (list[str]): The names of the models the worker can load.
+        preferred (list[str], optional): The models already loaded by the worker. The oldest job of these is taken first, if any, so workers keep their models loaded. Defaults to ().
+        leaseSeconds (float, optional): The time the worker has to complete the job or renew the lease. Defaults to 60.
+
+        Returns:
+        dict | None: The job, or None if no job of the models is queued.
+        """
+        connection = self.connection()
+        now = time.time()
+
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            self.requeueExpired(connection, now)
+
+            row = None
+            for names in (list(preferred), list(models)):
+                if not names:
+                    continue
+                row = connection.execute(
+                    f"SELECT * FROM jobs WHERE state = 'queued' AND model IN ({','.join('?' * len(names))}) ORDER BY created LIMIT 1",
+                    names,
+                ).fetchone()
+                if row is not None:
+                    break
+
+            if row is None:
+                connection.execute("COMMIT")
+                return None
+
+            connection.execute(
+                "UPDATE jobs SET state = 'running', worker = ?, leaseUntil = ?, attempts = attempts + 1, progress = 0 WHERE id = ?",
+                (workerID, now + leaseSeconds, row["id"]),
+            )
+            job = self.toDict(connection.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        return job
+
+    def heartbeat(self, jobID:str, workerID:str, leaseSeconds:float=60.0, progress:float|None=None) -> bool:
+        """
+        Renew the lease of a running job.
+
+        Args:
+        jobID (str): The id of the job.
+        workerID (str): The id of the worker holding the lease.
+        leaseSeconds (float, optional): The time from now the lease is extended to. Defaults to 60.
+        progress (float | None, optional): The timestamp in seconds transcribed so far. Defaults to None.
+
+        Returns:
+        bool: False if the worker lost the lease, because it ran out and the job was given to another worker.
+        """
+        cursor = self.connection().execute(
+            "UPDATE jobs SET leaseUntil = ?, progress = MAX(progress, COALESCE(?, progress)) WHERE id = ? AND worker = ? AND state = 'running'",
+            (time.time() + leaseSeconds, progress, jobID, workerID),
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, jobID:str, workerID:str) -> None:
+        """
+        Mark a job as done, once its result is in the result store.
+
+        Args:
+        jobID (str): The id of the job.
+        workerID (str): The id of the worker holding the lease.
+
+        Returns:
+        None
+
+        Raises:
+        LeaseLost: If the worker no longer holds the lease of the job.
+        """
+        cursor = self.connection().execute(
+            "UPDATE jobs SET state = 'done', worker = NULL, leaseUntil = NULL, finished = ? WHERE id = ? AND worker = ? AND state = 'running'",
+            (time.time(), jobID, workerID),
+        )
+        if cursor.rowcount != 1:
+            raise LeaseLost(f"Worker {workerID} no longer holds the lease of job {jobID}")
+
+    def fail(self, jobID:str, workerID:str, error:str, retry:bool=True) -> bool:
+        """
+        Give a job back after it raised an error.
+
+        Args:
+        jobID (str): The id of the job.
+        workerID (str): The id of the worker holding the lease.
+        error (str): The error of the job.
+        retry (bool, optional): If True, the job is queued again unless it was started 'maxAttempts' times. Defaults to True.
+
+        Returns:
+        bool: True if the job was queued again, False if it failed for good.
+
+        Raises:
+        LeaseLost: If the worker no longer holds the lease of the job.
+        """
+        connection = self.connection()
+
+        cursor = connection.execute(
+            "UPDATE jobs SET state = 'queued', worker = NULL, leaseUntil = NULL, error = ? WHERE id = ? AND worker = ? AND state = 'running' AND ? AND attempts < ?",
+            (error, jobID, workerID, retry, self.maxAttempts),
+        )
+        if cursor.rowcount == 1:
+            return True
+
+        cursor = connection.execute(
+            "UPDATE jobs SET state = 'failed', worker = NULL, leaseUntil = NULL, error = ?, finished = ? WHERE id = ? AND worker = ? AND state = 'running'",
+            (error, time.time(), jobID, workerID),
+        )
+        if cursor.rowcount != 1:
+            raise LeaseLost(f"Worker {workerID} no longer holds the lease of job {jobID}")
+        return False
+
+    def get(self, jobID:str) -> dict|None:
+        row = self.connection().execute("SELECT * FROM jobs WHERE id = ?", (jobID,)).fetchone()
+        return self.toDict(row) if row is not None else None
+
+    def counts(self) -> dict[str, int]:
+        rows = self.connection().execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return {"queued": 0, "running": 0, "done": 0, "failed": 0, **{state: count for state, count in rows}}
+
+    def expire(self, ttl:float) -> list[dict]:
+        """
+        Remove the finished jobs that are older than a time to live.
+
+        Args:
+        ttl (float): The number of seconds a finished job is kept.
+
+        Returns:
+        list[dict]: The removed jobs, whose results and inputs the caller removes.
+        """
+        connection = self.connection()
+        cutoff = time.time() - ttl
+
+        if connection.execute("SELECT 1 FROM jobs WHERE state IN ('done', 'failed') AND finished < ? LIMIT 1", (cutoff,)).fetchone() is None:
+            return []
+        # the API expires on every read, which shouldn't take the write lock when there is nothing to remove
+
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            rows = connection.execute("SELECT * FROM jobs WHERE state IN ('done', 'failed') AND finished < ?", (cutoff,)).fetchall()
+            connection.executemany("DELETE FROM jobs WHERE id = ?", [(row["id"],) for row in rows])
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        return [self.toDict(row) for row in rows]
+
+
+class ResultStore(ABC):
+    """
+    The interface of the stores the workers write the results of jobs to and the API reads them from. A result is a JSON serializable dict, and may come with a file such as a subtitled video.
+    """
+
+    @abstractmethod
+    def put(self, jobID:str, result:dict, filePath:str|None=None) -> None:
+        ...
+
+    @abstractmethod
+    def get(self, jobID:str) -> dict|None:
+        ...
+
+    @abstractmethod
+    def filePath(self, jobID:str) -> str|None:
+        ...
+
+    @abstractmethod
+    def remove(self, jobID:str) -> None:
+        ...
+
+
+class FileResultStore(ResultStore):
+    def __init__(self, directory:str) -> None:
+        """
+        Initialize a result store keeping every result in a directory, which the API and the workers share.
+
+        Args:
+        directory (str): The directory of the results, created if missing. Workers on other machines need it on a shared filesystem.
+
+        Returns:
+        None
+
+        Results are written under a temporary name and renamed, so a reader never sees a partial result.
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, jobID:str, extension:str) -> str:
+        return os.path.join(self.directory, f"{jobID}{extension}")
+
+    def put(self, jobID:str, result:dict, filePath:str|None=None) -> None:
+        """
+        Store the result of a job.
+
+        Args:
+        jobID (str): The id of the job.
+        result (dict): The result.
+        filePath (str | None, optional): A file of the result, moved into the store. Its extension is kept. Defaults to None.
+
+        Returns:
+        None
+        """
+        if filePath is not None:
+            extension = os.path.splitext(filePath)[1]
+            shutil.move(filePath, self.path(jobID, f".partial{extension}"))
+            os.replace(self.path(jobID, f".partial{extension}"), self.path(jobID, f".file{extension}"))
+            result = {**result, "fileExtension": extension}
+
+        partialPath = self.path(jobID, ".partial.json")
+        with open(partialPath, "w") as f:
+            json.dump(result, f)
+        os.replace(partialPath, self.path(jobID, ".json"))
+
+    def get(self, jobID:str) -> dict|None:
+        try:
+            with open(self.path(jobID, ".json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def filePath(self, jobID:str) -> str|None:
+        result = self.get(jobID)
+        if result is None or "fileExtension" not in result:
+            return None
+        return self.path(jobID, f".file{result['fileExtension']}")
+
+    def remove(self, jobID:str) -> None:
+        filePath = self.filePath(jobID)
+        for path in (filePath, self.path(jobID, ".json")):
+            if path is not None and os.path.exists(path):
+                os.remove(path)
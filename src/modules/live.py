@@ -0,0 +1,213 @@
+from src.modules.transcriber import Transcriber
+from src.modules.audio import SAMPLE_RATE
+from src.modules.utils import encodeSegment, shiftSegments
+import numpy as np
+import time
+
+class RingBuffer:
+    def __init__(self, capacity:int) -> None:
+        """
+        Initialize a fixed size buffer keeping the most recent samples of a stream.
+
+        Args:
+        capacity (int): The number of samples kept.
+
+        Returns:
+        None
+
+        Samples are addressed by their position in the whole stream. Only the last 'capacity' of them can be read back.
+        """
+        self.samples = np.zeros(capacity, dtype=np.float32)
+        self.capacity = capacity
+        self.total = 0
+
+    @property
+    def start(self) -> int:
+        return max(0, self.total - self.capacity)
+
+    def write(self, samples:np.ndarray) -> None:
+        skipped = max(0, len(samples) - self.capacity)
+        samples = samples[skipped:]
+        # only the end of a chunk longer than the buffer is kept
+
+        position = (self.total + skipped) % self.capacity
+        first = min(len(samples), self.capacity - position)
+
+        self.samples[position:position+first] = samples[:first]
+        self.samples[:len(samples)-first] = samples[first:]
+        self.total += skipped + len(samples)
+
+    def read(self, start:int, end:int) -> np.ndarray:
+        """
+        Copy a range of the stream out of the buffer.
+
+        Args:
+        start (int): The position of the first sample in the stream. It is moved forward to the oldest sample still kept.
+        end (int): The position after the last sample, at most the number of samples written.
+
+        Returns:
+        np.ndarray: The samples.
+        """
+        start = max(start, self.start)
+        indices = np.arange(start, end) % self.capacity
+        return self.samples[indices]
+
+
+class LiveTranscriber:
+    def __init__(self, transcriber:Transcriber, windowLength:float=15.0, stepLength:float=1.0, commitDelay:float=2.0, bufferLength:float=60.0, cpuBudget:float=1.0, newLineInterval:int=8, promptLength:int=200, **decodeOptions) -> None:
+        """
+        Initialize a transcriber of a live audio stream, which decodes a sliding window of the recent audio again as new audio arrives.
+
+        Args:
+        transcriber (Transcriber): The transcriber whose model is used. Its cache is bypassed, live audio is never heard twice.
+        windowLength (float, optional): The maximum seconds of audio not committed yet, decoded at every step. At most 30, the window of the Whisper models. Defaults to 15.
+        stepLength (float, optional): The minimum seconds of new audio between two decodes. Defaults to 1.
+        commitDelay (float, optional): Segments ending less than this many seconds before the newest audio may still change, and stay provisional. Defaults to 2.
+        bufferLength (float, optional): The seconds of audio kept in the ring buffer. Audio older than that is dropped if the model can't keep up. Defaults to 60.
+        cpuBudget (float, optional): The maximum seconds spent decoding per second of audio received. Decodes are spaced out further when they take longer. Defaults to 1.
+        newLineInterval (int, optional): The maximum number of words per line of the committed cues. Defaults to 8.
+        promptLength (int, optional): The number of characters of the committed text passed to the model as the prompt of the next window. Defaults to 200.
+        **decodeOptions: Keyword arguments passed to the model's transcribe method.
+
+        Returns:
+        None
+
+        A committed segment never changes. Committed cues lag the audio by at least commitDelay and at most windowLength plus the time between decodes, because once the audio not committed yet is longer than the window, its segments are committed whether or not they are stable.
+        """
+        self.transcriber = transcriber
+        self.windowLength = min(windowLength, 30.0)
+        self.stepLength = stepLength
+        self.commitDelay = commitDelay
+        self.cpuBudget = cpuBudget
+        self.newLineInterval = newLineInterval
+        self.promptLength = promptLength
+        self.decodeOptions = decodeOptions
+
+        self.buffer = RingBuffer(round(max(bufferLength, self.windowLength) * SAMPLE_RATE))
+        self.committed = 0
+        # the position in the stream up to which the segments are committed
+        self.lastDecode = 0
+        self.interval = stepLength
+        self.prompt = ""
+        self.cues = 0
+
+        self.decodes = 0
+        self.decodeSeconds = 0.0
+        self.dropped = 0
+
+    def feed(self, chunk:bytes|np.ndarray) -> None:
+        """
+        Add audio to the stream.
+
+        Args:
+        chunk (bytes | np.ndarray): Mono 16 kHz audio, as little endian 16 bit PCM bytes or float samples in the range [-1, 1].
+
+        Returns:
+        None
+        """
+        if isinstance(chunk, (bytes, bytearray, memoryview)):
+            chunk = np.frombuffer(chunk, dtype="<i2").astype(np.float32) / 32768.0
+        self.buffer.write(np.asarray(chunk, dtype=np.float32))
+
+    def due(self) -> bool:
+        return self.buffer.total - self.lastDecode >= self.interval * SAMPLE_RATE
+
+    def step(self, final:bool=False) -> list[dict]:
+        """
+        Decode the audio not committed yet, if enough new audio arrived since the last decode.
+
+        Args:
+        final (bool, optional): If True, the stream has ended, the audio is decoded whatever its length and every segment is committed. Defaults to False.
+
+        Returns:
+        list[dict]: The events of the step, in order. A "committed" event has the "cue" of a segment encoded with encodeSegment, numbered from 1, with its "text", "start" and "end" in seconds on the timeline of the stream. A last "provisional" event has the "text", "start" and "end" of the segments that may still change, and is sent even when empty so clients can clear it.
+        """
+        if not final and not self.due():
+            return []
+
+        now = self.buffer.total
+        if self.committed < self.buffer.start:
+            self.dropped += self.buffer.start - self.committed
+            self.committed = self.buffer.start
+            # the model fell so far behind that the audio left the buffer
+
+        self.lastDecode = now
+        if now <= self.committed:
+            return [{"type": "provisional", "text": "", "start": now / SAMPLE_RATE, "end": now / SAMPLE_RATE}] if final else []
+
+        offset = self.committed / SAMPLE_RATE
+        options = {**self.decodeOptions, "initial_prompt": self.prompt} if self.prompt else dict(self.decodeOptions)
+
+        start = time.perf_counter()
+        output = self.transcriber.runModel(self.buffer.read(self.committed, now), {**self.transcriber.decodeOptions, **options})
+        # runModel holds the model lock shared with the batch scheduler, so live decodes never run the model alongside other requests
+        seconds = time.perf_counter() - start
+
+        self.decodes += 1
+        self.decodeSeconds += seconds
+        self.interval = max(self.stepLength, seconds / self.cpuBudget)
+        # spacing decodes out keeps the decode time per second of audio under the budget
+
+        segments = [segment for segment in shiftSegments(output["segments"], offset) if segment["text"].strip()]
+        nowSeconds = now / SAMPLE_RATE
+        stable = nowSeconds - self.commitDelay
+
+        if final:
+            count = len(segments)
+        else:
+            count = 0
+            while count < len(segments) - 1 and segments[count]["end"] <= stable:
+                count += 1
+            # the last segment may be cut off by the end of the window
+
+            if nowSeconds - (segments[count-1]["end"] if count else offset) > self.windowLength:
+                count = max(count, sum(1 for segment in segments if segment["end"] <= stable)) or len(segments)
+                # the window is full, so latency wins over stability
+
+        events = []
+        for segment in segments[:count]:
+            self.cues += 1
+            segment["end"] = min(segment["end"], nowSeconds)
+            events.append({"type": "committed", "cue": encodeSegment(segment, self.cues, self.newLineInterval), "text": segment["text"], "start": segment["start"], "end": segment["end"]})
+
+        if count:
+            self.committed = min(now, round(segments[count-1]["end"] * SAMPLE_RATE))
+            self.prompt = (self.prompt + "".join(segment["text"] for segment in segments[:count]))[-self.promptLength:]
+        elif not segments and nowSeconds - offset > self.commitDelay:
+            self.committed = max(self.committed, round(stable * SAMPLE_RATE))
+            # nothing was said, the silence doesn't need decoding again
+
+        if final:
+            self.committed = now
+
+        pending = segments[count:]
+        events.append({
+            "type": "provisional",
+            "text": "".join(segment["text"] for segment in pending),
+            "start": pending[0]["start"] if pending else self.committed / SAMPLE_RATE,
+            "end": pending[-1]["end"] if pending else self.committed / SAMPLE_RATE,
+        })
+
+        return events
+
+    def finish(self) -> list[dict]:
+        return self.step(final=True)
+
+    def stats(self) -> dict[str, float | int]:
+        """
+        Describe the stream so far.
+
+        Returns:
+        dict[str, float | int]: The seconds of audio "received", "committed" and "dropped", the number of "decodes" and the "cue" count, the seconds spent decoding, their ratio to the audio received as "cpuRatio", and the current seconds between decodes as "interval".
+        """
+        received = self.buffer.total / SAMPLE_RATE
+        return {
+            "received": received,
+            "committed": self.committed / SAMPLE_RATE,
+            "dropped": self.dropped / SAMPLE_RATE,
+            "decodes": self.decodes,
+            "cues": self.cues,
+            "decodeSeconds": self.decodeSeconds,
+            "cpuRatio": self.decodeSeconds / received if received else 0.0,
+            "interval": self.interval,
+        }
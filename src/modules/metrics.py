@@ -0,0 +1,258 @@
+from contextlib import contextmanager
+from threading import Lock
+from typing import Callable, Generator
+import time
+import math
+
+defaultBuckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+rtfBuckets = (0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 5.0)
+
+def formatLabels(labels:dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+def formatValue(value:float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name:str, help:str, labelNames:tuple[str, ...]=()) -> None:
+        """
+        Initialize a metric holding one value per combination of label values.
+
+        Args:
+        name (str): The name of the metric in the Prometheus text format.
+        help (str): The description of the metric.
+        labelNames (tuple[str, ...], optional): The names of the labels every sample of the metric has. Defaults to ().
+
+        Returns:
+        None
+        """
+        self.name = name
+        self.help = help
+        self.labelNames = tuple(labelNames)
+        self.values = {}
+        self.lock = Lock()
+
+    def key(self, labels:dict[str, str]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelNames):
+            raise ValueError(f"{self.name} has the labels {self.labelNames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelNames)
+
+    def samples(self) -> Generator[tuple[str, dict[str, str], float], None, None]:
+        with self.lock:
+            items = list(self.values.items())
+
+        for key, value in items:
+            yield self.name, dict(zip(self.labelNames, key)), value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{name}{formatLabels(labels)} {formatValue(value)}" for name, labels, value in self.samples()]
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount:float=1.0, **labels) -> None:
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def setTotal(self, value:float, **labels) -> None:
+        """
+        Set the counter to a running total kept elsewhere, such as the hits of a cache, from a collector.
+
+        Args:
+        value (float): The total. It only goes down when its owner is reset, which Prometheus treats as a restart.
+        **labels: The values of the labels of the counter.
+
+        Returns:
+        None
+        """
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value:float, **labels) -> None:
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name:str, help:str, labelNames:tuple[str, ...]=(), buckets:tuple[float, ...]=defaultBuckets) -> None:
+        """
+        Initialize a histogram counting observations in cumulative buckets, one set of buckets per combination of label values.
+
+        Args:
+        name (str): The name of the metric in the Prometheus text format.
+        help (str): The description of the metric.
+        labelNames (tuple[str, ...], optional): The names of the labels every sample of the metric has. Defaults to ().
+        buckets (tuple[float, ...], optional): The upper bounds of the buckets. A +Inf bucket is always added. Defaults to defaultBuckets.
+
+        Returns:
+        None
+        """
+        super().__init__(name, help, labelNames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value:float, **labels) -> None:
+        key = self.key(labels)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self.values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels) -> Generator[None, None, None]:
+        """
+        Observe the time a with block takes, in seconds.
+
+        Args:
+        **labels: The label values of the observation.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> Generator[tuple[str, dict[str, str], float], None, None]:
+        with self.lock:
+            items = [(key, (list(counts), total)) for key, (counts, total) in self.values.items()]
+
+        for key, (counts, total) in items:
+            labels = dict(zip(self.labelNames, key))
+            for bound, count in zip(self.buckets, counts):
+                yield f"{self.name}_bucket", {**labels, "le": formatValue(bound) if math.isinf(bound) else str(bound)}, count
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, counts[-1]
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        """
+        Initialize a registry of metrics rendered together in the Prometheus text format.
+
+        Returns:
+        None
+
+        Metrics are created on first use with 'counter', 'gauge' and 'histogram', and the same metric is returned when a name is asked for again, so modules can share metrics without importing each other. Collectors are called right before rendering, to update gauges that are cheaper to read than to track.
+        """
+        self.metrics = {}
+        self.collectors = []
+        self.lock = Lock()
+
+    def get(self, cls:type, name:str, help:str, labelNames:tuple[str, ...], **kwargs) -> Metric:
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help, labelNames, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"{name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name:str, help:str, labelNames:tuple[str, ...]=()) -> Counter:
+        return self.get(Counter, name, help, labelNames)
+
+    def gauge(self, name:str, help:str, labelNames:tuple[str, ...]=()) -> Gauge:
+        return self.get(Gauge, name, help, labelNames)
+
+    def histogram(self, name:str, help:str, labelNames:tuple[str, ...]=(), buckets:tuple[float, ...]=defaultBuckets) -> Histogram:
+        return self.get(Histogram, name, help, labelNames, buckets=buckets)
+
+    def addCollector(self, collector:Callable[[], None]) -> None:
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format.
+
+        Returns:
+        str: The metrics, ending with a newline.
+        """
+        for collector in self.collectors:
+            collector()
+
+        with self.lock:
+            metrics = list(self.metrics.values())
+
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+class StageStats:
+    def __init__(self, stages:tuple[str, ...]) -> None:
+        """
+        Initialize a record of the busy time and the items handled by every stage of a pipeline.
+
+        Args:
+        stages (tuple[str, ...]): The names of the stages.
+
+        Returns:
+        None
+
+        A stage run by several threads adds up the busy time of all of them, so its rate is per thread, while the overall rate uses the wall time since the record was created.
+        """
+        self.stages = stages
+        self.seconds = {stage: 0.0 for stage in stages}
+        self.items = {stage: 0 for stage in stages}
+        self.start = time.perf_counter()
+        self.lock = Lock()
+
+    def add(self, stage:str, seconds:float, items:int) -> None:
+        with self.lock:
+            self.seconds[stage] += seconds
+            self.items[stage] += items
+
+    @contextmanager
+    def time(self, stage:str, items:int) -> Generator[None, None, None]:
+        """
+        Add the time a with block takes and the items it handles to a stage.
+
+        Args:
+        stage (str): The name of the stage.
+        items (int): The number of items handled by the block.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start, items)
+
+    def snapshot(self) -> dict[str, float | int | dict]:
+        """
+        Describe the progress of the pipeline.
+
+        Returns:
+        dict[str, float | int | dict]: The wall "seconds" so far, and for every stage its "items", busy "seconds" and "rate" of items per busy second.
+        """
+        with self.lock:
+            return {
+                "seconds": time.perf_counter() - self.start,
+                "stages": {stage: {"items": self.items[stage], "seconds": self.seconds[stage], "rate": self.items[stage] / self.seconds[stage] if self.seconds[stage] else 0.0} for stage in self.stages},
+            }
+
+
+metrics = MetricsRegistry()
+
+stageSeconds = metrics.histogram("transcription_stage_seconds", "Time spent in each stage of handling a transcription.", ("stage",))
+realTimeFactor = metrics.histogram("transcription_real_time_factor", "Seconds spent decoding and transcribing per second of audio.", ("model",), rtfBuckets)
+audioSeconds = metrics.counter("transcription_audio_seconds_total", "Seconds of audio transcribed.", ("model",))
+videoStageFps = metrics.gauge("video_stage_fps", "Frames per busy second of each stage of the last subtitled video.", ("stage",))
+videoFrames = metrics.counter("video_frames_total", "Frames handled by each stage of video subtitling.", ("stage",))
@@ -0,0 +1,162 @@
+from concurrent.futures import ProcessPoolExecutor
+from collections import Counter
+from typing import Callable, BinaryIO
+from src.modules.transcriber import Transcriber
+from src.modules.cache import TranscriptionCache
+from src.modules.audio import loadAudio, splitOnSilence, SAMPLE_RATE
+from src.modules.utils import shiftSegments, trimChunkSegments
+from src.modules.cpu import loadCPUModel
+from src.modules.metrics import stageSeconds
+import multiprocessing
+import numpy as np
+import whisper
+import torch
+import time
+import os
+
+workerModel = None
+workerOptions = {}
+
+def initWorker(modelName:str, device:str, threads:int, decodeOptions:dict, quantize:bool=False) -> None:
+    """
+    Load the model once in a worker process of the pool.
+
+    Args:
+    modelName (str): The name of the Whisper model to load.
+    device (str): The device the model is loaded on.
+    threads (int): The number of torch threads used by the worker.
+    decodeOptions (dict): The keyword arguments passed to the model's transcribe method.
+    quantize (bool, optional): If True, the model is loaded with loadCPUModel, quantized to int8. Defaults to False.
+
+    Returns:
+    None
+    """
+    global workerModel, workerOptions
+
+    torch.set_num_threads(threads)
+    workerModel = loadCPUModel(modelName, device, threads=threads, interopThreads=1) if quantize else whisper.load_model(modelName, device)
+    # a single inter-op thread, the workers already run in parallel
+    workerOptions = decodeOptions
+
+def transcribeChunk(audio:np.ndarray, offset:float, options:dict|None=None) -> dict[str, str | list]:
+    """
+    Transcribe one chunk of audio in a worker process.
+
+    Args:
+    audio (np.ndarray): The samples of the chunk at 16 kHz.
+    offset (float): The start of the chunk in the full audio, in seconds.
+    options (dict | None, optional): Decode options overriding the ones the worker was started with. Defaults to None.
+
+    Returns:
+    dict[str, str | list]: The raw output of the model with the segment timestamps moved to the timeline of the full audio.
+    """
+    output = workerModel.transcribe(audio, **{**workerOptions, **(options or {})})
+    shiftSegments(output["segments"], offset)
+
+    return output
+
+def mergeChunks(chunks:list[tuple[int, int]], outputs:list[dict], sampleRate:int=SAMPLE_RATE) -> dict[str, str | list]:
+    """
+    Merge the outputs of consecutive chunks into the output of the full audio.
+
+    Args:
+    chunks (list[tuple[int, int]]): The (start, end) sample indices of the chunks, as returned by splitOnSilence.
+    outputs (list[dict]): The outputs of transcribeChunk for every chunk, in order.
+    sampleRate (int, optional): The sample rate of the audio. Defaults to 16000.
+
+    Returns:
+    dict[str, str | list]: A dictionary with the keys "text", "segments" and "language".
+
+    Chunks cut at a silence are simply joined, overlapping chunks are trimmed by trimChunkSegments.
+    """
+    segments = []
+    languages = Counter()
+
+    for i, output in enumerate(outputs):
+        languages[output["language"]] += 1
+        lastEnd = segments[-1]["end"] if segments else 0.0
+        segments.extend(trimChunkSegments(output["segments"], chunks, i, lastEnd, sampleRate))
+
+    for i, segment in enumerate(segments):
+        segment["id"] = i
+
+    return {
+        "text": "".join(segment["text"] for segment in segments),
+        "segments": segments,
+        "language": languages.most_common(1)[0][0] if languages else None,
+    }
+
+
+class ParallelTranscriber(Transcriber):
+    def __init__(self, modelName: str, workers: int | None = None, chunkLength: float = 600.0, overlap: float = 2.0, device: str = "cpu", cache: TranscriptionCache | None = None, quantize: bool = False, **decodeOptions) -> None:
+        """
+        Initialize a Transcriber that splits long audio at silences and transcribes the chunks in a pool of processes.
+
+        Args:
+        modelName (str): The name of the Whisper model, loaded once by every worker process.
+        workers (int | None, optional): The number of worker processes. Defaults to the number of CPUs.
+        chunkLength (float, optional): The maximum length of a chunk in seconds. Defaults to 600.
+        overlap (float, optional): The number of seconds shared by two chunks when no silence was found near the cut. Defaults to 2.
+        device (str, optional): The device the workers load the model on. Defaults to "cpu".
+        cache (TranscriptionCache | None, optional): A cache placed in front of the pool. Defaults to None.
+        quantize (bool, optional): If True, the workers quantize the Linear layers of the model to int8, which needs the device to be the CPU. Defaults to False.
+        **decodeOptions: Keyword arguments passed to the model's transcribe method for every chunk.
+
+        Returns:
+        None
+
+        Raises:
+        ValueError: If 'chunkLength' isn't positive, or 'overlap' is negative or not shorter than 'chunkLength'.
+
+        The CPUs are divided evenly between the workers so their torch thread pools don't compete. Audio shorter than 'chunkLength' is transcribed as a single chunk.
+        """
+        if chunkLength <= 0:
+            raise ValueError(f"chunkLength must be positive, got {chunkLength}")
+        if not 0 <= overlap < chunkLength:
+            raise ValueError(f"overlap must be at least 0 and shorter than chunkLength ({chunkLength}), got {overlap}")
+
+        super().__init__(None, f"{modelName}-int8" if quantize else modelName, cache, **decodeOptions)
+        # quantized results are cached apart from the fp32 ones
+
+        self.workers = workers or os.cpu_count()
+        self.chunkLength = chunkLength
+        self.overlap = overlap
+
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        context = multiprocessing.get_context("spawn")
+        # forking a process that already initialized torch can deadlock its thread pools
+
+        self.pool = ProcessPoolExecutor(self.workers, context, initWorker, (modelName, device, threads, decodeOptions, quantize))
+
+    def runModel(self, audioFile: str | np.ndarray | BinaryIO, options: dict, progressCallback: Callable[[float], None] | None = None) -> dict[str, str | list]:
+        """
+        Split the audio into chunks and transcribe them in the worker processes.
+
+        Args:
+        audioFile (str | np.ndarray | BinaryIO): The path to the audio file to be transcribed, its samples at 16 kHz, or a file-like object with its encoded contents.
+        options (dict): The decode options, passed to the workers with every chunk.
+        progressCallback (Callable[[float], None] | None, optional): Called with the end of every chunk in seconds, in order, as soon as the chunks up to it are transcribed. Defaults to None.
+
+        Returns:
+        dict[str, str | list]: The merged raw output of the chunks.
+        """
+        start = time.perf_counter()
+
+        with stageSeconds.time(stage="decode"):
+            audio = loadAudio(audioFile)
+        chunks = splitOnSilence(audio, SAMPLE_RATE, self.chunkLength, min(60.0, self.chunkLength / 2), self.overlap)
+
+        futures = [self.pool.submit(transcribeChunk, audio[start:end], start / SAMPLE_RATE, options) for start, end in chunks]
+
+        outputs = []
+        with stageSeconds.time(stage="inference"):
+            for (_, end), future in zip(chunks, futures):
+                outputs.append(future.result())
+                if progressCallback is not None:
+                    progressCallback(end / SAMPLE_RATE)
+
+        self.recordRealTime(len(audio) / SAMPLE_RATE, time.perf_counter() - start)
+        return mergeChunks(chunks, outputs)
+
+    def close(self) -> None:
+        self.pool.shutdown()
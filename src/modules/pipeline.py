@@ -0,0 +1,123 @@
+from decord import AudioReader, cpu
+from threading import Thread, Event
+from queue import Queue
+from src.modules.transcriber import Transcriber
+from src.modules.video import VideoTranscriber
+from src.modules.subtitle import SubtitleConfig, SubtitleIndex
+from src.modules.vad import VoiceActivityDetector
+from src.modules.audio import SAMPLE_RATE
+from src.modules.ffmpeg import concatSegments
+import numpy as np
+import tempfile
+import shutil
+import os
+import cv2
+from tqdm import tqdm
+
+def loadVideoAudio(videoPath:str, sampleRate:int=SAMPLE_RATE) -> np.ndarray:
+    """
+    Decode the audio track of a video in memory with decord.
+
+    Args:
+    videoPath (str): The path to the video file.
+    sampleRate (int, optional): The sample rate the audio is resampled to. Defaults to 16000, the rate of the Whisper models.
+
+    Returns:
+    np.ndarray: The mono samples as float32.
+    """
+    reader = AudioReader(videoPath, ctx=cpu(0), sample_rate=sampleRate, mono=True)
+    return reader[:].asnumpy()[0]
+
+def subtitleVideo(transcriber:Transcriber, videoPath:str, subConfig:SubtitleConfig, outputPath:str, chunkLength:float=30.0, partSeconds:float=10.0, outputFourcc:int=cv2.VideoWriter_fourcc(*'mp4v'), vad:VoiceActivityDetector|None=None, verbose:bool=False, workDir:str|None=None, **decodeOptions) -> list[dict]:
+    """
+    Transcribe a video and render its subtitles in one pass, rendering frames while the rest of the audio is still being transcribed.
+
+    Args:
+    transcriber (Transcriber): The transcriber of the model.
+    videoPath (str): The path to the video file.
+    subConfig (SubtitleConfig): The configuration of the subtitles.
+    outputPath (str): The path of the subtitled video, which keeps the audio of the original.
+    chunkLength (float, optional): The maximum length in seconds of the chunks of audio transcribed at a time. Defaults to 30.
+    partSeconds (float, optional): The minimum length in seconds of the video rendered at a time while the transcription runs. Defaults to 10.
+    outputFourcc (int, optional): The four-character code of the rendered video. Defaults to cv2.VideoWriter_fourcc(*'mp4v').
+    vad (VoiceActivityDetector | None, optional): A voice activity detector run before the model. Defaults to None.
+    verbose (bool, optional): If True, display a progress bar of the rendered frames. Defaults to False.
+    workDir (str | None, optional): The directory of the temporary parts. Defaults to the system temporary directory.
+    **decodeOptions: Keyword arguments passed to the model's transcribe method, such as word_timestamps for karaoke subtitles.
+
+    Returns:
+    list[dict]: The segments of the transcription.
+
+    The audio track is decoded in memory with decord, so the file isn't decoded again by ffmpeg for the model, and transcribed chunk by chunk in a thread. Segments come in order of their start, so once a segment starting at a frame is known, every frame before it has all of its cues and is rendered into a part while the next chunks are transcribed. The parts are joined without re-encoding and the original audio is copied in, so the wall time is close to the longer of transcribing and rendering instead of their sum.
+    """
+    audio = loadVideoAudio(videoPath)
+    video = VideoTranscriber.fromFile(videoPath, subConfig, [])
+    totalFrames = len(video.video)
+    partFrames = max(1, round(partSeconds * video.fps))
+
+    found = Queue()
+    stop = Event()
+    errors = []
+
+    def transcribe():
+        try:
+            for segment in transcriber.iterRawSegments(audio, chunkLength, vad, **decodeOptions):
+                if stop.is_set():
+                    return
+                found.put(segment)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            found.put(None)
+
+    segments = []
+    partsDir = tempfile.mkdtemp(dir=workDir)
+    extension = os.path.splitext(outputPath)[1] or ".mp4"
+    progress = tqdm(total=totalFrames, unit=" frames") if verbose else None
+
+    thread = Thread(target=transcribe, daemon=True)
+    thread.start()
+
+    try:
+        parts = []
+        rendered = 0
+        final = 0
+        finished = False
+
+        while rendered < totalFrames:
+            while not finished and final - rendered < partFrames:
+                segment = found.get()
+                if segment is None:
+                    finished = True
+                    break
+
+                segments.append(segment)
+                video.subList.extend(video.interpretSRT([segment]))
+                final = min(max(final, video.timeStamp2Frame(segment["start"])), totalFrames)
+                # no later segment starts before this one, so the frames before it are final
+
+            if errors:
+                raise errors[0]
+
+            end = totalFrames if finished else final
+            if end <= rendered:
+                continue
+
+            video.subIndex = SubtitleIndex(video.subList)
+            partPath = os.path.join(partsDir, f"{len(parts):06}{extension}")
+            video.subtitle(partPath, outputFourcc=outputFourcc, startFrame=rendered, endFrame=end)
+            parts.append(partPath)
+
+            if progress is not None:
+                progress.update(end - rendered)
+            rendered = end
+
+        concatSegments(parts, outputPath, videoPath, partsDir)
+    finally:
+        stop.set()
+        shutil.rmtree(partsDir, ignore_errors=True)
+        if progress is not None:
+            progress.close()
+
+    thread.join()
+    return segments
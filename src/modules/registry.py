@@ -0,0 +1,265 @@
+from contextlib import contextmanager
+from threading import Lock
+from typing import Callable, Generator
+from whisper.model import Whisper
+from src.modules.transcriber import Transcriber
+from src.modules.cache import TranscriptionCache
+from src.modules.scheduler import BatchScheduler
+import whisper
+import torch
+import time
+import gc
+
+class UnknownModel(ValueError):
+    pass
+
+
+class LoadedModel:
+    def __init__(self, name:str, model:Whisper, transcriber:Transcriber, scheduler:BatchScheduler|None, size:int, loadSeconds:float) -> None:
+        """
+        Hold a model loaded by the ModelRegistry together with the objects built around it.
+
+        Args:
+        name (str): The name of the model.
+        model (Whisper): The loaded model.
+        transcriber (Transcriber): The transcriber running the model.
+        scheduler (BatchScheduler | None): The batching scheduler owned by the transcriber, if any.
+        size (int): The memory taken by the parameters and buffers of the model, in bytes.
+        loadSeconds (float): The time it took to load the model, in seconds.
+
+        Returns:
+        None
+        """
+        self.name = name
+        self.model = model
+        self.transcriber = transcriber
+        self.scheduler = scheduler
+        self.size = size
+        self.loadSeconds = loadSeconds
+        self.lastUsed = time.time()
+        self.users = 0
+
+
+class ModelRegistry:
+    def __init__(self, names:list[str]|None=None, memoryBudget:int=4*1024**3, device:str|None=None, cache:TranscriptionCache|None=None, batchSize:int|None=None, batchWait:float=0.05, loader:Callable[..., Whisper]=whisper.load_model, variant:str|None=None, **decodeOptions) -> None:
+        """
+        Initialize a registry that loads Whisper models on first use and keeps them resident under a memory budget.
+
+        Args:
+        names (list[str] | None, optional): The names of the models that may be loaded. Defaults to every model known to whisper.
+        memoryBudget (int, optional): The maximum memory in bytes taken by the resident models. Defaults to 4 GiB.
+        device (str | None, optional): The device the models are loaded on. Defaults to CUDA if available, else the CPU.
+        cache (TranscriptionCache | None, optional): A cache shared by the transcribers of all models. Results are kept apart by model name. Defaults to None.
+        batchSize (int | None, optional): The batch size of the BatchScheduler built for every model, which opts into its faster but lower quality decoding. If None, models are run with their transcribe method. Defaults to None.
+        batchWait (float, optional): The maximum wait of the schedulers for a full batch, in seconds. Defaults to 0.05.
+        loader (Callable[..., Whisper], optional): The function loading a model from its name and device. Defaults to whisper.load_model.
+        variant (str | None, optional): A tag describing how the loader changes the models, such as "int8", added to the model names in cache keys so results of different variants are kept apart. Defaults to None.
+        **decodeOptions: Default keyword arguments passed to the transcribers.
+
+        Returns:
+        None
+
+        Nothing is loaded by the constructor. When loading a model takes the resident models over the budget, the least recently used models that are not in use are unloaded. Models in use are never unloaded, so the budget can be exceeded while more models are in use than it fits.
+        """
+        self.names = set(names) if names is not None else set(whisper.available_models())
+        self.memoryBudget = memoryBudget
+        self.device = device
+        self.cache = cache
+        self.batchSize = batchSize
+        self.batchWait = batchWait
+        self.loader = loader
+        self.variant = variant
+        self.decodeOptions = decodeOptions
+
+        self.loaded = {}
+        self.lock = Lock()
+        self.loadLocks = {name: Lock() for name in self.names}
+        # one lock per model, so concurrent first requests load it once and other models stay usable meanwhile
+
+        self.sizes = {}
+        self.loads = {name: 0 for name in self.names}
+        self.lastLoadSeconds = {}
+
+    @staticmethod
+    def modelSize(model:torch.nn.Module) -> int:
+        """
+        Compute the memory taken by the parameters and buffers of a model.
+
+        Args:
+        model (torch.nn.Module): The model.
+
+        Returns:
+        int: The size in bytes.
+        """
+        tensors = list(model.parameters()) + list(model.buffers())
+
+        for module in model.modules():
+            weight = getattr(module, "weight", None)
+            if callable(weight):
+                tensors.append(weight())
+                if module.bias() is not None:
+                    tensors.append(module.bias())
+                # the weights of dynamically quantized layers are packed and not parameters
+
+        return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+    def acquire(self, name:str) -> Transcriber:
+        """
+        Get the transcriber of a model, loading the model first if it is not resident, and mark it as in use.
+
+        Args:
+        name (str): The name of the model.
+
+        Returns:
+        Transcriber: The transcriber of the model. It must be given back with 'release'.
+
+        Raises:
+        UnknownModel: If the model is not one of the names of the registry.
+        """
+        if name not in self.names:
+            raise UnknownModel(f"Unknown model {name}, expected one of {sorted(self.names)}")
+
+        with self.loadLocks[name]:
+            with self.lock:
+                entry = self.loaded.get(name)
+                if entry is not None:
+                    entry.users += 1
+                    entry.lastUsed = time.time()
+                    return entry.transcriber
+
+            if name in self.sizes:
+                self.evict(self.sizes[name])
+                # the size is known from an earlier load, so room is made before loading
+
+            entry = self.load(name)
+
+            with self.lock:
+                entry.users += 1
+                self.loaded[name] = entry
+
+            self.evict(0)
+            return entry.transcriber
+
+    def release(self, name:str) -> None:
+        with self.lock:
+            entry = self.loaded.get(name)
+            if entry is not None:
+                entry.users -= 1
+                entry.lastUsed = time.time()
+
+        self.evict(0)
+
+    @contextmanager
+    def use(self, name:str) -> Generator[Transcriber, None, None]:
+        """
+        Use the transcriber of a model for the duration of a with block.
+
+        Args:
+        name (str): The name of the model.
+
+        Yields:
+        Transcriber: The transcriber of the model, which is not unloaded before the block exits.
+        """
+        transcriber = self.acquire(name)
+        try:
+            yield transcriber
+        finally:
+            self.release(name)
+
+    def load(self, name:str) -> LoadedModel:
+        start = time.perf_counter()
+        model = self.loader(name, self.device)
+        loadSeconds = time.perf_counter() - start
+
+        scheduler = BatchScheduler(model, self.batchSize, self.batchWait) if self.batchSize else None
+        transcriber = Transcriber(model, f"{name}-{self.variant}" if self.variant else name, self.cache, scheduler, **self.decodeOptions)
+        size = self.modelSize(model)
+
+        with self.lock:
+            self.sizes[name] = size
+            self.loads[name] += 1
+            self.lastLoadSeconds[name] = loadSeconds
+
+        return LoadedModel(name, model, transcriber, scheduler, size, loadSeconds)
+
+    def evict(self, incoming:int) -> None:
+        """
+        Unload the least recently used models that are not in use until the resident models and an incoming one fit in the budget.
+
+        Args:
+        incoming (int): The size in bytes of a model about to be loaded.
+
+        Returns:
+        None
+        """
+        with self.lock:
+            total = incoming + sum(entry.size for entry in self.loaded.values())
+            idle = sorted((entry for entry in self.loaded.values() if entry.users == 0), key=lambda entry: entry.lastUsed)
+
+            evicted = []
+            for entry in idle:
+                if total <= self.memoryBudget:
+                    break
+                del self.loaded[entry.name]
+                total -= entry.size
+                evicted.append(entry)
+
+        for entry in evicted:
+            self.free(entry)
+
+    def unload(self, name:str) -> bool:
+        """
+        Unload a model if it is resident and not in use.
+
+        Args:
+        name (str): The name of the model.
+
+        Returns:
+        bool: True if the model was unloaded.
+        """
+        with self.lock:
+            entry = self.loaded.get(name)
+            if entry is None or entry.users > 0:
+                return False
+            del self.loaded[name]
+
+        self.free(entry)
+        return True
+
+    def free(self, entry:LoadedModel) -> None:
+        if entry.scheduler is not None:
+            entry.scheduler.close()
+
+        entry.model = entry.transcriber = entry.scheduler = None
+        gc.collect()
+
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def stats(self) -> dict[str, dict]:
+        """
+        Describe the models of the registry.
+
+        Returns:
+        dict[str, dict]: For every model name, whether it is loaded, its size in bytes once it has been loaded, the time its last load took in seconds, how many times it was loaded, and for resident models the number of users and the time it was last used.
+        """
+        with self.lock:
+            stats = {}
+            for name in sorted(self.names):
+                entry = self.loaded.get(name)
+                stats[name] = {
+                    "loaded": entry is not None,
+                    "sizeBytes": self.sizes.get(name),
+                    "loadSeconds": self.lastLoadSeconds.get(name),
+                    "loads": self.loads[name],
+                    "users": entry.users if entry is not None else 0,
+                    "lastUsed": entry.lastUsed if entry is not None else None,
+                }
+            return stats
+
+    def __contains__(self, name:str) -> bool:
+        return name in self.loaded
+
+    def __str__(self) -> str:
+        resident = sum(entry.size for entry in self.loaded.values())
+        return f"ModelRegistry(loaded={sorted(self.loaded)}, residentBytes={resident}, budget={self.memoryBudget})"
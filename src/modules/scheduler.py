@@ -0,0 +1,330 @@
+from whisper.model import Whisper
+from whisper.audio import load_audio, log_mel_spectrogram, pad_or_trim, N_FRAMES, N_SAMPLES, HOP_LENGTH, SAMPLE_RATE
+from whisper.decoding import DecodingOptions
+from whisper.tokenizer import get_tokenizer
+from concurrent.futures import Future
+from collections import Counter, deque
+from dataclasses import fields
+from typing import Callable
+from threading import Thread, Lock
+from queue import Queue, Empty
+import numpy as np
+import time
+import torch
+
+decodingFields = {field.name for field in fields(DecodingOptions)}
+
+class TranscriptionRequest:
+    def __init__(self, windows:int, options:dict, progressCallback:Callable[[float], None]|None=None) -> None:
+        """
+        Keep track of the windows of one audio file queued in a BatchScheduler.
+
+        Args:
+        windows (int): The number of 30 second windows the audio was split into.
+        options (dict): The decode options of the request.
+        progressCallback (Callable[[float], None] | None, optional): Called with the end timestamp of the last segment of the finished windows, in seconds, whenever a window in order is finished. Defaults to None.
+
+        Returns:
+        None
+        """
+        self.future = Future()
+        self.options = options
+        self.progressCallback = progressCallback
+        self.finishedWindows = 0
+        self.optionsKey = tuple(sorted(options.items(), key=lambda item: item[0]))
+        self.results = [None] * windows
+        self.remaining = windows
+        self.lock = Lock()
+
+    def complete(self, index:int, segments:list[dict], language:str) -> bool:
+        """
+        Store the segments decoded from one window.
+
+        Args:
+        index (int): The index of the window.
+        segments (list[dict]): The segments decoded from the window.
+        language (str): The language detected in the window.
+
+        Returns:
+        bool: True if this was the last window of the request.
+        """
+        with self.lock:
+            self.results[index] = (segments, language)
+            self.remaining -= 1
+
+            progress = None
+            while self.finishedWindows < len(self.results) and self.results[self.finishedWindows] is not None:
+                windowSegments, _ = self.results[self.finishedWindows]
+                if windowSegments:
+                    progress = windowSegments[-1]["end"]
+                self.finishedWindows += 1
+            # windows of a request can finish out of order, so progress only moves over the finished prefix
+
+            if progress is not None and self.progressCallback is not None:
+                self.progressCallback(progress)
+
+            return self.remaining == 0
+
+    def output(self) -> dict[str, str | list]:
+        segments = []
+        languages = Counter()
+
+        for windowSegments, language in self.results:
+            segments.extend(windowSegments)
+            languages[language] += 1
+
+        for i, segment in enumerate(segments):
+            segment["id"] = i
+
+        return {
+            "text": "".join(segment["text"] for segment in segments),
+            "segments": segments,
+            "language": languages.most_common(1)[0][0] if languages else None,
+        }
+
+
+class BatchScheduler:
+    def __init__(self, model:Whisper, maxBatchSize:int=8, maxWait:float=0.05, noSpeechThreshold:float|None=0.6, logprobThreshold:float|None=-1.0) -> None:
+        """
+        Initialize a scheduler that batches 30 second windows of several requests into one forward pass of a shared model.
+
+        Args:
+        model (Whisper): The Whisper model owned by the scheduler's worker thread.
+        maxBatchSize (int, optional): The maximum number of windows decoded in one forward pass. Defaults to 8.
+        maxWait (float, optional): The maximum time in seconds the worker waits for more windows before decoding an incomplete batch. Defaults to 0.05.
+        noSpeechThreshold (float | None, optional): Windows with a higher no speech probability are treated as silent. Defaults to 0.6.
+        logprobThreshold (float | None, optional): A silent window is kept anyway if its average log probability is higher than this. Defaults to -1.0.
+
+        Returns:
+        None
+
+        Each request is split into consecutive, non-overlapping 30 second windows which are decoded independently, so unlike the model's transcribe method the previous text is not used as a prompt, there is no temperature fallback against repeated or hallucinated text, and words at the edges of the windows can be cut. Batching trades that quality for throughput, so it is opt-in: a Transcriber only uses a scheduler it is given, and caches its results apart. Only options of DecodingOptions are supported, and windows are only batched together with windows that share the same options. The forward passes run under 'modelLock', which the Transcriber also holds while running the model's transcribe method for the other requests.
+        """
+        self.model = model
+        self.maxBatchSize = maxBatchSize
+        self.maxWait = maxWait
+        self.noSpeechThreshold = noSpeechThreshold
+        self.logprobThreshold = logprobThreshold
+
+        self.modelLock = Lock()
+        self.queue = Queue()
+        self.pending = deque()
+        # windows taken from the queue that could not join the current batch
+
+        self.running = True
+        self.worker = Thread(target=self.run, name="BatchScheduler", daemon=True)
+        self.worker.start()
+
+    @staticmethod
+    def supports(options:dict) -> bool:
+        """
+        Check whether every decode option can be handled by the scheduler.
+
+        Args:
+        options (dict): The decode options of a request.
+
+        Returns:
+        bool: True if all options are fields of DecodingOptions.
+        """
+        return all(key in decodingFields for key in options)
+
+    def submit(self, audio:str|np.ndarray, progressCallback:Callable[[float], None]|None=None, **options) -> Future:
+        """
+        Queue an audio file for transcription.
+
+        Args:
+        audio (str | np.ndarray): The path to the audio file or the audio samples at 16 kHz.
+        progressCallback (Callable[[float], None] | None, optional): Called with the timestamp in seconds transcribed so far. Defaults to None.
+        **options: Keyword arguments used to construct DecodingOptions.
+
+        Returns:
+        Future: A future resolving to a dictionary with the keys "text", "segments" and "language", like the output of the model's transcribe method.
+        """
+        if not self.running:
+            raise RuntimeError("BatchScheduler is closed")
+
+        if not self.supports(options):
+            raise ValueError(f"Unsupported decode options {sorted(set(options) - decodingFields)}")
+
+        if isinstance(audio, str):
+            audio = load_audio(audio)
+
+        mel = log_mel_spectrogram(audio, self.model.dims.n_mels, padding=N_SAMPLES)
+        contentFrames = mel.shape[-1] - N_FRAMES
+        windows = max(1, -(-contentFrames // N_FRAMES))
+
+        request = TranscriptionRequest(windows, options, progressCallback)
+
+        for index in range(windows):
+            seek = index * N_FRAMES
+            size = min(N_FRAMES, contentFrames - seek)
+            self.queue.put((request, index, seek, size, pad_or_trim(mel[:, seek:seek+N_FRAMES], N_FRAMES)))
+
+        return request.future
+
+    def transcribe(self, audio:str|np.ndarray, progressCallback:Callable[[float], None]|None=None, **options) -> dict[str, str | list]:
+        """
+        Transcribe an audio file and wait for the result.
+
+        Args:
+        audio (str | np.ndarray): The path to the audio file or the audio samples at 16 kHz.
+        progressCallback (Callable[[float], None] | None, optional): Called with the timestamp in seconds transcribed so far. Defaults to None.
+        **options: Keyword arguments used to construct DecodingOptions.
+
+        Returns:
+        dict[str, str | list]: A dictionary with the keys "text", "segments" and "language".
+        """
+        return self.submit(audio, progressCallback, **options).result()
+
+    def nextBatch(self) -> list[tuple]:
+        if self.pending:
+            first = self.pending.popleft()
+        else:
+            try:
+                first = self.queue.get(timeout=0.5)
+            except Empty:
+                return []
+
+        if first is None:
+            return []
+
+        batch = [first]
+        key = first[0].optionsKey
+
+        skipped = deque()
+        while self.pending and len(batch) < self.maxBatchSize:
+            item = self.pending.popleft()
+            (batch if item[0].optionsKey == key else skipped).append(item)
+        self.pending.extendleft(reversed(skipped))
+
+        deadline = time.monotonic() + self.maxWait
+        while len(batch) < self.maxBatchSize:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except Empty:
+                break
+
+            if item is None:
+                break
+
+            if item[0].optionsKey == key:
+                batch.append(item)
+            else:
+                self.pending.append(item)
+
+        return batch
+
+    def run(self) -> None:
+        while self.running or self.pending or not self.queue.empty():
+            batch = self.nextBatch()
+            if not batch:
+                continue
+
+            try:
+                self.decodeBatch(batch)
+            except Exception as e:
+                for request, *_ in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+
+    def decodeBatch(self, batch:list[tuple]) -> None:
+        """
+        Decode a batch of windows in one forward pass and hand the segments back to their requests.
+
+        Args:
+        batch (list[tuple]): Tuples of (request, window index, seek, window size, mel spectrogram) sharing the same options.
+
+        Returns:
+        None
+        """
+        options = dict(batch[0][0].options)
+        fp16 = options.pop("fp16", True) and self.model.device != torch.device("cpu")
+        dtype = torch.float16 if fp16 else torch.float32
+
+        mel = torch.stack([item[-1] for item in batch]).to(self.model.device).to(dtype)
+        with self.modelLock:
+            results = self.model.decode(mel, DecodingOptions(**options, fp16=fp16))
+
+        for (request, index, seek, size, _), result in zip(batch, results):
+            if request.future.done():
+                continue
+            # the request already failed in an earlier batch
+
+            segments = self.windowSegments(result, seek, size, options.get("task", "transcribe"))
+            if request.complete(index, segments, result.language):
+                request.future.set_result(request.output())
+
+    def windowSegments(self, result, seek:int, size:int, task:str) -> list[dict]:
+        """
+        Split the tokens decoded from one window into timestamped segments.
+
+        Args:
+        result (DecodingResult): The decoding result of the window.
+        seek (int): The offset of the window in mel frames.
+        size (int): The number of mel frames of audio content in the window.
+        task (str): The decoding task, "transcribe" or "translate".
+
+        Returns:
+        list[dict]: Segments with the same keys as the segments returned by the model's transcribe method.
+        """
+        if self.noSpeechThreshold is not None and result.no_speech_prob > self.noSpeechThreshold:
+            if self.logprobThreshold is None or result.avg_logprob <= self.logprobThreshold:
+                return []
+            # silent window
+
+        tokenizer = get_tokenizer(self.model.is_multilingual, num_languages=self.model.num_languages, language=result.language, task=task)
+        timeOffset = seek * HOP_LENGTH / SAMPLE_RATE
+        timePrecision = N_FRAMES / self.model.dims.n_audio_ctx * HOP_LENGTH / SAMPLE_RATE
+        duration = size * HOP_LENGTH / SAMPLE_RATE
+
+        tokens = result.tokens
+        isTimestamp = [token >= tokenizer.timestamp_begin for token in tokens]
+
+        slices = [i+1 for i in range(len(tokens)-1) if isTimestamp[i] and isTimestamp[i+1]]
+        if not slices or slices[-1] != len(tokens):
+            slices.append(len(tokens))
+        # the window is never re-decoded, so an unfinished last segment is kept as well
+
+        segments = []
+        lastSlice = 0
+
+        for currentSlice in slices:
+            slicedTokens = tokens[lastSlice:currentSlice]
+            lastSlice = currentSlice
+
+            textTokens = [token for token in slicedTokens if token < tokenizer.eot]
+            text = tokenizer.decode(textTokens)
+            if not text.strip():
+                continue
+
+            start, end = timeOffset, timeOffset + duration
+            if slicedTokens[0] >= tokenizer.timestamp_begin:
+                start = timeOffset + (slicedTokens[0] - tokenizer.timestamp_begin) * timePrecision
+            if slicedTokens[-1] >= tokenizer.timestamp_begin:
+                end = timeOffset + (slicedTokens[-1] - tokenizer.timestamp_begin) * timePrecision
+
+            segments.append({
+                "seek": seek,
+                "start": start,
+                "end": min(end, timeOffset + duration),
+                "text": text,
+                "tokens": slicedTokens,
+                "temperature": result.temperature,
+                "avg_logprob": result.avg_logprob,
+                "compression_ratio": result.compression_ratio,
+                "no_speech_prob": result.no_speech_prob,
+            })
+
+        return segments
+
+    def close(self) -> None:
+        """
+        Stop the worker thread after the queued windows have been decoded.
+
+        Returns:
+        None
+        """
+        self.running = False
+        self.queue.put(None)
+        self.worker.join()
@@ -0,0 +1,121 @@
+from threading import Lock
+from typing import Callable
+from whisper.model import Whisper
+from src.modules.registry import ModelRegistry
+import whisper
+import torch
+
+def shareModel(model:torch.nn.Module) -> int:
+    """
+    Move the parameters and buffers of a model on the CPU into shared memory, so processes forked afterwards map the same pages instead of copying them.
+
+    Args:
+    model (torch.nn.Module): The model, which is put in evaluation mode and never trained again.
+
+    Returns:
+    int: The number of bytes moved into shared memory.
+
+    Sparse tensors, such as the alignment heads of Whisper, and the packed weights of dynamically quantized layers have no plain storage and are left where they are. Forked processes still share them until they are written to.
+    """
+    model.eval()
+    shared = 0
+
+    for tensor in list(model.parameters()) + list(model.buffers()):
+        if tensor.device.type != "cpu" or tensor.is_sparse:
+            continue
+
+        tensor.requires_grad_(False)
+        tensor.share_memory_()
+        shared += tensor.numel() * tensor.element_size()
+
+    return shared
+
+def memoryReport(pid:int|str="self") -> dict[str, int]:
+    """
+    Describe the memory of a process.
+
+    Args:
+    pid (int | str, optional): The id of the process. Defaults to the current process.
+
+    Returns:
+    dict[str, int]: The resident ("rss"), proportional ("pss"), "shared" and "private" memory in bytes. The proportional size splits every shared page between the processes mapping it, so the sum over the workers is the memory they really take. Without /proc, only the peak resident size of the current process is known, as "maxRss".
+    """
+    fields = {"Rss": "rss", "Pss": "pss", "Shared_Clean": "shared", "Shared_Dirty": "shared", "Private_Clean": "private", "Private_Dirty": "private"}
+
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            lines = f.readlines()
+    except OSError:
+        import resource
+        return {"maxRss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}
+
+    report = {"rss": 0, "pss": 0, "shared": 0, "private": 0}
+    for line in lines:
+        name, _, value = line.partition(":")
+        if name in fields:
+            report[fields[name]] += int(value.split()[0]) * 1024
+        # the values are in kB
+
+    return report
+
+
+class SharedModels:
+    def __init__(self, loader:Callable[..., Whisper]=whisper.load_model) -> None:
+        """
+        Initialize a set of models loaded once into shared memory by a parent process, for the worker processes it forks.
+
+        Args:
+        loader (Callable[..., Whisper], optional): The function loading a model from its name and device. Defaults to whisper.load_model.
+
+        Returns:
+        None
+
+        'load' is meant as the loader of a ModelRegistry. Before 'preload' it loads models as the loader would. After it, the preloaded models are returned without loading them again, so the registry of every forked worker builds its transcriber around the same weights. A model that wasn't preloaded is loaded privately by the worker asking for it.
+        """
+        self.loader = loader
+        self.models = {}
+        self.sharedBytes = {}
+        self.lock = Lock()
+
+    def preload(self, names:list[str], device:str|None=None) -> dict[str, int]:
+        """
+        Load models and move their weights into shared memory. Call it in the parent process before forking.
+
+        Args:
+        names (list[str]): The names of the models.
+        device (str | None, optional): The device the models are loaded on. Only the weights of models on the CPU are shared. Defaults to None.
+
+        Returns:
+        dict[str, int]: The number of bytes shared for every model.
+
+        Nothing is run through the models, so the parent never starts the torch thread pools, which would deadlock the forked workers.
+        """
+        for name in names:
+            with self.lock:
+                if name in self.models:
+                    continue
+
+            model = self.loader(name, device)
+            shared = shareModel(model)
+
+            with self.lock:
+                self.models[name] = model
+                self.sharedBytes[name] = shared
+
+        return {name: self.sharedBytes[name] for name in names}
+
+    def load(self, name:str, device:str|None=None) -> Whisper:
+        with self.lock:
+            model = self.models.get(name)
+
+        return model if model is not None else self.loader(name, device)
+
+    def stats(self) -> dict[str, dict]:
+        """
+        Describe the preloaded models.
+
+        Returns:
+        dict[str, dict]: For every preloaded model, the bytes of its weights in shared memory and its total size in bytes.
+        """
+        with self.lock:
+            return {name: {"sharedBytes": self.sharedBytes[name], "sizeBytes": ModelRegistry.modelSize(model)} for name, model in self.models.items()}
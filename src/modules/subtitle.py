@@ -3,10 +3,96 @@ from numpy import ndarray
 from PIL.ImageFont import FreeTypeFont, truetype
 from PIL import Image, ImageDraw
 from numpy import array
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable
+from src.modules.metrics import metrics
+import numpy as np
 import re
 
+class LayoutCache:
+    def __init__(self, maxSize:int=16384) -> None:
+        """
+        Initialize a bounded cache of text measurements, shared by all subtitles.
+
+        Parameters:
+        maxSize (int, optional): The maximum number of entries. The least recently used entries are dropped first. Default is 16384.
+
+        Returns:
+        None
+
+        Entries are keyed by (font, size, thickness, text), so the same line or word is measured once whatever subtitle or configuration asks for it, and the cost of layout stays nearly constant across thousands of cues.
+        """
+        self.maxSize = maxSize
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key:tuple, compute:Callable[[], object]):
+        """
+        Get an entry, computing and storing it on a miss.
+
+        Parameters:
+        key (tuple): The (font, size, thickness, text) key.
+        compute (Callable[[], object]): Computes the entry. It is called outside the lock, so two threads may both compute a missing entry.
+
+        Returns:
+        object: The entry.
+        """
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+
+        value = compute()
+
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxSize:
+                self.entries.popitem(last=False)
+
+        return value
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict[str, int | float]:
+        """
+        Describe the use of the cache.
+
+        Returns:
+        dict[str, int | float]: The number of "hits" and "misses", the "hitRate" out of all lookups, and the current "size" and "maxSize" in entries.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hitRate": self.hits / lookups if lookups else 0.0, "size": len(self.entries), "maxSize": self.maxSize}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+layoutCache = LayoutCache()
+
+layoutCacheLookups = metrics.counter("subtitle_layout_cache_lookups_total", "Text measurements asked of the subtitle layout cache, by result.", ("result",))
+layoutCacheEntries = metrics.gauge("subtitle_layout_cache_entries", "Text measurements held by the subtitle layout cache.")
+
+def collectLayoutCache() -> None:
+    stats = layoutCache.stats()
+    layoutCacheLookups.setTotal(stats["hits"], result="hit")
+    layoutCacheLookups.setTotal(stats["misses"], result="miss")
+    layoutCacheEntries.set(stats["size"])
+
+metrics.addCollector(collectLayoutCache)
+
 class SubtitleConfig:
-    def __init__(self, fontFamily:int|str, scale:float, thickness:float, lineSpacing:int|float, color:tuple[int, int, int], relativePos:tuple[int, int]=(0.5, 0.5), screenShape:tuple[int, int]=(640, 290), newLineInterval:int=8, backBox:bool=True, backBoxColor:tuple[int, int, int]=(60, 170, 250), padding:int=2) -> None:
+    def __init__(self, fontFamily:int|str, scale:float, thickness:float, lineSpacing:int|float, color:tuple[int, int, int], relativePos:tuple[int, int]=(0.5, 0.5), screenShape:tuple[int, int]=(640, 290), newLineInterval:int=8, backBox:bool=True, backBoxColor:tuple[int, int, int]=(60, 170, 250), padding:int=2, maxLineWidth:float|None=None, karaoke:bool=False, highlightColor:tuple[int, int, int]=(255, 255, 0)) -> None:
         """
         Initialize a SubtitleConfig object with the given parameters.
 
@@ -22,6 +108,9 @@ class SubtitleConfig:
         backBox (bool, optional): Whether to draw a background box around the subtitle. Default is False.
         backBoxColor (tuple[int, int, int], optional): The RGB color code for the background box. Default is (60, 170, 250).
         padding (int, optional): The padding around the subtitle text. Default is 2.
+        maxLineWidth (float | None, optional): The maximum width of a line as a fraction of the screen width. Lines are then broken by their width in pixels instead of by newLineInterval. Default is None.
+        karaoke (bool, optional): Whether segments with word timestamps are drawn with the word being spoken highlighted. Default is False.
+        highlightColor (tuple[int, int, int], optional): The color code of the highlighted word, given like color. Default is (255, 255, 0).
 
         Returns:
         None
@@ -51,6 +140,16 @@ class SubtitleConfig:
 
         self.padding = padding
 
+        self.maxLineWidth = maxLineWidth
+        self.karaoke = karaoke
+        self.highlightColor = highlightColor
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name != "version":
+            object.__setattr__(self, "version", getattr(self, "version", 0) + 1)
+        # every change bumps the version, so subtitles know their pre-rendered sprites are stale
+
     @property
     def position(self):
         x, y = self.screenShape[0]*self.relativePos[0], self.screenShape[1]*self.relativePos[1]
@@ -78,19 +177,95 @@ class Subtitle:
         self.config = config
         self.start = start
         self.end = end
+
+        self.sprite = None
+        self.spriteKey = None
     
-    def getTextDimensions(self, text:str):
+    def measureText(self, text:str):
+        """
+        Measure a text without the layout cache.
+
+        Parameters:
+        - text (str): The text.
+
+        Returns:
+        - A tuple (w, h) representing the width and height of the text.
+        """
         if isinstance(self.config.fontFamily, FreeTypeFont):
-            image = Image.new('RGB', (1, 1))
-            draw = ImageDraw.Draw(image)
+            if "\n" in text:
+                draw = ImageDraw.Draw(Image.new('RGB', (1, 1)))
+                bbox = draw.textbbox((0, 0), text, font=self.config.fontFamily)
+                # only the drawing context lays out several lines
+            else:
+                bbox = self.config.fontFamily.getbbox(text)
 
-            # Get bounding box of the text
-            bbox = draw.textbbox((0, 0), text, font=self.config.fontFamily)
-            w = bbox[2] - bbox[0]
-            h = bbox[3] - bbox[1]
-            return w, h
-        
-        return getTextSize(text, self.config.fontFamily, self.config.scale, self.config.thickness)[0]
+            return bbox[2] - bbox[0], bbox[3] - bbox[1]
+
+        return tuple(getTextSize(text, self.config.fontFamily, self.config.scale, self.config.thickness)[0])
+
+    def layoutKey(self, text:str):
+        font = self.config.fontFamily
+        if isinstance(font, FreeTypeFont):
+            return font.path, font.size, self.config.thickness, text
+        return font, self.config.scale, self.config.thickness, text
+
+    def textLayout(self, text:str):
+        """
+        Get the dimensions of a text and the offset from its center to its anchor, from the shared layout cache.
+
+        Parameters:
+        - text (str): The text.
+
+        Returns:
+        - A tuple ((w, h), (u, v)) of the width and height of the text and half of them, rounded.
+        """
+        def compute():
+            w, h = self.measureText(text)
+            return (w, h), (round(w/2), round(h/2))
+
+        return layoutCache.get(self.layoutKey(text), compute)
+
+    def getTextDimensions(self, text:str):
+        return self.textLayout(text)[0]
+
+    def spaceWidth(self):
+        return max(0, self.getTextDimensions("a a")[0] - self.getTextDimensions("aa")[0])
+        # measured between two glyphs, where the words of a line put it
+
+    def wrapWords(self, words:list[str]):
+        """
+        Break words into lines.
+
+        Parameters:
+        - words (list[str]): The words, without spaces.
+
+        Returns:
+        - list[list[int]]: The indices of the words of every line.
+
+        Without a maxLineWidth in the configuration, every line holds newLineInterval words. Otherwise lines are filled greedily with the words that fit in maxLineWidth times the screen width, measured in pixels with getTextDimensions, and a word wider than that gets a line of its own.
+        """
+        if self.config.maxLineWidth is None:
+            interval = max(1, self.config.newLineInterval)
+            return [list(range(i, min(i + interval, len(words)))) for i in range(0, len(words), interval)]
+
+        maxWidth = self.config.maxLineWidth * self.config.screenShape[0]
+        space = self.spaceWidth()
+
+        lines, width = [], 0
+        for i, word in enumerate(words):
+            w = self.getTextDimensions(word)[0]
+            if lines and width + space + w <= maxWidth:
+                lines[-1].append(i)
+                width += space + w
+            else:
+                lines.append([i])
+                width = w
+
+        return lines
+
+    def wrapText(self, text:str):
+        words = text.split()
+        return "\n".join(" ".join(words[i] for i in line) for line in self.wrapWords(words))
     
     def calculateAnchor(self, x:int, y:int, text:str):
         """
@@ -104,10 +279,9 @@ class Subtitle:
         - A tuple (x, y) representing the anchor point for rendering the subtitle on the screen.
         - A tuple (w, h) representing the width and height of text.
 
-        The anchor point is calculated based on the position of the subtitle on the screen and the size of the text. The position is determined by the configuration parameters specified in the SubtitleConfig instance passed to the Subtitle object. The size of the text is obtained using the getTextSize function from the OpenCV library. The anchor point is then calculated as the center of the text, which is halfway between the left and right edges, and halfway between the top and bottom edges.
+        The anchor point is calculated based on the position of the subtitle on the screen and the size of the text. The position is determined by the configuration parameters specified in the SubtitleConfig instance passed to the Subtitle object. The size of the text and the offsets are taken from the shared layout cache, so a line is only measured the first time any subtitle shows it. The anchor point is then calculated as the center of the text, which is halfway between the left and right edges, and halfway between the top and bottom edges.
         """
-        w, h = self.getTextDimensions(text)
-        u, v = round(w/2), round(h/2)
+        (w, h), (u, v) = self.textLayout(text)
 
         x, y = x-u, y-v
         return (x, y), (w, h)
@@ -124,19 +298,82 @@ class Subtitle:
 
         return frame
     
-    def renderText(self, text:str, x:int, y:int, frame:ndarray):
+    def renderText(self, text:str, x:int, y:int, frame:ndarray, color:tuple[int, int, int]|None=None):
+        color = self.config.color if color is None else color
+
         if isinstance(self.config.fontFamily, FreeTypeFont):
             image = Image.fromarray(frame)
             draw = ImageDraw.Draw(image)
-            draw.text((x, y), text, font=self.config.fontFamily, fill=self.config.color)
+            draw.text((x, y), text, font=self.config.fontFamily, fill=color)
             return array(image)
         
-        return putText(frame, text, (x, y), self.config.fontFamily, self.config.scale, self.config.color, self.config.thickness)
+        return putText(frame, text, (x, y), self.config.fontFamily, self.config.scale, color, self.config.thickness)
+
+    def prerender(self, frameShape:tuple[int, ...], render=None):
+        """
+        Render the subtitle once into a sprite that can be blended into frames of the given shape.
+
+        Parameters:
+        - frameShape (tuple[int, ...]): The shape of the frames the subtitle will be drawn on.
+        - render (Callable[[ndarray], ndarray], optional): The function drawing on a frame. Default is drawDirect.
+
+        Returns:
+        - tuple | None: A tuple ((y1, y2, x1, x2), ink, keep) where (y1, y2, x1, x2) is the bounding box of the subtitle in the frame, ink is the color the subtitle adds to each pixel and keep is how much of the original pixel remains, out of 255. None if the subtitle draws nothing.
+
+        The subtitle is drawn with drawDirect on a black and on a white frame. On the black frame every pixel is exactly the color the subtitle adds, and the difference between the two frames is how much of the background shows through, so anti-aliased text blends like it would if drawn directly.
+        """
+        render = self.drawDirect if render is None else render
+        black = render(np.zeros(frameShape, np.uint8))
+        white = render(np.full(frameShape, 255, np.uint8))
+
+        keep = white - black
+        covered = (keep != 255) | (black != 0)
+        if covered.ndim == 3:
+            covered = covered.any(axis=2)
+
+        rows = np.flatnonzero(covered.any(axis=1))
+        cols = np.flatnonzero(covered.any(axis=0))
+        if len(rows) == 0:
+            return None
 
-    def draw(self, frame:ndarray):
+        y1, y2, x1, x2 = rows[0], rows[-1]+1, cols[0], cols[-1]+1
+        return (y1, y2, x1, x2), black[y1:y2, x1:x2].copy(), keep[y1:y2, x1:x2].astype(np.uint16)
+
+    @staticmethod
+    def blend(frame:ndarray, sprite:tuple|None):
+        if sprite is None:
+            return frame
+
+        (y1, y2, x1, x2), ink, keep = sprite
+        region = frame[y1:y2, x1:x2]
+        frame[y1:y2, x1:x2] = ink + (region * keep + 127) // 255
+
+        return frame
+
+    def draw(self, frame:ndarray, i:int|None=None):
         """
         Draw the subtitle on the given frame.
 
+        Parameters:
+        - frame (ndarray): The input frame on which the subtitle will be rendered.
+        - i (int | None, optional): The index of the frame. Plain subtitles look the same on every frame and ignore it.
+
+        Returns:
+        - ndarray: The frame with the subtitle rendered on it.
+
+        The subtitle is pre-rendered into a sprite the first time it is drawn, and again only when its text, its configuration or the frame shape change. Each frame then only blends the sprite into the region it covers.
+        """
+        key = (self.config.version, self.text, frame.shape)
+        if self.spriteKey != key:
+            self.sprite = self.prerender(frame.shape)
+            self.spriteKey = key
+
+        return self.blend(frame, self.sprite)
+
+    def drawDirect(self, frame:ndarray):
+        """
+        Draw the subtitle on the given frame without the sprite cache.
+
         Parameters:
         - frame (ndarray): The input frame on which the subtitle will be rendered.
 
@@ -177,4 +414,191 @@ class Subtitle:
         return self.text
     
     def __repr__(self) -> str:
-        return f"Subtitle(text={self.text}, start={self.start}, end={self.end})"
\ No newline at end of file
+        return f"Subtitle(text={self.text}, start={self.start}, end={self.end})"
+
+class KaraokeSubtitle(Subtitle):
+    def __init__(self, words:list[tuple[str, int, int]], config:SubtitleConfig, start:int, end:int) -> None:
+        """
+        Initialize a subtitle which highlights the word being spoken.
+
+        Parameters:
+        words (list[tuple[str, int, int]]): The text, start frame and end frame of every word, in order.
+        config (SubtitleConfig): An instance of the SubtitleConfig class containing the configuration parameters for rendering the subtitle. The highlighted word is drawn in its highlightColor.
+        start (int): The start time of the subtitle (frame number).
+        end (int): The end time of the subtitle (frame number).
+
+        Returns:
+        None
+
+        The words are laid out once per configuration, each at its own position, so a word can be drawn again on its own exactly over itself. The whole cue is blended from the sprite of Subtitle.draw, and only a small sprite of the highlighted word is blended on top of it on each frame.
+        """
+        self.words = [word.strip() for word, _, _ in words]
+        super().__init__(" ".join(self.words), config, start, end)
+
+        self.wordStarts = np.array([wordStart for _, wordStart, _ in words], dtype=np.int64)
+        self.lastEnd = max((wordEnd for _, _, wordEnd in words), default=end)
+
+        self.lines = None
+        self.linesKey = None
+        self.wordSprites = {}
+        self.wordSpritesKey = None
+
+    def layout(self):
+        """
+        Place every word of the subtitle on the screen.
+
+        Returns:
+        - list[tuple]: For every line, a tuple ((anchorX, anchorY), (w, h), placements), where placements holds (index, x) for every word of the line. Lines are centered on the position of the configuration like in drawDirect.
+        """
+        if self.linesKey == self.config.version:
+            return self.lines
+
+        x, y = self.config.position
+        space = self.spaceWidth()
+
+        lines = []
+        for line in self.wrapWords(self.words):
+            widths = [self.getTextDimensions(self.words[index])[0] for index in line]
+            w = sum(widths) + space * (len(line) - 1)
+            h = max(self.getTextDimensions(self.words[index])[1] for index in line)
+
+            anchorX, anchorY = x - round(w/2), y - round(h/2)
+
+            placements, wordX = [], anchorX
+            for index, width in zip(line, widths):
+                placements.append((index, wordX))
+                wordX += width + space
+
+            lines.append(((anchorX, anchorY), (w, h), placements))
+            y += self.config.lineSpacing
+
+        self.lines, self.linesKey = lines, self.config.version
+        return lines
+
+    def currentWord(self, i:int):
+        """
+        Find the word being spoken on a frame.
+
+        Parameters:
+        - i (int): The index of the frame.
+
+        Returns:
+        - int | None: The index of the word, which stays highlighted until the next word starts, or None before the first word and after the last one ends.
+        """
+        index = int(np.searchsorted(self.wordStarts, i, side="right")) - 1
+        if index < 0 or (index == len(self.words) - 1 and i >= self.lastEnd):
+            return None
+        return index
+
+    def drawDirect(self, frame:ndarray):
+        lines = self.layout()
+
+        for (anchorX, anchorY), (w, h), _ in lines:
+            frame = self.darwBackBox(frame, anchorX, anchorY, w, h)
+
+        for (_, anchorY), _, placements in lines:
+            for index, x in placements:
+                frame = self.renderText(self.words[index], x, anchorY, frame)
+
+        return frame
+
+    def drawWord(self, frame:ndarray, index:int):
+        for (_, anchorY), _, placements in self.layout():
+            for wordIndex, x in placements:
+                if wordIndex == index:
+                    return self.renderText(self.words[index], x, anchorY, frame, self.config.highlightColor)
+        return frame
+
+    def draw(self, frame:ndarray, i:int|None=None):
+        """
+        Draw the subtitle on the given frame, with the word spoken on it highlighted.
+
+        Parameters:
+        - frame (ndarray): The input frame on which the subtitle will be rendered.
+        - i (int | None, optional): The index of the frame. If None, no word is highlighted.
+
+        Returns:
+        - ndarray: The frame with the subtitle rendered on it.
+        """
+        frame = super().draw(frame)
+
+        index = None if i is None else self.currentWord(i)
+        if index is None:
+            return frame
+
+        key = (self.config.version, frame.shape)
+        if self.wordSpritesKey != key:
+            self.wordSprites, self.wordSpritesKey = {}, key
+
+        sprite = self.wordSprites.get(index, False)
+        if sprite is False:
+            sprite = self.wordSprites[index] = self.prerender(frame.shape, lambda blank: self.drawWord(blank, index))
+
+        return self.blend(frame, sprite)
+
+    def __repr__(self) -> str:
+        return f"KaraokeSubtitle(text={self.text}, start={self.start}, end={self.end}, words={len(self.words)})"
+
+
+class SubtitleIndex:
+    def __init__(self, subtitles:list[Subtitle]) -> None:
+        """
+        Initialize a SubtitleIndex answering which subtitles are shown on a frame.
+
+        Parameters:
+        subtitles (list[Subtitle]): The subtitles to index. They may overlap, leave gaps and come in any order.
+
+        Returns:
+        None
+
+        The start and end frames of all subtitles split the timeline into elementary intervals on which the set of shown subtitles doesn't change. The boundaries of the intervals are kept in a sorted array and the subtitles shown on each interval in a list, so a lookup is a binary search with numpy.searchsorted.
+        """
+        self.subtitles = list(subtitles)
+
+        starts, ends = {}, {}
+        for index, subtitle in enumerate(self.subtitles):
+            if subtitle.start < subtitle.end:
+                starts.setdefault(subtitle.start, []).append(index)
+                ends.setdefault(subtitle.end, []).append(index)
+
+        self.boundaries = np.array(sorted(starts.keys() | ends.keys()), dtype=np.int64)
+        self.active = []
+
+        shown = set()
+        for boundary in self.boundaries:
+            shown.difference_update(ends.get(boundary, ()))
+            shown.update(starts.get(boundary, ()))
+            self.active.append(tuple(self.subtitles[index] for index in sorted(shown)))
+            # overlapping subtitles are drawn in their original order
+
+    def at(self, frame:int) -> tuple[Subtitle, ...]:
+        """
+        Find the subtitles shown on a frame.
+
+        Parameters:
+        frame (int): The index of the frame.
+
+        Returns:
+        tuple[Subtitle, ...]: The subtitles shown on the frame, in their original order.
+        """
+        interval = int(np.searchsorted(self.boundaries, frame, side="right")) - 1
+        if interval < 0:
+            return ()
+        return self.active[interval]
+
+    def range(self, start:int, end:int) -> list[tuple[Subtitle, ...]]:
+        """
+        Find the subtitles shown on every frame of a range.
+
+        Parameters:
+        start (int): The first frame of the range.
+        end (int): The end of the range, exclusive.
+
+        Returns:
+        list[tuple[Subtitle, ...]]: The subtitles shown on each frame of the range.
+        """
+        intervals = np.searchsorted(self.boundaries, np.arange(start, end), side="right") - 1
+        return [self.active[interval] if interval >= 0 else () for interval in intervals]
+
+    def __len__(self) -> int:
+        return len(self.subtitles)
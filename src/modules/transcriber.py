@@ -1,61 +1,379 @@
 from whisper.model import Whisper
-from src.modules.utils import encodeSegment
+from typing import Callable, BinaryIO, Generator
+import numpy as np
+from src.modules.utils import encodeCues, encodeSegments, shiftSegments, trimChunkSegments
+from src.modules.cache import TranscriptionCache
+from src.modules.scheduler import BatchScheduler
+from src.modules.audio import loadAudio, splitOnSilence, SAMPLE_RATE
+from src.modules.vad import VoiceActivityDetector, concatenateRegions, remapSegments, remapTimes
+from src.modules.metrics import stageSeconds, realTimeFactor, audioSeconds
+from threading import Lock
+import time
 
 class Transcriber:
-    def __init__(self, model: Whisper) -> None:
+    def __init__(self, model: Whisper, modelName: str | None = None, cache: TranscriptionCache | None = None, scheduler: BatchScheduler | None = None, vad: VoiceActivityDetector | None = None, **decodeOptions) -> None:
         """
         Initialize the Transcriber class with a Whisper model.
 
         Args:
         model (Whisper): A Whisper model instance for transcribing audio files.
+        modelName (str | None, optional): The name of the model, used to tell cached results of different models apart. Defaults to the model dimensions.
+        cache (TranscriptionCache | None, optional): A cache placed in front of the model. If None, every call runs the model. Defaults to None.
+        scheduler (BatchScheduler | None, optional): A scheduler batching the requests of several threads into shared forward passes of the model, opting into its lower quality decoding, see BatchScheduler. If None, each call runs the model's transcribe method directly. Defaults to None.
+        vad (VoiceActivityDetector | None, optional): A voice activity detector run before the model, so only the speech is transcribed. If None, the whole audio is transcribed. Defaults to None.
+        **decodeOptions: Default keyword arguments passed to the model's transcribe method.
 
         Returns:
         None
         """
         self.model = model
+        self.modelName = modelName if modelName is not None else str(model.dims)
+        self.cache = cache
+        self.scheduler = scheduler
+        self.vad = vad
+        self.decodeOptions = decodeOptions
 
-    def getRawOutput(self, audioFile: str) -> dict[str, str | list]:
+        self.modelLock = scheduler.modelLock if scheduler is not None else Lock()
+        # one call at a time runs the model, whether through the scheduler or its transcribe method
+
+    def getRawOutput(self, audioFile: str | np.ndarray | BinaryIO, progressCallback: Callable[[float], None] | None = None, vad: VoiceActivityDetector | None = None, **decodeOptions) -> dict[str, str | list | bool]:
         """
         Retrieve the raw output from the Whisper model's transcription of the given audio file.
 
         Args:
-        audioFile (str): The path to the audio file to be transcribed.
+        audioFile (str | np.ndarray | BinaryIO): The path to the audio file to be transcribed, its samples at 16 kHz, or a file-like object with its encoded contents, which is decoded in memory.
+        progressCallback (Callable[[float], None] | None, optional): Called with the end timestamp in seconds of the last segment transcribed so far. Defaults to None.
+        vad (VoiceActivityDetector | None, optional): A voice activity detector overriding the one given at initialization. Defaults to None.
+        **decodeOptions: Keyword arguments passed to the model's transcribe method, overriding the defaults given at initialization.
+
+        Returns:
+        dict[str, str | list | bool]: A dictionary containing the raw output from the Whisper model's transcription. The dictionary keys are "text" and "segments", where "text" contains the full transcription and "segments" contains the transcription broken down into segments, and "cached", which is True when the result was served from the cache without running the model. With a voice activity detector, "vad" describes the seconds of speech transcribed and of audio skipped.
+        """
+        options = {**self.decodeOptions, **decodeOptions}
+        vad = vad or self.vad
+        audioFile = self.rereadableAudio(audioFile)
+
+        if self.cache is None:
+            return {**self.runDetected(audioFile, options, vad, progressCallback), "cached": False}
+
+        with stageSeconds.time(stage="cache_lookup"):
+            key = self.cacheKey(audioFile, options, vad)
+            output = self.cache.get(key)
+
+        if output is not None:
+            return {**output, "cached": True}
+
+        output = self.runDetected(audioFile, options, vad, progressCallback)
+        self.cache.put(key, output)
+
+        return {**output, "cached": False}
+
+    def runDetected(self, audioFile: str | np.ndarray | BinaryIO, options: dict, vad: VoiceActivityDetector | None, progressCallback: Callable[[float], None] | None = None) -> dict[str, str | list | dict]:
+        """
+        Transcribe only the speech found by a voice activity detector, with the timestamps on the timeline of the full audio.
+
+        Args:
+        audioFile (str | np.ndarray | BinaryIO): The audio to be transcribed.
+        options (dict): The decode options.
+        vad (VoiceActivityDetector | None): The voice activity detector. If None, the whole audio is transcribed by 'runModel'.
+        progressCallback (Callable[[float], None] | None, optional): Called with the timestamp in seconds of the full audio transcribed so far. Defaults to None.
+
+        Returns:
+        dict[str, str | list | dict]: The raw output of the transcription, with "vad" holding the seconds of "speech" transcribed, the seconds "skipped", and the number of speech "regions".
+
+        The speech regions are joined and transcribed in one pass, so the model keeps the context between them.
+        """
+        if vad is None:
+            return self.runModel(audioFile, options, progressCallback)
+
+        with stageSeconds.time(stage="decode"):
+            audio = loadAudio(audioFile)
+
+        with stageSeconds.time(stage="vad"):
+            regions = vad.detect(audio)
+        speech = sum(end - start for start, end in regions)
+
+        report = {
+            "speech": speech / SAMPLE_RATE,
+            "skipped": (len(audio) - speech) / SAMPLE_RATE,
+            "regions": len(regions),
+        }
+
+        if not regions:
+            return {"text": "", "segments": [], "language": None, "vad": report}
+
+        callback = None
+        if progressCallback is not None:
+            callback = lambda timestamp: progressCallback(float(remapTimes([timestamp], regions, SAMPLE_RATE, "left")[0]))
+
+        output = self.runModel(concatenateRegions(audio, regions), options, callback)
+        remapSegments(output["segments"], regions)
+
+        return {**output, "vad": report}
+
+    @staticmethod
+    def rereadableAudio(audioFile: str | np.ndarray | BinaryIO) -> str | np.ndarray | BinaryIO:
+        """
+        Decode file-like objects that can only be read once, so they can be hashed and then transcribed.
+
+        Args:
+        audioFile (str | np.ndarray | BinaryIO): The audio.
+
+        Returns:
+        str | np.ndarray | BinaryIO: The audio, decoded to an array if it was a file-like object that can't seek.
+        """
+        if not isinstance(audioFile, (str, np.ndarray)) and not (hasattr(audioFile, "seekable") and audioFile.seekable()):
+            return loadAudio(audioFile)
+        return audioFile
+
+    def usesScheduler(self, options: dict) -> bool:
+        return self.scheduler is not None and BatchScheduler.supports(options)
+
+    def cacheKey(self, audioFile: str | np.ndarray | BinaryIO, options: dict, vad: VoiceActivityDetector | None = None, chunkLength: float | None = None) -> str:
+        """
+        Build the cache key of a transcription.
+
+        Args:
+        audioFile (str | np.ndarray | BinaryIO): The audio to be transcribed.
+        options (dict): The decode options.
+        vad (VoiceActivityDetector | None, optional): The voice activity detector run before the model. Defaults to None.
+        chunkLength (float | None, optional): The length of the chunks of a transcription made chunk by chunk by 'iterRawSegments', None for a transcription of the whole audio at once. Defaults to None.
+
+        Returns:
+        str: The key, which also tells apart the outputs of the batching scheduler from the outputs of the model's transcribe method, and chunked transcriptions from whole ones.
+        """
+        keyOptions = {**options, "decoder": "batched" if self.usesScheduler(options) else "transcribe"}
+        if vad is not None:
+            keyOptions["vad"] = vad.options()
+        if chunkLength is not None:
+            keyOptions["chunkLength"] = chunkLength
+            # chunks prompted with the text before them don't decode the same as the whole audio
+
+        return TranscriptionCache.makeKey(TranscriptionCache.hashAudio(audioFile), self.modelName, keyOptions)
+
+    def runModel(self, audioFile: str | np.ndarray | BinaryIO, options: dict, progressCallback: Callable[[float], None] | None = None) -> dict[str, str | list]:
+        """
+        Transcribe the given audio file, through the batching scheduler when there is one and it supports the options.
+
+        Args:
+        audioFile (str | np.ndarray | BinaryIO): The path to the audio file to be transcribed, its samples at 16 kHz, or a file-like object with its encoded contents.
+        options (dict): The decode options.
+        progressCallback (Callable[[float], None] | None, optional): Called with the timestamp in seconds transcribed so far. Without the scheduler it is only called once the whole file is transcribed. Defaults to None.
+
+        Returns:
+        dict[str, str | list]: The raw output of the transcription.
+
+        The time spent decoding and running the model is recorded in the stage metrics, and divided by the length of the audio in the real time factor histogram. The model's transcribe method runs under the lock the scheduler holds while decoding, so requests the scheduler can't handle never run the model at the same time as its batches.
+        """
+        start = time.perf_counter()
+
+        if not isinstance(audioFile, np.ndarray):
+            with stageSeconds.time(stage="decode"):
+                audioFile = loadAudio(audioFile)
+            # decoding here rather than in the model, so decoding and inference are timed apart
+
+        with stageSeconds.time(stage="inference"):
+            if self.usesScheduler(options):
+                output = self.scheduler.transcribe(audioFile, progressCallback, **options)
+            else:
+                with self.modelLock:
+                    output = self.model.transcribe(audioFile, **options)
+
+                if progressCallback is not None and output["segments"]:
+                    progressCallback(output["segments"][-1]["end"])
+
+        self.recordRealTime(len(audioFile) / SAMPLE_RATE, time.perf_counter() - start)
+        return output
+
+    def recordRealTime(self, duration: float, seconds: float) -> None:
+        """
+        Record how long transcribing audio took against its length.
+
+        Args:
+        duration (float): The length of the audio in seconds.
+        seconds (float): The time spent decoding and transcribing it, in seconds.
+
+        Returns:
+        None
+        """
+        if duration <= 0:
+            return
+
+        realTimeFactor.observe(seconds / duration, model=self.modelName)
+        audioSeconds.inc(duration, model=self.modelName)
+
+    def iterRawSegments(self, audioFile: str | np.ndarray | BinaryIO, chunkLength: float = 30.0, vad: VoiceActivityDetector | None = None, **decodeOptions) -> Generator[dict, None, dict]:
+        """
+        Transcribe the given audio file chunk by chunk, yielding the segments of every chunk as soon as it is decoded.
+
+        Args:
+        audioFile (str | np.ndarray | BinaryIO): The path to the audio file to be transcribed, its samples at 16 kHz, or a file-like object with its encoded contents.
+        chunkLength (float, optional): The maximum length in seconds of the chunks, which are cut at silences where possible. Shorter chunks give the first segments sooner. Defaults to 30.
+        vad (VoiceActivityDetector | None, optional): A voice activity detector overriding the one given at initialization. Only the speech it finds is transcribed. Defaults to None.
+        **decodeOptions: Keyword arguments passed to the model's transcribe method, overriding the defaults given at initialization.
+
+        Yields:
+        dict: The segments of the transcription, in order, with their timestamps on the timeline of the full audio.
+
+        Returns:
+        dict: The whole output once the generator is exhausted, as returned by 'getRawOutput'.
+
+        The text of each chunk is passed to the model as the prompt of the next one. Once every chunk is transcribed the result is stored in the cache under a key of its own, see cacheKey, and a cached result is yielded directly.
+        """
+        options = {**self.decodeOptions, **decodeOptions}
+        vad = vad or self.vad
+        audioFile = self.rereadableAudio(audioFile)
+
+        key = None
+        if self.cache is not None:
+            key = self.cacheKey(audioFile, options, vad, chunkLength)
+            output = self.cache.get(key)
+
+            if output is not None:
+                yield from output["segments"]
+                return {**output, "cached": True}
+
+        audio = loadAudio(audioFile)
+        report = None
+
+        if vad is not None:
+            regions = vad.detect(audio)
+            speech = sum(end - start for start, end in regions)
+            report = {"speech": speech / SAMPLE_RATE, "skipped": (len(audio) - speech) / SAMPLE_RATE, "regions": len(regions)}
+            audio = concatenateRegions(audio, regions)
+            # the chunks are cut from the speech only, and their segments moved back to the full timeline
+
+        chunks = splitOnSilence(audio, SAMPLE_RATE, chunkLength, chunkLength / 2) if len(audio) else []
+
+        segments = []
+        language = None
+        prompt = options.get("initial_prompt")
+        lastEnd = 0.0
+
+        for i, (start, end) in enumerate(chunks):
+            output = self.runModel(audio[start:end], {**options, "initial_prompt": prompt} if prompt else options)
+            language = language or output["language"]
+
+            chunkSegments = trimChunkSegments(shiftSegments(output["segments"], start / SAMPLE_RATE), chunks, i, lastEnd)
+            if chunkSegments:
+                lastEnd = chunkSegments[-1]["end"]
+
+            if vad is not None:
+                remapSegments(chunkSegments, regions)
+
+            for segment in chunkSegments:
+                segment["id"] = len(segments)
+                segments.append(segment)
+                yield segment
+
+            prompt = "".join(segment["text"] for segment in chunkSegments) or prompt
+
+        output = {"text": "".join(segment["text"] for segment in segments), "segments": segments, "language": language}
+        if report is not None:
+            output["vad"] = report
+
+        if key is not None:
+            self.cache.put(key, output)
+
+        return {**output, "cached": False}
+
+    def getChunkedOutput(self, audioFile: str | np.ndarray | BinaryIO, progressCallback: Callable[[float], None] | None = None, chunkLength: float = 30.0, vad: VoiceActivityDetector | None = None, **decodeOptions) -> dict[str, str | list | bool]:
+        """
+        Transcribe the given audio file chunk by chunk with 'iterRawSegments', reporting the progress as every chunk is decoded.
+
+        Args:
+        audioFile (str | np.ndarray | BinaryIO): The path to the audio file to be transcribed, its samples at 16 kHz, or a file-like object with its encoded contents.
+        progressCallback (Callable[[float], None] | None, optional): Called with the end timestamp in seconds of the last segment transcribed so far. Defaults to None.
+        chunkLength (float, optional): The maximum length in seconds of the chunks decoded at a time. Defaults to 30.
+        vad (VoiceActivityDetector | None, optional): A voice activity detector overriding the one given at initialization. Defaults to None.
+        **decodeOptions: Keyword arguments passed to the model's transcribe method.
 
         Returns:
-        dict[str, str | list]: A dictionary containing the raw output from the Whisper model's transcription. The dictionary keys are "text" and "segments", where "text" contains the full transcription and "segments" contains the transcription broken down into segments.
+        dict[str, str | list | bool]: The raw output, with the keys of 'getRawOutput'.
+
+        Unlike 'getRawOutput', whose progress only moves once the model is done unless a batching scheduler runs it, the progress here moves after every chunk.
         """
-        return self.model.transcribe(audioFile)
+        segments = self.iterRawSegments(audioFile, chunkLength, vad, **decodeOptions)
+
+        while True:
+            try:
+                segment = next(segments)
+            except StopIteration as stop:
+                return stop.value
 
-    def getText(self, audioFile: str) -> str:
+            if progressCallback is not None:
+                progressCallback(segment["end"])
+
+    def iterTranscription(self, audioFile: str | np.ndarray | BinaryIO, chunkLength: float = 30.0, newLineInterval: int = 8, vad: VoiceActivityDetector | None = None, format: str = "srt", **decodeOptions) -> Generator[str, None, None]:
+        """
+        Transcribe the given audio file chunk by chunk, yielding cues as soon as their segments are decoded.
+
+        Args:
+        audioFile (str | np.ndarray | BinaryIO): The path to the audio file to be transcribed, its samples at 16 kHz, or a file-like object with its encoded contents.
+        chunkLength (float, optional): The maximum length in seconds of the chunks decoded at a time. Defaults to 30.
+        newLineInterval (int, optional): The maximum number of words per line of a cue. Defaults to 8.
+        vad (VoiceActivityDetector | None, optional): A voice activity detector overriding the one given at initialization. Defaults to None.
+        format (str, optional): The format of the cues, one of "srt", "vtt", "tsv" and "jsonl". Defaults to "srt".
+        **decodeOptions: Keyword arguments passed to the model's transcribe method.
+
+        Yields:
+        str: The header of the format if it has one, then the cues of the transcription, SRT cues numbered from 1.
+
+        Raises:
+        ValueError: If the format is unknown, before anything is transcribed.
+        """
+        header = encodeCues([], format)
+        if header:
+            yield header
+
+        for i, segment in enumerate(self.iterRawSegments(audioFile, chunkLength, vad, **decodeOptions)):
+            yield encodeCues([segment], format, newLineInterval, start=i+1, header=False)
+
+    def getText(self, audioFile: str | np.ndarray | BinaryIO) -> str:
         """
         Retrieve the full transcription text from the Whisper model's transcription of the given audio file.
 
         Args:
-        audioFile (str): The path to the audio file to be transcribed.
+        audioFile (str | np.ndarray | BinaryIO): The path to the audio file to be transcribed, its samples at 16 kHz, or a file-like object with its encoded contents.
 
         Returns:
         str: The full transcription text obtained from the Whisper model's transcription of the audio file.
         """
         return self.getRawOutput(audioFile)["text"]
 
-    def getTranscription(self, audioFile:str) -> str:
+    def getWords(self, audioFile: str | np.ndarray | BinaryIO, vad: VoiceActivityDetector | None = None, **decodeOptions) -> list[dict[str, str | float]]:
+        """
+        Retrieve the words of the transcription of the given audio file with their own timestamps.
+
+        Args:
+        audioFile (str | np.ndarray | BinaryIO): The path to the audio file to be transcribed, its samples at 16 kHz, or a file-like object with its encoded contents.
+        vad (VoiceActivityDetector | None, optional): A voice activity detector overriding the one given at initialization. Defaults to None.
+        **decodeOptions: Keyword arguments passed to the model's transcribe method.
+
+        Returns:
+        list[dict[str, str | float]]: The words of all segments in order, each with its "word", "start" and "end" in seconds and "probability", as found by the Whisper model's word_timestamps option.
+
+        Word timestamps need the cross attention of the model, so these requests are never batched by the scheduler.
+        """
+        output = self.getRawOutput(audioFile, vad=vad, **{**decodeOptions, "word_timestamps": True})
+        return [word for segment in output["segments"] for word in segment.get("words", [])]
+
+    def getTranscription(self, audioFile: str | np.ndarray | BinaryIO) -> str:
         """
         Retrieve the full transcription text from the Whisper model's transcription of the given audio file,
         broken down into segments and then combined into a single transcription.
 
         Args:
-        audioFile (str): The path to the audio file to be transcribed.
+        audioFile (str | np.ndarray | BinaryIO): The path to the audio file to be transcribed, its samples at 16 kHz, or a file-like object with its encoded contents.
 
         Returns:
         str: The full transcription text obtained from the Whisper model's transcription of the audio file,
         broken down into segments and then combined into a single transcription.
         """
         segments = self.getRawOutput(audioFile)["segments"]
-        transcription = ""
 
-        for i, segment in enumerate(segments):
-            transcription += encodeSegment(segment, i+1)
-        return transcription        
+        with stageSeconds.time(stage="encode"):
+            return encodeSegments(segments)
 
     def saveTranscription(self, transcription: str, outputFile: str) -> None:
         """
@@ -73,18 +391,26 @@ class Transcriber:
         with open(outputFile, 'w') as f:
             f.write(transcription)
 
-    def saveTranscriptionFromAudio(self, audioFile: str, outputFile: str) -> None:
+    def saveTranscriptionFromAudio(self, audioFile: str | np.ndarray | BinaryIO, outputFile: str, stream: bool = False) -> None:
         """
         Save the transcription text to a file, obtained from transcribing the given audio file.
 
         Args:
-        audioFile (str): The path to the audio file to be transcribed.
+        audioFile (str | np.ndarray | BinaryIO): The path to the audio file to be transcribed, its samples at 16 kHz, or a file-like object with its encoded contents.
         outputFile (str): The path to the file where the transcription will be saved.
+        stream (bool, optional): If True, the cues are transcribed chunk by chunk with 'iterTranscription' and written to the file as soon as they are decoded. Defaults to False.
 
         Returns:
         None
 
         This function saves the transcription text to a file specified by the 'outputFile' parameter. The transcription text is written to the file in its entirety. The transcription text is obtained by transcribing the audio file using the 'getTranscription' method, which breaks down the transcription into segments and then combines them into a single transcription.
         """
+        if stream:
+            with open(outputFile, 'w') as f:
+                for cue in self.iterTranscription(audioFile):
+                    f.write(cue)
+                    f.flush()
+            return
+
         transcription = self.getTranscription(audioFile)
         self.saveTranscription(transcription, outputFile)
\ No newline at end of file
@@ -1,3 +1,14 @@
+import numpy as np
+import json
+
+formats = ("srt", "vtt", "tsv", "jsonl")
+formatMimetypes = {
+    "srt": "application/x-subrip",
+    "vtt": "text/vtt",
+    "tsv": "text/tab-separated-values",
+    "jsonl": "application/x-ndjson",
+}
+
 def SRTTime(_seconds:str):
     """
     Converts a given number of seconds into a formatted SRT time string.
@@ -11,14 +22,16 @@ def SRTTime(_seconds:str):
     Example:
     >>> SRTTime("3660")
     '01:01:06,000'
+    >>> SRTTime("59.9996")
+    '00:01:00,000'
     """
-    _seconds = float(_seconds)
-    hours, remainder = divmod(_seconds, 3600)
-    minutes, remainder = divmod(remainder, 60)
-    seconds, ms = divmod(remainder, 1)
-    ms = round(ms*1e3)
-    
-    return f"{int(hours):02}:{int(minutes):02}:{int(seconds):02},{ms}"
+    totalMs = max(0, round(float(_seconds) * 1000))
+    # rounding the whole timestamp first, so 999.6 ms carries into the seconds instead of printing 1000
+    hours, remainder = divmod(totalMs, 3600000)
+    minutes, remainder = divmod(remainder, 60000)
+    seconds, ms = divmod(remainder, 1000)
+
+    return f"{hours:02}:{minutes:02}:{seconds:02},{ms:03}"
 
 def newLineText(text:str, newLineInterval:int=8):
     """
@@ -33,16 +46,60 @@ def newLineText(text:str, newLineInterval:int=8):
     """
     splitText = text.split()
     if len(splitText) > newLineInterval:
-        for wordIndex, word in enumerate(splitText):
-            if wordIndex % (newLineInterval-1) == 0 and wordIndex > 0:
-                splitText[wordIndex] = word + '\n'
-            else:
-                splitText[wordIndex] = word + " "
+        step = newLineInterval - 1
+        lines = [splitText[:step+1]] + [splitText[i:i+step] for i in range(step+1, len(splitText), step)]
+        # a break after every word whose index is a multiple of newLineInterval-1, the first line has one word more
 
-        text = "".join(splitText)
+        text = "\n".join(" ".join(line) for line in lines)
+        text += "\n" if (len(splitText) - 1) % step == 0 else " "
+        # the last word keeps the separator it always had
 
     return text
 
+def encodeTimestamps(seconds:np.ndarray, separator:str=",") -> list[str]:
+    """
+    Converts many numbers of seconds into formatted HH:MM:SS,mmm time strings at once.
+
+    Args:
+    seconds (np.ndarray): The timestamps in seconds.
+    separator (str, optional): The character between the seconds and the milliseconds, "," for SRT and "." for WebVTT. Defaults to ",".
+
+    Returns:
+    list[str]: The zero padded time strings, each with at least two digits of hours, and as many as its own hours need.
+
+    The digits are computed with integer arithmetic on the whole array and written into one byte buffer, so no string is formatted per timestamp.
+    """
+    totalMs = np.rint(np.maximum(np.asarray(seconds, dtype=np.float64), 0) * 1000).astype(np.int64)
+    if len(totalMs) == 0:
+        return []
+
+    hours, remainder = np.divmod(totalMs, 3600000)
+    minutes, remainder = np.divmod(remainder, 60000)
+    secs, ms = np.divmod(remainder, 1000)
+
+    hourDigits = max(2, len(str(int(hours.max()))))
+    width = hourDigits + 10
+
+    buffer = np.empty((len(totalMs), width), dtype=np.uint8)
+    for i in range(hourDigits):
+        buffer[:, i] = hours // 10 ** (hourDigits - 1 - i) % 10 + 48
+    # 48 is the code of "0"
+
+    columns = hourDigits
+    for value, digits, after in ((minutes, 2, ":"), (secs, 2, ":"), (ms, 3, separator)):
+        buffer[:, columns] = ord(after)
+        for i in range(digits):
+            buffer[:, columns + 1 + i] = value // 10 ** (digits - 1 - i) % 10 + 48
+        columns += digits + 1
+
+    strings = buffer.view(f"S{width}").ravel().astype(str).tolist()
+    if hourDigits == 2:
+        return strings
+
+    padding = hourDigits - np.maximum(2, np.char.str_len(hours.astype(str)))
+    return [string[skip:] for string, skip in zip(strings, padding.tolist())]
+    # only the timestamps past 99 hours are widened, as SRTTime does, so a cue looks the same whatever else is in the batch
+
 def encodeSegment(segment:dict[str, int|list|float|str], i:int, newLineInterval:int=8):
     """
     Encodes a given segment of text into an SRT format string.
@@ -68,4 +125,110 @@ def encodeSegment(segment:dict[str, int|list|float|str], i:int, newLineInterval:
 
     text = newLineText(text, newLineInterval)
 
-    return f"{i}\n{start} --> {end}\n{text}\n\n"
\ No newline at end of file
+    return f"{i}\n{start} --> {end}\n{text}\n\n"
+
+def encodeSegments(segments:list[dict[str, int|list|float|str]], newLineInterval:int=8):
+    """
+    Encodes a list of segments into a single SRT format string.
+
+    Args:
+    segments (list[dict]): A list of segments as accepted by encodeSegment.
+    newLineInterval (int, optional): The maximum number of words per line in the encoded segments. Defaults to 8.
+
+    Returns:
+    str: A string containing every segment in SRT format, numbered from 1.
+    """
+    return encodeCues(segments, "srt", newLineInterval)
+
+def encodeCues(segments:list[dict[str, int|list|float|str]], format:str="srt", newLineInterval:int=8, start:int=1, header:bool=True):
+    """
+    Encodes a list of segments into a subtitle or data format in one pass.
+
+    Args:
+    segments (list[dict]): A list of segments as accepted by encodeSegment.
+    format (str, optional): One of "srt", "vtt" (WebVTT), "tsv" (start and end in milliseconds, and the text) and "jsonl" (one JSON object per segment). Defaults to "srt".
+    newLineInterval (int, optional): The maximum number of words per line of SRT and WebVTT cues. Defaults to 8.
+    start (int, optional): The number of the first SRT cue. Defaults to 1.
+    header (bool, optional): Whether the WebVTT or TSV header is written, which is left out when encoding the continuation of a stream. Defaults to True.
+
+    Returns:
+    str: The encoded segments.
+
+    Raises:
+    ValueError: If the format is not one of 'formats'.
+
+    The timestamps of all segments are converted at once with encodeTimestamps, and the cues are joined into the output in a single step.
+    """
+    if format not in formats:
+        raise ValueError(f"Unknown format {format}, expected one of {formats}")
+
+    starts = np.fromiter((segment["start"] for segment in segments), dtype=np.float64, count=len(segments))
+    ends = np.fromiter((segment["end"] for segment in segments), dtype=np.float64, count=len(segments))
+
+    if format == "srt":
+        cues = zip(range(start, start + len(segments)), encodeTimestamps(starts), encodeTimestamps(ends), (newLineText(segment["text"], newLineInterval) for segment in segments))
+        return "".join([f"{i}\n{begin} --> {end}\n{text}\n\n" for i, begin, end, text in cues])
+
+    if format == "vtt":
+        cues = zip(encodeTimestamps(starts, "."), encodeTimestamps(ends, "."), (newLineText(segment["text"], newLineInterval).strip() for segment in segments))
+        return ("WEBVTT\n\n" if header else "") + "".join([f"{begin} --> {end}\n{text}\n\n" for begin, end, text in cues])
+
+    if format == "tsv":
+        startMs = np.rint(starts * 1000).astype(np.int64).tolist()
+        endMs = np.rint(ends * 1000).astype(np.int64).tolist()
+        texts = (" ".join(segment["text"].split()) for segment in segments)
+        # tabs and newlines would break the columns
+        return ("start\tend\ttext\n" if header else "") + "".join([f"{begin}\t{end}\t{text}\n" for begin, end, text in zip(startMs, endMs, texts)])
+
+    return "".join([json.dumps({"id": segment.get("id", i), "start": segment["start"], "end": segment["end"], "text": segment["text"]}) + "\n" for i, segment in enumerate(segments)])
+
+def shiftSegments(segments:list[dict[str, int|list|float|str]], offset:float):
+    """
+    Moves segments transcribed from a part of an audio file onto the timeline of the full file.
+
+    Args:
+    segments (list[dict]): The segments, as returned by the Whisper model. They are modified in place.
+    offset (float): The start of the part in the full audio file, in seconds.
+
+    Returns:
+    list[dict]: The shifted segments.
+    """
+    for segment in segments:
+        segment["start"] += offset
+        segment["end"] += offset
+        if "seek" in segment:
+            segment["seek"] += round(offset * 100)
+            # seek is counted in 10 ms mel frames
+
+        for word in segment.get("words", []):
+            word["start"] += offset
+            word["end"] += offset
+
+    return segments
+
+def trimChunkSegments(segments:list[dict[str, int|list|float|str]], chunks:list[tuple[int, int]], i:int, lastEnd:float, sampleRate:int=16000):
+    """
+    Drops the segments of a chunk that are also covered by its neighbouring chunks.
+
+    Args:
+    segments (list[dict]): The segments of chunk i, on the timeline of the full audio.
+    chunks (list[tuple[int, int]]): The (start, end) sample indices of all chunks.
+    i (int): The index of the chunk.
+    lastEnd (float): The end in seconds of the last segment kept from the earlier chunks.
+    sampleRate (int, optional): The sample rate the chunk indices refer to. Defaults to 16000.
+
+    Returns:
+    list[dict]: The segments to keep.
+
+    Chunks that don't overlap are left untouched. Where two chunks overlap, the earlier chunk keeps its segments starting before the middle of the overlap, and the later chunk only keeps segments starting after the last kept segment ended, so the words spoken in the overlap are not repeated.
+    """
+    start, end = chunks[i]
+
+    if i > 0 and start < chunks[i-1][1]:
+        segments = [segment for segment in segments if segment["start"] >= lastEnd]
+
+    if i+1 < len(chunks) and chunks[i+1][0] < end:
+        boundary = (chunks[i+1][0] + end) / 2 / sampleRate
+        segments = [segment for segment in segments if segment["start"] < boundary]
+
+    return segments
@@ -0,0 +1,231 @@
+from src.modules.audio import SAMPLE_RATE
+import numpy as np
+
+class VoiceActivityDetector:
+    def __init__(self, threshold:float=-35.0, noiseFloor:float=-60.0, minBandRatio:float=0.3, maxFlatness:float=0.5, minModulation:float=3.0, modulationWindow:float=1.0, minSpeech:float=0.25, minSilence:float=0.5, padding:float=0.2, frameDuration:float=0.03, sampleRate:int=SAMPLE_RATE) -> None:
+        """
+        Initialize an energy, spectrum and modulation based voice activity detector, which finds the parts of the audio worth transcribing.
+
+        Args:
+        threshold (float, optional): Frames quieter than this many dB below the loudest frame are silent. Defaults to -35.0.
+        noiseFloor (float, optional): Frames quieter than this many dB below full scale are silent, however quiet the whole audio is. Defaults to -60.0.
+        minBandRatio (float, optional): The minimum share of the energy of a frame between 300 and 3400 Hz, the band of the human voice, for it to be speech. Defaults to 0.3.
+        maxFlatness (float, optional): The maximum spectral flatness of a speech frame, between 0 for a pure tone and 1 for white noise. Defaults to 0.5.
+        minModulation (float, optional): The minimum standard deviation in dB of the energy of the frames around a speech frame. Syllables make the loudness of speech rise and fall a few times a second, while held notes and tones stay level. Defaults to 3.0.
+        modulationWindow (float, optional): The length in seconds of the frames around a frame the modulation is measured over. Defaults to 1.0.
+        minSpeech (float, optional): Speech shorter than this many seconds is dropped. Defaults to 0.25.
+        minSilence (float, optional): Pauses shorter than this many seconds are kept as part of the speech around them. Defaults to 0.5.
+        padding (float, optional): The number of seconds kept before and after every speech region. Defaults to 0.2.
+        frameDuration (float, optional): The length in seconds of the analysis frames. Defaults to 0.03.
+        sampleRate (int, optional): The sample rate of the audio. Defaults to 16000.
+
+        Returns:
+        None
+        """
+        self.threshold = threshold
+        self.noiseFloor = noiseFloor
+        self.minBandRatio = minBandRatio
+        self.maxFlatness = maxFlatness
+        self.minModulation = minModulation
+        self.modulationWindow = modulationWindow
+        self.minSpeech = minSpeech
+        self.minSilence = minSilence
+        self.padding = padding
+        self.frameDuration = frameDuration
+        self.sampleRate = sampleRate
+
+    def options(self) -> dict[str, float | int]:
+        return dict(vars(self))
+
+    def frameFeatures(self, audio:np.ndarray, blockFrames:int=4096) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Compute the energy, the voice band ratio and the spectral flatness of consecutive frames of the audio.
+
+        Args:
+        audio (np.ndarray): The audio samples.
+        blockFrames (int, optional): The number of frames transformed at a time, which bounds the memory used on long audio. Defaults to 4096.
+
+        Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: The energy in dB relative to full scale, the voice band ratio and the flatness of every frame. Frame i starts at sample i*frameLength.
+        """
+        frameLength = max(2, round(self.frameDuration * self.sampleRate))
+        frameCount = max(1, -(-len(audio) // frameLength))
+        audio = np.pad(audio.astype(np.float32, copy=False), (0, frameCount * frameLength - len(audio)))
+        frames = audio.reshape(frameCount, frameLength)
+
+        window = np.hanning(frameLength).astype(np.float32)
+        frequencies = np.fft.rfftfreq(frameLength, 1 / self.sampleRate)
+        band = (frequencies >= 300) & (frequencies <= 3400)
+
+        energy = np.empty(frameCount)
+        bandRatio = np.empty(frameCount)
+        flatness = np.empty(frameCount)
+
+        for start in range(0, frameCount, blockFrames):
+            block = frames[start:start+blockFrames]
+            power = np.square(np.abs(np.fft.rfft(block * window, axis=1))) + 1e-12
+            total = power.sum(axis=1)
+
+            energy[start:start+len(block)] = 10 * np.log10(np.maximum(np.mean(np.square(block, dtype=np.float64), axis=1), 1e-20))
+            bandRatio[start:start+len(block)] = power[:, band].sum(axis=1) / total
+            flatness[start:start+len(block)] = np.exp(np.mean(np.log(power), axis=1)) / (total / power.shape[1])
+            # the geometric over the arithmetic mean of the power spectrum
+
+        return energy, bandRatio, flatness
+
+    def modulation(self, energy:np.ndarray, gate:float) -> np.ndarray:
+        """
+        Measure how much the loudness changes around every frame.
+
+        Args:
+        energy (np.ndarray): The energy of every frame in dB, as returned by frameFeatures.
+        gate (float): The energy below which frames are silent. Quieter frames count as 10 dB below it, so the depth of a silence doesn't matter.
+
+        Returns:
+        np.ndarray: The standard deviation in dB of the energy of the frames within modulationWindow around every frame.
+        """
+        energy = np.maximum(energy, gate - 10)
+        half = max(1, round(self.modulationWindow / self.frameDuration / 2))
+
+        sums = np.concatenate(([0.0], np.cumsum(energy)))
+        squares = np.concatenate(([0.0], np.cumsum(np.square(energy))))
+        starts = np.maximum(np.arange(len(energy)) - half, 0)
+        ends = np.minimum(np.arange(len(energy)) + half + 1, len(energy))
+        counts = ends - starts
+        # running sums give the mean and variance of every window in one pass
+
+        mean = (sums[ends] - sums[starts]) / counts
+        variance = (squares[ends] - squares[starts]) / counts - np.square(mean)
+        return np.sqrt(np.maximum(variance, 0))
+
+    def detect(self, audio:np.ndarray) -> list[tuple[int, int]]:
+        """
+        Find the regions of the audio that contain speech.
+
+        Args:
+        audio (np.ndarray): The audio samples.
+
+        Returns:
+        list[tuple[int, int]]: The (start, end) sample indices of every speech region, in order and without overlaps.
+        """
+        if len(audio) == 0:
+            return []
+
+        frameLength = max(2, round(self.frameDuration * self.sampleRate))
+        energy, bandRatio, flatness = self.frameFeatures(audio)
+
+        gate = max(energy.max() + self.threshold, self.noiseFloor)
+        speech = (energy >= gate) & (bandRatio >= self.minBandRatio) & (flatness <= self.maxFlatness) & (self.modulation(energy, gate) >= self.minModulation)
+        starts, ends = runs(speech)
+
+        if len(starts) == 0:
+            return []
+
+        gaps = starts[1:] - ends[:-1]
+        keep = np.concatenate(([True], gaps >= self.minSilence / self.frameDuration))
+        # a region starting after a short pause is merged into the one before it
+        starts = starts[keep]
+        ends = np.maximum.reduceat(ends, np.flatnonzero(keep))
+
+        long = ends - starts >= self.minSpeech / self.frameDuration
+        starts, ends = starts[long], ends[long]
+
+        paddingSamples = round(self.padding * self.sampleRate)
+        starts = np.maximum(starts * frameLength - paddingSamples, 0)
+        ends = np.minimum(ends * frameLength + paddingSamples, len(audio))
+
+        regions = []
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            if regions and start <= regions[-1][1]:
+                regions[-1] = (regions[-1][0], max(end, regions[-1][1]))
+                # the padding made two regions overlap
+            else:
+                regions.append((start, end))
+
+        return regions
+
+    def __str__(self) -> str:
+        return f"VoiceActivityDetector({', '.join(f'{key}={value}' for key, value in self.options().items())})"
+
+
+def runs(mask:np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Find the runs of True values of a boolean array.
+
+    Args:
+    mask (np.ndarray): The boolean array.
+
+    Returns:
+    tuple[np.ndarray, np.ndarray]: The start and end indices of the runs, ends exclusive.
+    """
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+def concatenateRegions(audio:np.ndarray, regions:list[tuple[int, int]]) -> np.ndarray:
+    """
+    Join the regions of the audio into a single array.
+
+    Args:
+    audio (np.ndarray): The audio samples.
+    regions (list[tuple[int, int]]): The (start, end) sample indices of the regions.
+
+    Returns:
+    np.ndarray: The samples of the regions, one after the other.
+    """
+    if not regions:
+        return audio[:0]
+    return np.concatenate([audio[start:end] for start, end in regions])
+
+def remapTimes(times:np.ndarray, regions:list[tuple[int, int]], sampleRate:int=SAMPLE_RATE, side:str="right") -> np.ndarray:
+    """
+    Move timestamps on the timeline of the concatenated regions back onto the timeline of the full audio.
+
+    Args:
+    times (np.ndarray): The timestamps in seconds on the concatenated timeline.
+    regions (list[tuple[int, int]]): The (start, end) sample indices of the regions.
+    sampleRate (int, optional): The sample rate of the audio. Defaults to 16000.
+    side (str, optional): Where a timestamp exactly at the joint of two regions goes: "right" for the start of the next region, "left" for the end of the previous one. Defaults to "right".
+
+    Returns:
+    np.ndarray: The timestamps in seconds on the timeline of the full audio.
+    """
+    bounds = np.asarray(regions, dtype=np.float64).reshape(-1, 2) / sampleRate
+    lengths = bounds[:, 1] - bounds[:, 0]
+    offsets = np.concatenate(([0.0], np.cumsum(lengths)[:-1]))
+
+    times = np.asarray(times, dtype=np.float64)
+    index = np.clip(np.searchsorted(offsets, times, side=side) - 1, 0, len(offsets) - 1)
+
+    return np.minimum(bounds[index, 0] + times - offsets[index], bounds[index, 1])
+
+def remapSegments(segments:list[dict[str, int|list|float|str]], regions:list[tuple[int, int]], sampleRate:int=SAMPLE_RATE) -> list[dict]:
+    """
+    Move segments transcribed from the concatenated regions back onto the timeline of the full audio.
+
+    Args:
+    segments (list[dict]): The segments, as returned by the Whisper model. They are modified in place.
+    regions (list[tuple[int, int]]): The (start, end) sample indices of the regions.
+    sampleRate (int, optional): The sample rate of the audio. Defaults to 16000.
+
+    Returns:
+    list[dict]: The remapped segments.
+    """
+    if not segments or not regions:
+        return segments
+
+    words = [word for segment in segments for word in segment.get("words", [])]
+    items = segments + words
+
+    starts = remapTimes([item["start"] for item in items], regions, sampleRate, "right")
+    ends = remapTimes([item["end"] for item in items], regions, sampleRate, "left")
+    # an end at a joint belongs to the region before it, a start to the one after it
+
+    for item, start, end in zip(items, starts.tolist(), ends.tolist()):
+        item["start"], item["end"] = start, max(start, end)
+
+    for segment in segments:
+        if "seek" in segment:
+            segment["seek"] = round(remapTimes([segment["seek"] / 100], regions, sampleRate)[0] * 100)
+            # seek is counted in 10 ms mel frames
+
+    return segments
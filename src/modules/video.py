@@ -1,11 +1,80 @@
 from decord import VideoReader
-from typing import Generator
+from typing import Generator, Callable
 from src.modules.utils import newLineText
-from src.modules.subtitle import SubtitleConfig, Subtitle
+from src.modules.subtitle import SubtitleConfig, Subtitle, KaraokeSubtitle, SubtitleIndex
 from numpy import ndarray
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from threading import Thread, Event
+from queue import Queue, Empty, Full
+from src.modules.ffmpeg import FrameEncoder, FFmpegError, copySegment, concatSegments, checkVideo, probeVideoStream, matchingEncoder
+from src.modules.metrics import StageStats, videoStageFps, videoFrames
+from collections import Counter
+import multiprocessing
+import numpy as np
+import tempfile
+import shutil
+import os
 import cv2
 from tqdm import tqdm
 
+def renderPart(videoPath:str, subConfig:SubtitleConfig, subtitles:list[Subtitle], partPath:str, startFrame:int, endFrame:int, outputFourcc:int, decodeBatchSize:int, threads:int) -> int:
+    """
+    Render a range of frames of a video in a worker process, with its own VideoReader and writer.
+
+    Args:
+        videoPath (str): The path to the video file.
+        subConfig (SubtitleConfig): The configuration of the subtitles.
+        subtitles (list[Subtitle]): The subtitles of the whole video.
+        partPath (str): The path of the rendered part.
+        startFrame (int): The first frame of the range.
+        endFrame (int): The end of the range, exclusive.
+        outputFourcc (int): The four-character code of the part.
+        decodeBatchSize (int): The number of frames decoded at a time.
+        threads (int): The number of threads OpenCV may use in the worker.
+
+    Returns:
+        int: The number of frames rendered.
+    """
+    cv2.setNumThreads(threads)
+
+    transcriber = VideoTranscriber.fromFile(videoPath, subConfig, [])
+    transcriber.subList = subtitles
+    transcriber.subIndex = SubtitleIndex(subtitles)
+    # reusing the subtitles of the parent, so every part draws exactly what a sequential run would
+
+    transcriber.subtitle(partPath, outputFourcc=outputFourcc, decodeBatchSize=decodeBatchSize, renderWorkers=1, startFrame=startFrame, endFrame=endFrame)
+    return endFrame - startFrame
+
+
+def keyframeSpans(keyframes:list[int], mask:np.ndarray) -> list[tuple[int, int, bool]]:
+    """
+    Split frames at keyframes into spans with and without any marked frame.
+
+    Args:
+        keyframes (list[int]): The indices of the keyframes.
+        mask (np.ndarray): A boolean for every frame.
+
+    Returns:
+        list[tuple[int, int, bool]]: Tuples of (first frame, end frame, has a marked frame) covering all frames in order, with neighbouring spans of the same kind merged. Every span starts on a keyframe.
+    """
+    totalFrames = len(mask)
+    boundaries = sorted({0, *(int(i) for i in keyframes if 0 <= i < totalFrames)}) + [totalFrames]
+
+    marked = np.concatenate(([0], np.cumsum(mask)))
+    # marked[b] - marked[a] is the number of marked frames in [a, b)
+
+    spans = []
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        render = bool(marked[end] - marked[start])
+
+        if spans and spans[-1][2] == render:
+            spans[-1] = (spans[-1][0], end, render)
+        else:
+            spans.append((start, end, render))
+
+    return spans
+
+
 class VideoTranscriber:
     def __init__(self, video:VideoReader, subConfig:SubtitleConfig, rawSubtitles:dict[str, str|int|float|list]) -> None:
         """
@@ -27,6 +96,8 @@ class VideoTranscriber:
         self.subConfig.screenShape = (videoShape[1], videoShape[0])
 
         self.subList = list(self.interpretSRT(rawSubtitles))
+        self.subIndex = SubtitleIndex(self.subList)
+        self.videoPath = None
 
     @classmethod
     def fromFile(cls, fileName:str, subConfig:SubtitleConfig, rawSubtitles:dict[str, str|int|float|list]):
@@ -42,7 +113,9 @@ class VideoTranscriber:
             VideoTranscriber: A VideoTranscriber object initialized with the provided video file, subtitle configuration, and raw subtitle data.
         """
         video = VideoReader(fileName)
-        return cls(video, subConfig, rawSubtitles)
+        transcriber = cls(video, subConfig, rawSubtitles)
+        transcriber.videoPath = fileName
+        return transcriber
     
     @staticmethod
     def interpretSegment(segment:dict[str, str|float|list|int]):
@@ -82,44 +155,79 @@ class VideoTranscriber:
             Subtitle: A Subtitle object representing a subtitle segment with its start and end frames, text, and configuration.
 
         This method iterates through the provided list of subtitle segments, interprets each segment by converting its start and end times to frame indices, and generates a sequence of Subtitle objects. Each Subtitle object is yielded as it is generated, allowing the caller to process each subtitle segment individually.
+        In karaoke mode, segments transcribed with word timestamps become KaraokeSubtitle objects highlighting the word being spoken.
         """
         for segment in segments:
             start, end, text = VideoTranscriber.interpretSegment(segment)
             startFrame = self.timeStamp2Frame(start)
             endFrame = self.timeStamp2Frame(end)
-            text = newLineText(text, self.subConfig.newLineInterval)
-            yield Subtitle(text, self.subConfig, startFrame, endFrame)
 
-    def handleFrame(self, frame:ndarray, i:int, currentInterpreterIndex:int):
+            if self.subConfig.karaoke and segment.get("words"):
+                words = [(word["word"], self.timeStamp2Frame(word["start"]), self.timeStamp2Frame(word["end"])) for word in segment["words"]]
+                yield KaraokeSubtitle(words, self.subConfig, startFrame, endFrame)
+                continue
+
+            subtitle = Subtitle(text, self.subConfig, startFrame, endFrame)
+            subtitle.text = newLineText(text, self.subConfig.newLineInterval) if self.subConfig.maxLineWidth is None else subtitle.wrapText(text)
+            yield subtitle
+
+    def activeSubtitles(self, i:int):
+        """
+        Find the subtitles to draw on a frame.
+
+        Args:
+            i (int): The index of the frame.
+
+        Returns:
+            tuple[Subtitle, ...]: The subtitles shown on the frame, in their original order. Overlapping subtitles are all returned.
+
+        The lookup is a binary search in the SubtitleIndex built at initialization, so frames can be visited in any order.
+        """
+        return self.subIndex.at(i)
+
+    @staticmethod
+    def renderFrame(frame:ndarray, subtitles:tuple[Subtitle, ...], i:int|None=None):
+        """
+        Convert a decoded frame for the writer and draw subtitles on it.
+
+        Args:
+            frame (ndarray): The frame as decoded by decord.
+            subtitles (tuple[Subtitle, ...]): The subtitles to draw, in order.
+            i (int | None, optional): The index of the frame, which karaoke subtitles need to highlight the word being spoken. Defaults to None.
+
+        Returns:
+            ndarray: The frame to write.
+        """
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+        for subtitle in subtitles:
+            frame = subtitle.draw(frame, i)
+
+        return frame
+
+    def handleFrame(self, frame:ndarray, i:int):
         """
         Process a single frame of the video and apply subtitles if necessary.
 
         Args:
             frame (ndarray): The current frame of the video.
             i (int): The index of the current frame.
-            currentInterpreterIndex (int): The current index of the subtitle segment being interpreted.
 
         Returns:
-            Tuple[ndarray, int]: A tuple containing the processed frame and the updated currentInterpreterIndex.
+            ndarray: The processed frame.
 
-        This method takes a frame from the video, converts it to a NumPy array, and applies the appropriate subtitle segment if the current frame falls within the start and end times of the current subtitle segment. If the current frame is at the start of a new subtitle segment, the currentInterpreterIndex is updated to point to the new subtitle segment. The processed frame and the updated currentInterpreterIndex are returned as a tuple.
+        This method takes a frame from the video, converts it to a NumPy array, and draws every subtitle segment whose start and end frames contain the frame index. It doesn't depend on the previous frames, so any frame can be processed on its own.
         """
-        frame = frame.asnumpy()
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        if not isinstance(frame, ndarray):
+            frame = frame.asnumpy()
 
-        totalSubs = len(self.subList)
+        return self.renderFrame(frame, self.activeSubtitles(i), i)
 
-        if currentInterpreterIndex < totalSubs:
-            if i >= self.subList[currentInterpreterIndex].start and i < self.subList[currentInterpreterIndex].end:
-                frame = self.subList[currentInterpreterIndex].draw(frame)
+    def renderBatch(self, frames:ndarray, batchStart:int):
+        subtitles = self.subIndex.range(batchStart, batchStart + len(frames))
+        return [self.renderFrame(frame, frameSubtitles, batchStart + offset) for offset, (frame, frameSubtitles) in enumerate(zip(frames, subtitles))]
 
-            elif currentInterpreterIndex + 1 < totalSubs:
-                if i == self.subList[currentInterpreterIndex+1].start:
-                    currentInterpreterIndex += 1
-
-        return frame, currentInterpreterIndex
-    
-    def subtitle(self, outputPath:str, verbose=False, outputFourcc:int=cv2.VideoWriter_fourcc(*'mp4v')):
+    def subtitle(self, outputPath:str, verbose=False, outputFourcc:int=cv2.VideoWriter_fourcc(*'mp4v'), decodeBatchSize:int=16, renderWorkers:int=2, queueSize:int=4, startFrame:int=0, endFrame:int|None=None, statsCallback:Callable[[dict], None]|None=None):
         """
         Apply subtitles to the video and save the result to a new video file.
 
@@ -127,25 +235,360 @@ class VideoTranscriber:
             outputPath (str): The path to save the output video file.
             verbose (bool, optional): If True, display a progress bar during the subtitling process. Defaults to False.
             outputFourcc (int, optional): The four-character code for the output video format. Defaults to cv2.VideoWriter_fourcc(*'mp4v').
+            decodeBatchSize (int, optional): The number of frames decoded at a time. Defaults to 16.
+            renderWorkers (int, optional): The number of threads drawing subtitles. Defaults to 2.
+            queueSize (int, optional): The maximum number of batches waiting between two stages. Defaults to 4.
+            startFrame (int, optional): The first frame to render. Defaults to 0.
+            endFrame (int | None, optional): The end of the rendered range, exclusive. Defaults to the end of the video.
+            statsCallback (Callable[[dict], None] | None, optional): Called after every written batch and once at the end with the StageStats snapshot of the "decode", "render" and "encode" stages, whose "rate" is in frames per busy second, and with "fps", the frames written per wall second. Defaults to None.
 
         Returns:
             None. The function applies subtitles to the video and saves the result to a new video file.
+
+        Decoding, rendering and encoding run as a pipeline: a decoder thread reads batches of frames, a pool of render workers draws the subtitles, and a writer thread encodes the rendered batches in their original order. The queues between the stages are bounded, so a slow stage holds back the faster ones instead of buffering the whole video. With verbose, the progress bar shows how many batches wait for rendering and for writing, which tells which stage is the bottleneck. The frame rate of every stage is also published in the video_stage_fps metric.
         """
         writer = cv2.VideoWriter(outputPath, outputFourcc, self.fps, self.subConfig.screenShape)
+        stats = StageStats(("decode", "render", "encode"))
+        endFrame = len(self.video) if endFrame is None else min(endFrame, len(self.video))
+        totalFrames = max(0, endFrame - startFrame)
+
+        decoded = Queue(queueSize)
+        rendered = Queue(queueSize)
+        stop = Event()
+        errors = []
+
+        def put(queue:Queue, item):
+            while not stop.is_set():
+                try:
+                    queue.put(item, timeout=0.1)
+                    return
+                except Full:
+                    continue
+
+        def get(queue:Queue):
+            while not stop.is_set():
+                try:
+                    return queue.get(timeout=0.1)
+                except Empty:
+                    continue
+            return None
+
+        def decode():
+            try:
+                for batchStart in range(startFrame, endFrame, decodeBatchSize):
+                    indices = list(range(batchStart, min(batchStart + decodeBatchSize, endFrame)))
+                    with stats.time("decode", len(indices)):
+                        frames = self.video.get_batch(indices).asnumpy()
+                    put(decoded, (batchStart, frames))
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                put(decoded, None)
+
+        def write():
+            try:
+                while (future := get(rendered)) is not None:
+                    frames = future.result()
+                    with stats.time("encode", len(frames)):
+                        for frame in frames:
+                            writer.write(frame)
+
+                    if statsCallback is not None:
+                        statsCallback(report())
+
+                    if progress is not None:
+                        progress.update(len(frames))
+                        progress.set_postfix(toRender=decoded.qsize(), toWrite=rendered.qsize())
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+
+        def render(frames:ndarray, batchStart:int):
+            with stats.time("render", len(frames)):
+                return self.renderBatch(frames, batchStart)
+
+        def report():
+            snapshot = stats.snapshot()
+            snapshot["fps"] = snapshot["stages"]["encode"]["items"] / snapshot["seconds"] if snapshot["seconds"] else 0.0
+            return snapshot
+
+        progress = tqdm(total=totalFrames, unit=" frames") if verbose else None
+        decoder = Thread(target=decode, name="VideoDecoder", daemon=True)
+        encoder = Thread(target=write, name="VideoWriter", daemon=True)
+        decoder.start()
+        encoder.start()
+
+        try:
+            with ThreadPoolExecutor(renderWorkers, thread_name_prefix="VideoRenderer") as pool:
+                while (item := get(decoded)) is not None:
+                    batchStart, frames = item
+                    put(rendered, pool.submit(render, frames, batchStart))
+        finally:
+            put(rendered, None)
+            encoder.join()
+            stop.set()
+            decoder.join()
+            writer.release()
+            if progress is not None:
+                progress.close()
+
+        final = report()
+        for stage, stageStats in final["stages"].items():
+            videoStageFps.set(stageStats["rate"], stage=stage)
+            videoFrames.inc(stageStats["items"], stage=stage)
+
+        if errors:
+            raise errors[0]
+
+        if statsCallback is not None:
+            statsCallback(final)
+
+    def frameSubtitles(self):
+        """
+        Find the subtitles to draw on every frame of the video.
+
+        Returns:
+            list[tuple[Subtitle, ...]]: The subtitles drawn on each frame, empty for frames without a subtitle.
+        """
+        return self.subIndex.range(0, len(self.video))
+
+    def planSegments(self, subtitles:list[tuple[Subtitle, ...]]):
+        """
+        Split the video at its keyframes into spans that need subtitles drawn and spans that can be copied as they are.
+
+        Args:
+            subtitles (list[tuple[Subtitle, ...]]): The subtitles drawn on every frame, as returned by frameSubtitles.
+
+        Returns:
+            list[tuple[int, int, bool]]: Tuples of (first frame, end frame, needs rendering) covering the whole video in order. Every span starts on a keyframe.
+        """
+        drawn = np.array([len(frameSubtitles) > 0 for frameSubtitles in subtitles], dtype=bool)
+        return keyframeSpans(self.video.get_key_indices(), drawn)
+
+    def writeSpans(self, spans:list[tuple[int, int, bool]], subtitles:list[tuple[Subtitle, ...]], copySource:str, codec:str, partsDir:str, encoder:str, encoderArgs:tuple[str, ...]|None, decodeBatchSize:int, progress=None):
+        """
+        Write every span of the video to its own part, stream copying or rendering it.
+
+        Args:
+            spans (list[tuple[int, int, bool]]): Tuples of (first frame, end frame, needs rendering), every span starting on a keyframe of copySource.
+            subtitles (list[tuple[Subtitle, ...]]): The subtitles drawn on every frame.
+            copySource (str): The video the spans that don't need rendering are copied from.
+            codec (str): The codec of copySource.
+            partsDir (str): The directory of the parts.
+            encoder (str): The ffmpeg encoder of the rendered parts, which must produce the codec of copySource.
+            encoderArgs (tuple[str, ...] | None): Extra ffmpeg arguments for the encoder, None for its defaults.
+            decodeBatchSize (int): The number of frames decoded at a time.
+            progress (tqdm | None, optional): A progress bar updated with the frames of every rendered span. Defaults to None.
 
-        currentInterpreterIndex = 0
-        loop =  enumerate(self.video)
+        Returns:
+            list[str]: The paths of the parts, in order.
+        """
+        fps = self.video.get_avg_fps()
+        parts = []
+
+        for start, end, render in spans:
+            partPath = os.path.join(partsDir, f"{len(parts):06}.mkv")
+
+            if not render:
+                copySegment(copySource, partPath, start, end - start, fps, codec)
+            else:
+                writer = FrameEncoder(partPath, self.subConfig.screenShape, fps, encoder, encoderArgs)
+                try:
+                    for batchStart in range(start, end, decodeBatchSize):
+                        indices = list(range(batchStart, min(batchStart + decodeBatchSize, end)))
+                        for i, frame, frameSubtitles in zip(indices, self.video.get_batch(indices).asnumpy(), subtitles[batchStart:batchStart+len(indices)]):
+                            writer.write(self.renderFrame(frame, frameSubtitles, i))
+                finally:
+                    writer.release()
+
+                if progress is not None:
+                    progress.update(end - start)
+
+            parts.append(partPath)
+
+        return parts
+
+    def spliceSpans(self, spans:list[tuple[int, int, bool]], copySource:str, outputPath:str, encoderArgs:tuple[str, ...]|None, decodeBatchSize:int, workDir:str|None, verbose:bool):
+        """
+        Splice rendered and stream copied spans into a video, falling back to rendering the whole video when they can't be joined.
+
+        Args:
+            spans (list[tuple[int, int, bool]]): Tuples of (first frame, end frame, needs rendering), every span starting on a keyframe of copySource.
+            copySource (str): The video the spans that don't need rendering are copied from.
+            outputPath (str): The path of the video. It may be copySource, which is only replaced once the new video decodes.
+            encoderArgs (tuple[str, ...] | None): The quality arguments of the encoder, None for the defaults of the encoder.
+            decodeBatchSize (int): The number of frames decoded at a time.
+            workDir (str | None): The directory for the temporary parts, None for the system temporary directory.
+            verbose (bool): If True, display a progress bar of the rendered frames.
+
+        Returns:
+            list[tuple[int, int, bool]]: The spans the video was written from, a single rendered span after a fallback.
+
+        The rendered spans are encoded by matchingEncoder with the codec, profile and pixel format of copySource, and every part carries its parameter sets in the stream, so the headers the concat demuxer keeps from the first part never apply to the others. The video is written under a temporary name next to outputPath and decoded completely by checkVideo before it is renamed. If copySource can't be matched, or the spliced video doesn't decode, the whole video is rendered again with libx264 instead.
+        """
+        subtitles = self.frameSubtitles()
+        totalFrames = len(subtitles)
+        stream = probeVideoStream(copySource)
+        encoding = matchingEncoder(stream, encoderArgs)
+
+        directory, fileName = os.path.split(os.path.abspath(outputPath))
+        name, extension = os.path.splitext(fileName)
+        partialPath = os.path.join(directory, f".{name}.partial{extension or '.mp4'}")
+
+        attempts = [(spans, *encoding)] if encoding is not None else []
+        attempts.append(([(0, totalFrames, True)], "libx264", None))
+        # the whole video rendered as one part has no other part to disagree with
+
+        try:
+            for attempt, (attemptSpans, encoder, args) in enumerate(attempts):
+                partsDir = tempfile.mkdtemp(dir=workDir)
+                progress = tqdm(total=sum(end - start for start, end, render in attemptSpans if render), unit=" frames") if verbose else None
+
+                try:
+                    parts = self.writeSpans(attemptSpans, subtitles, copySource, stream["codec"], partsDir, encoder, args, decodeBatchSize, progress)
+                    concatSegments(parts, partialPath, self.videoPath, partsDir)
+                    checkVideo(partialPath, totalFrames)
+                except FFmpegError:
+                    if attempt == len(attempts) - 1:
+                        raise
+                    continue
+                finally:
+                    shutil.rmtree(partsDir, ignore_errors=True)
+                    if progress is not None:
+                        progress.close()
+
+                os.replace(partialPath, outputPath)
+                return attemptSpans
+        finally:
+            if os.path.exists(partialPath):
+                os.remove(partialPath)
+
+    def subtitlePassthrough(self, outputPath:str, verbose=False, decodeBatchSize:int=16, encoderArgs:tuple[str, ...]|None=None, workDir:str|None=None):
+        """
+        Apply subtitles to the video, re-encoding only the parts that show a subtitle, and save the result with the original audio.
+
+        Args:
+            outputPath (str): The path to save the output video file.
+            verbose (bool, optional): If True, display a progress bar during the subtitling process. Defaults to False.
+            decodeBatchSize (int, optional): The number of frames decoded at a time. Defaults to 16.
+            encoderArgs (tuple[str, ...] | None, optional): The quality arguments of the encoder of the re-encoded parts, such as ("-crf", "18"). Defaults to the ones of the encoder in ffmpeg.qualityArgs.
+            workDir (str | None, optional): The directory for the temporary parts. Defaults to the system temporary directory.
+
+        Returns:
+            None. The function applies subtitles to the video and saves the result to a new video file.
+
+        The video is split at its keyframes. Spans of groups of pictures without any subtitle are stream copied by ffmpeg, the others are decoded, rendered and encoded with the codec, profile and pixel format of the source, and all parts are joined by spliceSpans together with the audio of the source. A source that no ffmpeg encoder can match is rendered again as a whole. The video must have been opened with fromFile.
+        """
+        if self.videoPath is None:
+            raise ValueError("subtitlePassthrough needs a VideoTranscriber created with fromFile")
+
+        spans = self.planSegments(self.frameSubtitles())
+        self.spliceSpans(spans, self.videoPath, outputPath, encoderArgs, decodeBatchSize, workDir, verbose)
+
+    @staticmethod
+    def subtitleSignature(subtitle:Subtitle):
+        return (type(subtitle).__name__, subtitle.start, subtitle.end, subtitle.text, tuple(getattr(subtitle, "words", ())), tuple(getattr(subtitle, "wordStarts", np.empty(0)).tolist()), getattr(subtitle, "lastEnd", None))
+
+    def changedFrames(self, previousSegments:list[dict[str, str|float|list|int]]):
+        """
+        Find the frames whose subtitles differ between earlier segments and the current ones.
+
+        Args:
+            previousSegments (list[dict[str, str | float | list | int]]): The segments the earlier output was rendered with.
+
+        Returns:
+            np.ndarray: A boolean for every frame of the video, True where the subtitles drawn may differ.
 
-        if verbose:
-            loop = tqdm(loop, total=len(self.video), unit=" frames")
+        The subtitles of both lists are compared by their start, end, text and words. Every subtitle only in one of them marks all the frames it covers, so a moved cue marks both its old and its new frames.
+        """
+        previous = Counter(self.subtitleSignature(subtitle) for subtitle in self.interpretSRT(previousSegments))
+        current = Counter(self.subtitleSignature(subtitle) for subtitle in self.subList)
+
+        totalFrames = len(self.video)
+        edges = np.zeros(totalFrames + 1, dtype=np.int64)
+        for _, start, end, *_ in (previous - current) + (current - previous):
+            start, end = max(0, min(start, totalFrames)), max(0, min(end, totalFrames))
+            if start < end:
+                edges[start] += 1
+                edges[end] -= 1
 
-        for i, frame in loop:
+        return np.cumsum(edges[:-1]) > 0
 
-            frame, currentInterpreterIndex = self.handleFrame(frame, i, currentInterpreterIndex)
+    def subtitleIncremental(self, previousOutput:str, previousSegments:list[dict[str, str|float|list|int]], outputPath:str, verbose=False, decodeBatchSize:int=16, encoderArgs:tuple[str, ...]|None=None, workDir:str|None=None):
+        """
+        Update an earlier subtitled output after its segments were edited, rendering again only the groups of pictures whose subtitles changed.
 
-            writer.write(frame)
-            
+        Args:
+            previousOutput (str): The subtitled video rendered from this video and previousSegments with the same SubtitleConfig.
+            previousSegments (list[dict[str, str | float | list | int]]): The segments previousOutput was rendered with. The edited segments are the ones this VideoTranscriber was created with.
+            outputPath (str): The path of the updated video. It may be previousOutput, which is then only replaced once the updated video decodes.
+            verbose (bool, optional): If True, display a progress bar. Defaults to False.
+            decodeBatchSize (int, optional): The number of frames decoded at a time. Defaults to 16.
+            encoderArgs (tuple[str, ...] | None, optional): The quality arguments of the encoder of the rendered parts, such as ("-crf", "18"). Defaults to the ones of the encoder in ffmpeg.qualityArgs.
+            workDir (str | None, optional): The directory for the temporary parts. Defaults to the system temporary directory.
 
-        writer.release()
+        Returns:
+            list[tuple[int, int, bool]]: The spans of (first frame, end frame, rendered again) the output was spliced from, a single rendered span if the whole video had to be rendered again.
+
+        The frames that changed, found by changedFrames, are widened to the keyframes of previousOutput. Those groups of pictures are rendered again from this video with the codec, profile and pixel format of previousOutput, the others are stream copied from it, and the parts are joined by spliceSpans together with the audio of this video. A change of the SubtitleConfig is not detected and needs a full render.
+        """
+        if self.videoPath is None:
+            raise ValueError("subtitleIncremental needs a VideoTranscriber created with fromFile")
 
-    
\ No newline at end of file
+        previous = VideoReader(previousOutput)
+        if len(previous) != len(self.video):
+            raise ValueError(f"{previousOutput} has {len(previous)} frames, expected {len(self.video)}")
+
+        spans = keyframeSpans(previous.get_key_indices(), self.changedFrames(previousSegments))
+        del previous
+
+        return self.spliceSpans(spans, previousOutput, outputPath, encoderArgs, decodeBatchSize, workDir, verbose)
+
+    def subtitleParallel(self, outputPath:str, workers:int|None=None, verbose=False, outputFourcc:int=cv2.VideoWriter_fourcc(*'mp4v'), decodeBatchSize:int=16, workDir:str|None=None):
+        """
+        Apply subtitles to the video in several processes and save the result to a new video file.
+
+        Args:
+            outputPath (str): The path to save the output video file.
+            workers (int | None, optional): The number of worker processes, and of parts the video is split into. Defaults to the number of CPUs.
+            verbose (bool, optional): If True, display a progress bar updated as the parts finish. Defaults to False.
+            outputFourcc (int, optional): The four-character code for the output video format. Defaults to cv2.VideoWriter_fourcc(*'mp4v').
+            decodeBatchSize (int, optional): The number of frames decoded at a time. Defaults to 16.
+            workDir (str | None, optional): The directory for the temporary parts. Defaults to the system temporary directory.
+
+        Returns:
+            None. The function applies subtitles to the video and saves the result to a new video file.
+
+        The video is split into one contiguous range of frames per worker. Every worker opens its own VideoReader, draws the subtitles with the 'subtitle' pipeline and writes its range with its own writer, so neither the GIL nor a single encoder limits the throughput. The parts are then joined without re-encoding by the ffmpeg concat demuxer. The frames drawn are the same as with 'subtitle'; each part starts a new group of pictures, so with a lossy codec the encoded bytes differ from a sequential run only where the parts meet, and with a lossless codec the decoded output is identical. The video must have been opened with fromFile.
+        """
+        if self.videoPath is None:
+            raise ValueError("subtitleParallel needs a VideoTranscriber created with fromFile")
+
+        totalFrames = len(self.video)
+        workers = max(1, min(workers or os.cpu_count() or 1, totalFrames))
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        bounds = [round(totalFrames * i / workers) for i in range(workers + 1)]
+
+        partsDir = tempfile.mkdtemp(dir=workDir)
+        extension = os.path.splitext(outputPath)[1] or ".mp4"
+        parts = [os.path.join(partsDir, f"{i:06}{extension}") for i in range(workers)]
+        progress = tqdm(total=totalFrames, unit=" frames") if verbose else None
+
+        context = multiprocessing.get_context("spawn")
+        # forked workers would inherit the decoder threads of this VideoReader
+
+        try:
+            with ProcessPoolExecutor(workers, context) as pool:
+                futures = [pool.submit(renderPart, self.videoPath, self.subConfig, self.subList, part, start, end, outputFourcc, decodeBatchSize, threads) for part, start, end in zip(parts, bounds[:-1], bounds[1:])]
+
+                for future in as_completed(futures):
+                    frames = future.result()
+                    if progress is not None:
+                        progress.update(frames)
+
+            concatSegments(parts, outputPath, workDir=partsDir)
+        finally:
+            shutil.rmtree(partsDir, ignore_errors=True)
+            if progress is not None:
+                progress.close()
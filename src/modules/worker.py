@@ -0,0 +1,244 @@
+from threading import Thread, Event
+from typing import Callable
+from src.modules.registry import ModelRegistry
+from src.modules.transcriber import Transcriber
+from src.modules.jobqueue import JobQueue, ResultStore, LeaseLost, InvalidJob
+from src.modules.vad import VoiceActivityDetector
+from src.modules.subtitle import SubtitleConfig
+from src.modules.pipeline import subtitleVideo
+from src.modules.utils import encodeSegments
+import socket
+import os
+
+def transcribeJob(trans:Transcriber, payload:dict, progressCallback:Callable[[float], None]) -> tuple[dict, str|None]:
+    """
+    Transcribe the audio file of a job.
+
+    Args:
+    trans (Transcriber): The transcriber of the model of the job.
+    payload (dict): The "path" of the audio file, and the "vad" options of a voice activity detector or None.
+    progressCallback (Callable[[float], None]): Called with the timestamp in seconds transcribed so far.
+
+    Returns:
+    tuple[dict, str | None]: The transcription, text and raw segments, and no file.
+
+    Raises:
+    InvalidJob: If the payload has no path or invalid VAD options.
+    """
+    try:
+        path = payload["path"]
+        vad = VoiceActivityDetector(**payload["vad"]) if payload.get("vad") is not None else None
+    except (KeyError, TypeError, ValueError) as e:
+        raise InvalidJob(f"Invalid transcribe payload: {e!r}") from e
+
+    output = trans.getChunkedOutput(path, progressCallback, vad=vad)
+
+    return {
+        "transcription": encodeSegments(output["segments"]),
+        "text": output["text"],
+        "rawSegments": output["segments"],
+        "cached": output["cached"],
+        "vad": output.get("vad"),
+    }, None
+
+def subtitleVideoJob(trans:Transcriber, payload:dict, progressCallback:Callable[[float], None]) -> tuple[dict, str|None]:
+    """
+    Transcribe the video file of a job and draw its subtitles on it.
+
+    Args:
+    trans (Transcriber): The transcriber of the model of the job.
+    payload (dict): The "path" of the video file, the "vad" options of a voice activity detector or None, and the keyword arguments of the SubtitleConfig as "config".
+    progressCallback (Callable[[float], None]): Not called, the progress of a video isn't reported.
+
+    Returns:
+    tuple[dict, str | None]: The raw segments, and the path of the subtitled video.
+
+    Raises:
+    InvalidJob: If the payload has no path, or invalid VAD options or SubtitleConfig arguments.
+    """
+    try:
+        path = payload["path"]
+        vad = VoiceActivityDetector(**payload["vad"]) if payload.get("vad") is not None else None
+        config = SubtitleConfig(**{key: tuple(value) if isinstance(value, list) else value for key, value in payload["config"].items()})
+        # JSON turned the colors and positions into lists
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        raise InvalidJob(f"Invalid subtitleVideo payload: {e!r}") from e
+
+    outputPath = f"{os.path.splitext(path)[0]}.subtitled.mp4"
+
+    try:
+        segments = subtitleVideo(trans, path, config, outputPath, vad=vad, **({"word_timestamps": True} if config.karaoke else {}))
+    except Exception:
+        if os.path.exists(outputPath):
+            os.remove(outputPath)
+        raise
+
+    return {"rawSegments": segments}, outputPath
+
+jobHandlers = {
+    "transcribe": transcribeJob,
+    "subtitleVideo": subtitleVideoJob,
+}
+
+
+class Worker:
+    def __init__(self, queue:JobQueue, store:ResultStore, registry:ModelRegistry, models:list[str]|None=None, leaseSeconds:float=60.0, pollInterval:float=1.0, workerID:str|None=None, handlers:dict[str, Callable]=jobHandlers) -> None:
+        """
+        Initialize a worker which runs the jobs of a shared queue with the models of its registry.
+
+        Args:
+        queue (JobQueue): The queue the jobs are claimed from.
+        store (ResultStore): The store the results are written to.
+        registry (ModelRegistry): The registry loading the models of the worker.
+        models (list[str] | None, optional): The names of the models the worker serves. Defaults to every model of the registry.
+        leaseSeconds (float, optional): The length of the leases of the jobs. The lease is renewed every third of it while a job runs. Defaults to 60.
+        pollInterval (float, optional): The seconds waited before asking the queue again when it has no job. Defaults to 1.
+        workerID (str | None, optional): The id of the worker in the queue. Defaults to the host name and the process id.
+        handlers (dict[str, Callable], optional): The function running every kind of job, called with the transcriber, the payload and a progress callback, and returning the result and the path of a file of the result or None. A handler raises InvalidJob for a payload it can't run. Defaults to jobHandlers.
+
+        Returns:
+        None
+
+        Jobs of the models the worker already has loaded are claimed first, so with several workers each model tends to stay loaded on the workers that used it last instead of being loaded everywhere. A job whose worker crashes stops being heartbeated, and it is queued again once its lease runs out.
+        """
+        self.queue = queue
+        self.store = store
+        self.registry = registry
+        self.models = sorted(models if models is not None else registry.names)
+        self.leaseSeconds = leaseSeconds
+        self.pollInterval = pollInterval
+        self.workerID = workerID or f"{socket.gethostname()}-{os.getpid()}"
+        self.handlers = handlers
+
+        self.stopped = Event()
+        self.jobsDone = 0
+        self.jobsFailed = 0
+
+    def loadedModels(self) -> list[str]:
+        return [name for name, stats in self.registry.stats().items() if stats["loaded"] and name in self.models]
+
+    def heartbeat(self, job:dict, progress:list[float], finished:Event, lost:Event) -> None:
+        while not finished.wait(self.leaseSeconds / 3):
+            if not self.queue.heartbeat(job["id"], self.workerID, self.leaseSeconds, progress[0]):
+                lost.set()
+                return
+
+    def runJob(self, job:dict) -> None:
+        """
+        Run one claimed job, renewing its lease in a thread, and record its result or its error.
+
+        Args:
+        job (dict): The job returned by the queue.
+
+        Returns:
+        None
+
+        A job raising InvalidJob fails for good, any other error is retried up to the maximum number of attempts of the queue. The input file of the job is removed once the job is done or failed for good, and kept while it may still be retried.
+        """
+        progress = [0.0]
+        finished = Event()
+        lost = Event()
+
+        def setProgress(seconds:float) -> None:
+            progress[0] = max(progress[0], seconds)
+
+        beat = Thread(target=self.heartbeat, args=(job, progress, finished, lost), daemon=True)
+        beat.start()
+
+        try:
+            handler = self.handlers.get(job["kind"])
+            if handler is None:
+                raise InvalidJob(f"Unknown job kind {job['kind']}, expected one of {sorted(self.handlers)}")
+
+            with self.registry.use(job["model"]) as trans:
+                result, filePath = handler(trans, job["payload"], setProgress)
+        except Exception as e:
+            retry = not isinstance(e, InvalidJob)
+            # an invalid job fails the same way on every worker, any other error may be transient
+
+            try:
+                if not self.queue.fail(job["id"], self.workerID, str(e), retry):
+                    self.jobsFailed += 1
+                    self.removeInput(job)
+            except LeaseLost:
+                pass
+                # another worker has the job now and still needs its input
+            return
+        finally:
+            finished.set()
+            beat.join()
+
+        if lost.is_set():
+            # another worker has the job now, and writes the result itself
+            if filePath is not None and os.path.exists(filePath):
+                os.remove(filePath)
+            return
+
+        self.store.put(job["id"], result, filePath)
+        try:
+            self.queue.complete(job["id"], self.workerID)
+        except LeaseLost:
+            return
+
+        self.jobsDone += 1
+        self.removeInput(job)
+
+    @staticmethod
+    def removeInput(job:dict) -> None:
+        path = job["payload"].get("path")
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+
+    def runOnce(self) -> bool:
+        """
+        Claim and run one job.
+
+        Returns:
+        bool: False if no job was queued.
+        """
+        job = self.queue.claim(self.workerID, self.models, self.loadedModels(), self.leaseSeconds)
+        if job is None:
+            return False
+
+        self.runJob(job)
+        return True
+
+    def run(self) -> None:
+        while not self.stopped.is_set():
+            if not self.runOnce():
+                self.stopped.wait(self.pollInterval)
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+    from src.modules.jobqueue import SQLiteJobQueue, FileResultStore
+    from src.modules.cpu import loadCPUModel
+    from functools import partial
+    import whisper
+
+    parser = ArgumentParser(description="Run the transcription and subtitling jobs queued by the API.")
+    parser.add_argument("--queue", default="jobs/queue.sqlite", help="The SQLite database of the job queue, shared with the API.")
+    parser.add_argument("--results", default="jobs/results", help="The directory of the results, shared with the API.")
+    parser.add_argument("--models", default="tiny,base,small", help="The models this worker serves, comma separated.")
+    parser.add_argument("--memory-budget", type=int, default=2*1024**3, help="The maximum memory in bytes of the models kept loaded.")
+    parser.add_argument("--lease", type=float, default=60.0, help="The seconds a job is leased for. A job whose worker stops heartbeating is retried after that.")
+    parser.add_argument("--max-attempts", type=int, default=3, help="The number of times a job is started before it fails for good.")
+    parser.add_argument("--device", default=None, help="The device the models are loaded on.")
+    parser.add_argument("--quantize", action="store_true", help="Quantize the models to int8 on the CPU.")
+    parser.add_argument("--threads", type=int, default=None, help="The number of torch threads of a quantized model.")
+    args = parser.parse_args()
+
+    names = args.models.split(",")
+    loader = partial(loadCPUModel, threads=args.threads) if args.quantize else whisper.load_model
+    registry = ModelRegistry(names, args.memory_budget, args.device, batchSize=None, loader=loader, variant="int8" if args.quantize else None)
+
+    worker = Worker(SQLiteJobQueue(args.queue, args.max_attempts), FileResultStore(args.results), registry, names, args.lease)
+    print(f"Worker {worker.workerID} serving {', '.join(worker.models)}")
+
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        worker.stop()